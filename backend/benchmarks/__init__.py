@@ -0,0 +1,3 @@
+"""
+Benchmarks for the SoLBot backend (run as modules, e.g. `python -m backend.benchmarks.logging_latency`)
+"""
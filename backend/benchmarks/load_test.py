@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for /api/chat/ and /api/chat/submit
+
+Starts the offline LLM stand-in (backend/benchmarks/mock_llm.py) and the backend under
+uvicorn, then replays student sessions at each concurrency level. A session walks the
+guided flow the frontend drives: phase2 learning objectives, phase4 long-term goals,
+short-term goals and if-then plans, then phase5 monitoring. In each stage the student
+sends a chat message, then submits revisions from prompt_engineering/mock.py, moving
+from low toward high quality.
+
+The report covers each concurrency level and endpoint: throughput, p50/p95/p99
+latency and error rates (HTTP errors, 503 load shedding, and error bodies). It also
+gives the wall time of each stage. It is printed as a table and written as JSON
+(--output) so runs can be compared when sizing workers or before a semester starts.
+
+--pipelines single,split,parallel runs the levels once per submission pipeline
+(EVALUATION_PIPELINE, see backend/utils/evaluation_pipeline.py), each against a fresh
+backend. Submissions also report time to evaluation: when the scores were known
+(`evaluation_ready_ms` in the response), next to the time to the full reply.
+
+Storage is the in-memory backend (USE_MEMORY_DB=true). Point --target at an already
+running backend to measure something else, such as a Supabase-backed deployment.
+
+Usage:
+    python -m backend.benchmarks.load_test [--concurrency 1,8,32] [--sessions 32] [--workers 1]
+        [--revisions 2] [--think-time 0] [--ttft lognormal:0.8,0.4] [--tokens-per-second 60]
+        [--pipelines single,split] [--output load_test.json] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from backend.benchmarks.logging_latency import percentile
+from prompt_engineering.mock import MOCK_RESPONSES
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (stage, phase, component, submission_type, chat message) in the order the frontend walks them
+STAGES = [
+    ("phase2_learning_objectives", "phase2", "learning_objectives", "learning_objective",
+     "I'm not sure how to turn what I need to learn this week into objectives. Where should I start?"),
+    ("phase4_long_term_goals", "phase4", "long_term_goals", "long_term_goal",
+     "How far ahead should my long-term goal look, and how do I know if it's realistic?"),
+    ("phase4_short_term_goals", "phase4", "short_term_goals", "short_term_goal",
+     "Can you help me break my long-term goal into something I can do this week?"),
+    ("phase4_contingency_strategies", "phase4", "contingency_strategies", "contingency_plan",
+     "What kind of obstacles should my if-then plans cover?"),
+    ("phase5_monitoring_adaptation", "phase5", "monitoring_adaptation", "monitoring_adaptation",
+     "How often should I check whether my plan is working?"),
+]
+LEVELS = ["low", "medium", "high"]
+# Varies chat messages between sessions so the response caches don't serve them all
+COURSES = ["calculus", "biology", "statistics", "chemistry", "psychology", "economics", "history", "programming"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until(url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> bool:
+    """Poll `url` until it returns 200"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.1)
+    return False
+
+
+def _spawn(command: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(command, cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def _stop(process: Optional[subprocess.Popen]) -> None:
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def session_plan(rng: random.Random, revisions: int) -> List[Dict[str, Any]]:
+    """Requests for one student session, grouped by stage"""
+    plan = []
+    for stage, phase, component, submission_type, question in STAGES:
+        message = f"{question} (This is for my {rng.choice(COURSES)} course, week {rng.randint(1, 15)}.)"
+        requests = [("chat", {"phase": phase, "component": component, "message": message})]
+        # Revisions improve over time: e.g. low -> medium -> high
+        for attempt in range(1, revisions + 2):
+            level = LEVELS[min(len(LEVELS) - 1, (attempt - 1) * (len(LEVELS) - 1) // max(1, revisions))]
+            requests.append(("submit", {
+                "phase": phase,
+                "component": component,
+                "submission_type": submission_type,
+                "message": rng.choice(MOCK_RESPONSES[stage][level]),
+                "attempt_number": attempt
+            }))
+        plan.append({"stage": stage, "requests": requests})
+    return plan
+
+
+async def run_session(http: httpx.AsyncClient, base_url: str, session_id: int, plan: List[Dict[str, Any]],
+                      think_time: float, samples: List[Dict[str, Any]], stage_times: List[Dict[str, Any]]) -> None:
+    user_id = f"loadtest-{session_id:05d}-{random.getrandbits(32):08x}"
+    for stage in plan:
+        conversation_id = f"conv-{user_id}-{stage['stage']}"
+        stage_start = time.perf_counter()
+        for endpoint, body in stage["requests"]:
+            path = "/api/chat/" if endpoint == "chat" else "/api/chat/submit"
+            payload = {**body, "user_id": user_id, "conversation_id": conversation_id}
+            start = time.perf_counter()
+            evaluation_ms = None
+            try:
+                response = await http.post(base_url + path, json=payload)
+                status_code = response.status_code
+                if status_code == 503:
+                    outcome = "rejected"
+                elif status_code != 200:
+                    outcome = f"http_{status_code}"
+                else:
+                    data = response.json()
+                    outcome = "error_body" if "error" in data else "ok"
+                    evaluation_ms = (data.get("data") or {}).get("evaluation_ready_ms")
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            samples.append({"endpoint": endpoint, "stage": stage["stage"], "outcome": outcome,
+                            "seconds": time.perf_counter() - start, "evaluation_ms": evaluation_ms})
+            if think_time > 0:
+                await asyncio.sleep(random.expovariate(1.0 / think_time))
+        stage_times.append({"stage": stage["stage"], "seconds": time.perf_counter() - stage_start})
+
+
+def _latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1)
+    }
+
+
+async def run_level(base_url: str, concurrency: int, sessions: int, revisions: int, think_time: float,
+                    seed: int, timeout: float) -> Dict[str, Any]:
+    """Run `sessions` sessions with at most `concurrency` in flight"""
+    rng = random.Random(seed)
+    plans = [session_plan(rng, revisions) for _ in range(sessions)]
+    samples: List[Dict[str, Any]] = []
+    stage_times: List[Dict[str, Any]] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as http:
+        async def bounded(session_id: int) -> None:
+            async with semaphore:
+                await run_session(http, base_url, session_id, plans[session_id], think_time, samples, stage_times)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(sessions)))
+        elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for endpoint in ("chat", "submit"):
+        rows = [s for s in samples if s["endpoint"] == endpoint]
+        outcomes: Dict[str, int] = {}
+        for row in rows:
+            outcomes[row["outcome"]] = outcomes.get(row["outcome"], 0) + 1
+        failed = len(rows) - outcomes.get("ok", 0)
+        endpoints[endpoint] = {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 2) if elapsed else None,
+            "error_rate": round(failed / len(rows), 4) if rows else None,
+            "outcomes": outcomes,
+            **_latency_summary([row["seconds"] for row in rows if row["outcome"] == "ok"])
+        }
+        evaluation = [row["evaluation_ms"] / 1000 for row in rows
+                      if row["outcome"] == "ok" and row["evaluation_ms"] is not None]
+        if evaluation:
+            endpoints[endpoint]["evaluation"] = _latency_summary(evaluation)
+
+    stages = {}
+    for stage, *_ in STAGES:
+        stages[stage] = _latency_summary([s["seconds"] for s in stage_times if s["stage"] == stage])
+
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "endpoints": endpoints,
+        "stages": stages
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"backend: {report['target']}  workers: {report['workers']}  llm: {report['llm']}")
+    print(f"{'pipeline':<9} {'conc':>5} {'endpoint':<8} {'reqs':>6} {'rps':>8} {'err%':>6} "
+          f"{'p50':>9} {'p95':>9} {'p99':>9}")
+    for level in report["levels"]:
+        for endpoint, row in level["endpoints"].items():
+            error_pct = f"{row['error_rate'] * 100:.1f}" if row["error_rate"] is not None else "-"
+            print(f"{level['pipeline']:<9} {level['concurrency']:>5} {endpoint:<8} {row['requests']:>6} "
+                  f"{row['throughput_rps']:>8} {error_pct:>6} {row['p50_ms']!s:>9} {row['p95_ms']!s:>9} "
+                  f"{row['p99_ms']!s:>9}")
+    print("\nsubmissions, ms (p50 / p95): time to evaluation vs time to full reply")
+    for level in report["levels"]:
+        row = level["endpoints"]["submit"]
+        evaluation = row.get("evaluation") or {}
+        print(f"{level['pipeline']:<9} {level['concurrency']:>5}  evaluation={evaluation.get('p50_ms')}/"
+              f"{evaluation.get('p95_ms')}  reply={row['p50_ms']}/{row['p95_ms']}")
+    print("\nstage wall time, ms (p50 / p95):")
+    for level in report["levels"]:
+        stages = "  ".join(f"{stage.split('_', 1)[1]}={row['p50_ms']}/{row['p95_ms']}"
+                           for stage, row in level["stages"].items())
+        print(f"{level['pipeline']:<9} {level['concurrency']:>5}  {stages}")
+
+
+def _start_backend(llm_url: str, workers: int, run_dir: str, pipeline: str) -> Tuple[subprocess.Popen, str]:
+    """Start the backend against the mock LLM; returns the process and its base URL"""
+    port = _free_port()
+    env = {
+        **os.environ,
+        "ANTHROPIC_BASE_URL": llm_url,
+        "ANTHROPIC_API_KEY": os.getenv("LOADTEST_API_KEY", "mock"),
+        "USE_MEMORY_DB": "true",
+        "ENABLE_WARMUP": "false",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        "EVALUATION_PIPELINE": pipeline,
+        # Keep runs independent of each other and of a local dev server
+        "SHARED_CACHE_PATH": os.path.join(run_dir, f"shared-cache-{pipeline}.sqlite3"),
+        "CACHE_SNAPSHOT_ENABLED": "false",
+        "LEADER_LOCK_DIR": run_dir,
+        "PYTHONPATH": os.pathsep.join(filter(None, [PROJECT_ROOT, os.getenv("PYTHONPATH")])),
+    }
+    process = _spawn([sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+                      "--port", str(port), "--workers", str(workers)],
+                     env, os.path.join(run_dir, f"backend-{pipeline}.log"))
+    base_url = f"http://127.0.0.1:{port}"
+    if not _wait_until(f"{base_url}/ready", 60, process):
+        _stop(process)
+        sys.exit(f"Backend did not become ready; see {run_dir}/backend-{pipeline}.log")
+    return process, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay student sessions against the backend and the mock LLM")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrent sessions per level")
+    parser.add_argument("--sessions", type=int, default=0, help="Sessions per level (default: 2x concurrency)")
+    parser.add_argument("--revisions", type=int, default=2, help="Revisions after the first submission per stage")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds between a session's requests")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the backend")
+    parser.add_argument("--target", help="Base URL of an already running backend (skips starting one)")
+    parser.add_argument("--llm-url", help="Base URL of an already running mock LLM (skips starting one)")
+    parser.add_argument("--ttft", default="lognormal:0.8,0.4", help="Mock LLM time-to-first-token distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="Mock LLM output rate")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Mock LLM 429 fraction")
+    parser.add_argument("--rate-529", type=float, default=0.0, help="Mock LLM 529 fraction")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout (seconds)")
+    parser.add_argument("--pipelines", default="single",
+                        help="Comma-separated EVALUATION_PIPELINE values to compare (single, split, parallel)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report instead of a table")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    pipelines = [p.strip() for p in args.pipelines.split(",") if p.strip()]
+    if args.target is not None:
+        pipelines = ["external"]  # Whatever the running backend is configured with
+    run_dir = tempfile.mkdtemp(prefix="solbot-loadtest-")
+    mock = backend = None
+    try:
+        llm_url = args.llm_url
+        if llm_url is None and args.target is None:
+            port = _free_port()
+            llm_url = f"http://127.0.0.1:{port}"
+            mock = _spawn([sys.executable, "-m", "backend.benchmarks.mock_llm", "--port", str(port),
+                           "--ttft", args.ttft, "--tokens-per-second", str(args.tokens_per_second),
+                           "--rate-429", str(args.rate_429), "--rate-529", str(args.rate_529),
+                           "--seed", str(args.seed)],
+                          {**os.environ, "PYTHONPATH": PROJECT_ROOT}, os.path.join(run_dir, "mock_llm.log"))
+            if not _wait_until(f"{llm_url}/stats", 30, mock):
+                sys.exit(f"Mock LLM did not start; see {run_dir}/mock_llm.log")
+
+        target = args.target
+        results = []
+        for pipeline in pipelines:
+            if args.target is None:
+                backend, target = _start_backend(llm_url, args.workers, run_dir, pipeline)
+            for i, concurrency in enumerate(levels):
+                sessions = args.sessions or 2 * concurrency
+                result = asyncio.run(run_level(target, concurrency, sessions, args.revisions, args.think_time,
+                                               args.seed + i, args.timeout))
+                results.append({"pipeline": pipeline, **result})
+            _stop(backend)
+
+        report = {
+            "created_at": time.time(),
+            "target": target,
+            "llm": llm_url or "external",
+            "workers": args.workers if args.target is None else None,
+            "config": {"revisions": args.revisions, "think_time": args.think_time, "ttft": args.ttft,
+                       "tokens_per_second": args.tokens_per_second, "rate_429": args.rate_429,
+                       "rate_529": args.rate_529, "seed": args.seed, "pipelines": pipelines},
+            "levels": results,
+            "logs": run_dir
+        }
+        if llm_url:
+            try:
+                with urllib.request.urlopen(f"{llm_url}/stats", timeout=2) as response:
+                    report["llm_stats"] = json.load(response)
+            except (urllib.error.URLError, ValueError):
+                pass
+    finally:
+        _stop(backend)
+        _stop(mock)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+        if args.output:
+            print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Logging latency benchmark
+
+Compares the cost of hot-path log calls, as seen by the event loop, under:
+  - basicconfig: the previous setup (synchronous StreamHandler, eager f-strings)
+  - queued:      backend.utils.logging_setup (QueueHandler/QueueListener, JSON, lazy args)
+
+Output goes to a sink that sleeps on every write, standing in for a slow or
+back-pressured stderr pipe. Concurrent simulated requests each emit the log lines
+of one chat turn, and we record per-call latency plus event-loop lag.
+
+Usage:
+    python -m backend.benchmarks.logging_latency [--requests 200] [--concurrency 20] [--sink-delay-ms 0.5] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from typing import Any, Dict, List
+
+from backend.utils.logging_setup import TEXT_FORMAT, build_handler
+
+
+class SlowSink:
+    """File-like object whose writes block for a fixed time"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, data: str) -> int:
+        time.sleep(self.delay)
+        self.writes += 1
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def simulated_turn(logger: logging.Logger, lazy: bool, request_id: int, latencies: List[float]) -> None:
+    """The log calls of one chat turn, with awaits in between like the real pipeline"""
+    metadata = {"score": 2.1, "scaffolding_level": 2, "timeline_score": 2, "rationale": "x" * 80}
+    chat_request = {"user_id": f"user-{request_id}", "phase": "phase4", "message": "m" * 300}
+    calls = [
+        lambda: (logger.info("Processing request: phase=%s, component=%s, userId=%s...", "phase4", "ifthen", "user1234")
+                 if lazy else logger.info(f"Processing request: phase={'phase4'}, component={'ifthen'}, userId={'user1234'}...")),
+        lambda: (logger.debug("Message: \"%s...\"", chat_request["message"][:20])
+                 if lazy else logger.info(f"Message: \"{chat_request['message'][:20]}...\"")),
+        lambda: (logger.debug("Sending submission to process_chat: conversation=%s", request_id)
+                 if lazy else logger.info(f"Sending submission to process_chat: {chat_request}")),
+        lambda: (logger.info("Route %s: model=%s, max_tokens=%s", "default", "claude-3-5-sonnet-20241022", 1000)
+                 if lazy else logger.info(f"Route default: model=claude-3-5-sonnet-20241022, max_tokens=1000")),
+        lambda: (logger.debug("All extracted metadata: %s", metadata)
+                 if lazy else logger.info(f"All extracted metadata: {metadata}")),
+        lambda: (logger.info("Request completed in %.2fs", 1.234)
+                 if lazy else logger.info(f"Request completed in {1.234:.2f}s")),
+    ]
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0)
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: List[float], interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, (time.perf_counter() - start - interval) * 1000))
+
+
+async def run_scenario(name: str, requests: int, concurrency: int, sink_delay: float) -> Dict[str, Any]:
+    sink = SlowSink(sink_delay)
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    for existing in saved_handlers:
+        root.removeHandler(existing)
+
+    listener = None
+    if name == "basicconfig":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        handler, listener = build_handler(stream=sink, use_queue=True)
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+    logger = logging.getLogger("solbot.benchmark")
+    latencies: List[float] = []
+    lags: List[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(request_id: int):
+        async with semaphore:
+            await simulated_turn(logger, lazy=name != "basicconfig", request_id=request_id, latencies=latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await lag_task
+
+    if listener is not None:
+        listener.stop()
+    root.removeHandler(handler)
+    for existing in saved_handlers:
+        root.addHandler(existing)
+    root.setLevel(saved_level)
+
+    return {
+        "scenario": name,
+        "log_calls": len(latencies),
+        "records_written": sink.writes,
+        "call_p50_ms": round(statistics.median(latencies), 4),
+        "call_p99_ms": round(percentile(latencies, 99), 4),
+        "call_max_ms": round(max(latencies), 4),
+        "loop_lag_p99_ms": round(percentile(lags, 99), 3) if lags else 0.0,
+        "wall_seconds": round(wall, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare logging setups on a simulated chat hot path")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sink-delay-ms", type=float, default=0.5, help="Blocking time per write to the log sink")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(run_scenario(name, args.requests, args.concurrency, args.sink_delay_ms / 1000))
+        for name in ("basicconfig", "queued")
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = ["scenario", "log_calls", "records_written", "call_p50_ms", "call_p99_ms",
+               "call_max_ms", "loop_lag_p99_ms", "wall_seconds"]
+    print(" | ".join(f"{c:>15}" for c in columns))
+    for result in results:
+        print(" | ".join(f"{str(result[c]):>15}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
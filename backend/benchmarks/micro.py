@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the backend's hot pure-Python paths
+
+Times the functions every chat turn goes through, using fixed, seeded inputs sized
+like production:
+
+- create_cache_key:        response cache key (prompt hash + message + last history turn)
+- format_uuid:             user/conversation id -> UUID (uuid5 for non-UUID ids)
+- parse_response_metadata: the INSTRUCTOR_METADATA / legacy metadata parse in process_chat
+- get_messages:            last 8 messages of a conversation, in-memory store
+- get_user_scores:         a student's criterion scores, in-memory store
+- get_prompt:              system prompt resolution from the prompt registry
+
+Each benchmark is calibrated to run for about --min-time seconds per repeat. The
+median and best per-call times over --repeat repeats are reported.
+
+By default each run is appended to a JSONL history (--history), tagged with the git
+commit. --compare checks the run against the previous entry, or against the one given
+by --baseline (a commit prefix or a negative index). It exits with status 1 when any
+benchmark's median is more than --threshold slower.
+The default history file is git-ignored, since timings only compare on one machine.
+
+Usage:
+    python -m backend.benchmarks.micro [--filter cache] [--repeat 7] [--compare] [--threshold 0.15]
+        [--baseline abc123] [--no-record] [--json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# The store benchmarks measure the in-memory backend
+os.environ.setdefault("USE_MEMORY_DB", "true")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from backend.benchmarks.mock_llm import build_reply
+from backend.routes.chat import parse_response_metadata
+from backend.utils import db
+from backend.utils.llm import create_cache_key
+from backend.utils.prompts import MODE_CHAT, MODE_SUBMISSION, get_prompt
+from prompt_engineering.mock import MOCK_RESPONSES
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_HISTORY = os.getenv("MICRO_HISTORY", os.path.join(PROJECT_ROOT, "backend", "benchmarks",
+                                                          "micro_history.jsonl"))
+SEED = 1234
+
+# Production-like sizes: ~400 active students, ~6 conversations each
+USERS = 400
+CONVERSATIONS_PER_USER = 6
+MESSAGES_PER_CONVERSATION = 12
+SCORES_PER_USER = 15
+
+_PROMPT_TARGETS = [
+    ("phase2", "learning_objectives", "learning_objective"),
+    ("phase4", "long_term_goals", "long_term_goal"),
+    ("phase4", "short_term_goals", "short_term_goal"),
+    ("phase4", "contingency_strategies", "contingency_plan"),
+    ("phase5", "monitoring_adaptation", "monitoring_adaptation"),
+]
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+                    for _ in range(count))
+
+
+class Fixtures:
+    """Seeded inputs shared by the benchmarks"""
+
+    def __init__(self, seed: int = SEED):
+        rng = random.Random(seed)
+        self.rng = rng
+        self.prompts = [get_prompt(phase, component, mode=MODE_SUBMISSION, submission_type=submission_type)
+                        for phase, component, submission_type in _PROMPT_TARGETS]
+        self.student_texts = [text for levels in MOCK_RESPONSES.values() for texts in levels.values()
+                              for text in texts]
+        self.histories = [[{"role": "user" if i % 2 == 0 else "assistant", "content": _words(rng, 120)}
+                           for i in range(8)] for _ in range(16)]
+        self.user_ids = [f"user-student{i:04d}" for i in range(USERS)]
+        self.conversation_ids = [f"conv_{i:05d}" for i in range(64)]
+        self.valid_uuids = [f"{rng.getrandbits(128):032x}" for _ in range(64)]
+        self.valid_uuids = [f"{u[:8]}-{u[8:12]}-4{u[13:16]}-a{u[17:20]}-{u[20:]}" for u in self.valid_uuids]
+
+        prompt_keys = list(MOCK_RESPONSES)
+        self.replies = [build_reply(rng.choice(prompt_keys), rng.choice(self.student_texts), padding_tokens=250)
+                        for _ in range(32)]
+        self.legacy_replies = [
+            "Good progress on your goal.\n\n<!-- INSTRUCTOR NOTE: Goal Score: 2.1/3.0, "
+            "Recommended Scaffolding: Level 2 -->",
+            "Let's refine this.\n\n[Evaluation Scores:\nAlignment: 2 (Partial)\nTimeframe: 1\nMeasurability: 2\n"
+            "Overall Score: 1.7\nProviding MEDIUM support]",
+        ]
+
+        self._populate_store(rng)
+
+    def _populate_store(self, rng: random.Random) -> None:
+        if not db._using_memory_db:
+            raise RuntimeError("micro-benchmarks need USE_MEMORY_DB=true")
+        db._memory_db["messages"].clear()
+        db._memory_db["criterion_scores"].clear()
+        self.conversations = []
+        start = time.time() - 30 * 86400
+        for user_id in self.user_ids:
+            for c in range(CONVERSATIONS_PER_USER):
+                conversation_id = f"{user_id}-conv{c}"
+                self.conversations.append((user_id, conversation_id))
+                for m in range(MESSAGES_PER_CONVERSATION):
+                    db._memory_db["messages"].append({
+                        "id": f"{conversation_id}-{m}",
+                        "user_id": user_id,
+                        "conversation_id": conversation_id,
+                        "role": "user" if m % 2 == 0 else "assistant",
+                        "content": _words(rng, 60),
+                        "phase": "phase4",
+                        "component": "long_term_goals",
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(start + rng.random() * 30 * 86400)),
+                        "metadata": {}
+                    })
+            for s in range(SCORES_PER_USER):
+                phase, component, _ = _PROMPT_TARGETS[s % len(_PROMPT_TARGETS)]
+                db._memory_db["criterion_scores"].append({
+                    "id": f"{user_id}-score{s}",
+                    "user_id": user_id,
+                    "phase": phase,
+                    "component": component,
+                    "criteria": f"criterion_{s % 3}",
+                    "score": rng.randint(1, 3),
+                    "feedback": _words(rng, 20)
+                })
+        # Interleave writes from different students, as they arrive in production
+        rng.shuffle(db._memory_db["messages"])
+
+
+def _cycle(items: List[Any]) -> Callable[[], Any]:
+    state = {"i": 0}
+
+    def next_item() -> Any:
+        state["i"] = (state["i"] + 1) % len(items)
+        return items[state["i"]]
+    return next_item
+
+
+def build_benchmarks(fx: Fixtures) -> Dict[str, Callable[[], Any]]:
+    """name -> zero-argument callable doing one operation"""
+    prompt = _cycle(fx.prompts)
+    text = _cycle(fx.student_texts)
+    history = _cycle(fx.histories)
+    user_id = _cycle(fx.user_ids)
+    conversation_id = _cycle(fx.conversation_ids)
+    valid_uuid = _cycle(fx.valid_uuids)
+    reply = _cycle(fx.replies)
+    legacy_reply = _cycle(fx.legacy_replies)
+    conversation = _cycle(fx.conversations)
+    target = _cycle(_PROMPT_TARGETS)
+
+    def cache_key_registry():
+        entry = prompt()
+        return create_cache_key(entry.content, text(), None, history(), "claude-3-5-sonnet-20241022", entry.hash)
+
+    def cache_key_adhoc():
+        return create_cache_key(prompt().content, text(), None, history(), "claude-3-5-sonnet-20241022")
+
+    def get_messages():
+        user, conv = conversation()
+        return db.get_messages(user, conv, limit=8)
+
+    def get_prompt_chat():
+        phase, component, _ = target()
+        return get_prompt(phase, component, mode=MODE_CHAT)
+
+    def get_prompt_submission():
+        phase, component, submission_type = target()
+        return get_prompt(phase, component, mode=MODE_SUBMISSION, submission_type=submission_type)
+
+    return {
+        "create_cache_key.registry_prompt": cache_key_registry,
+        "create_cache_key.adhoc_prompt": cache_key_adhoc,
+        "format_uuid.user": lambda: db.format_uuid(user_id(), "user_"),
+        "format_uuid.conversation": lambda: db.format_uuid(conversation_id(), "conv_"),
+        "format_uuid.valid_uuid": lambda: db.format_uuid(valid_uuid(), "user_"),
+        "parse_response_metadata.instructor_metadata": lambda: parse_response_metadata(reply()),
+        "parse_response_metadata.legacy": lambda: parse_response_metadata(legacy_reply()),
+        "get_messages.memory": get_messages,
+        "get_user_scores.memory": lambda: db.get_user_scores(user_id(), "phase4"),
+        "get_prompt.chat": get_prompt_chat,
+        "get_prompt.submission": get_prompt_submission,
+    }
+
+
+def time_benchmark(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """Per-call timings in microseconds (median and best of `repeat` calibrated runs)"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5 or loops >= 1 << 24:
+            break
+        loops *= 2
+    loops = max(1, int(loops * (min_time / max(elapsed, 1e-9))))
+
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        per_call.append((time.perf_counter() - start) / loops * 1e6)
+    return {
+        "median_us": round(statistics.median(per_call), 3),
+        "min_us": round(min(per_call), 3),
+        "stdev_us": round(statistics.stdev(per_call), 3) if len(per_call) > 1 else 0.0,
+        "loops": loops
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_baseline(history: List[Dict[str, Any]], baseline: Optional[str]) -> Optional[Dict[str, Any]]:
+    """A history entry by commit prefix or negative index (default: the latest)"""
+    if not history:
+        return None
+    if baseline is None:
+        return history[-1]
+    try:
+        index = int(baseline)
+        return history[index] if -len(history) <= index < len(history) else None
+    except ValueError:
+        matches = [entry for entry in history if (entry.get("commit") or "").startswith(baseline)]
+        return matches[-1] if matches else None
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Relative change of each benchmark's median against the baseline"""
+    rows = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            rows.append({"name": name, "before_us": None, "after_us": result["median_us"], "change": None,
+                         "regression": False})
+            continue
+        change = result["median_us"] / before["median_us"] - 1 if before["median_us"] else 0.0
+        rows.append({"name": name, "before_us": before["median_us"], "after_us": result["median_us"],
+                     "change": round(change, 4), "regression": change > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark the backend's hot pure-Python paths")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Target seconds per repeat")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSONL file of past runs")
+    parser.add_argument("--no-record", action="store_true", help="Don't append this run to the history")
+    parser.add_argument("--compare", action="store_true", help="Compare against a previous run")
+    parser.add_argument("--baseline", help="Commit prefix or negative index into the history (default: -1)")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Slowdown that counts as a regression")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    # Warnings from the code under test (e.g. unparseable metadata) would dominate the timings
+    logging.disable(logging.WARNING)
+    fixtures = Fixtures()
+    benchmarks = build_benchmarks(fixtures)
+    if args.filter:
+        benchmarks = {name: func for name, func in benchmarks.items() if args.filter in name}
+
+    results = {}
+    for name, func in benchmarks.items():
+        results[name] = time_benchmark(func, args.repeat, args.min_time)
+        if not args.json:
+            r = results[name]
+            print(f"{name:<45} {r['median_us']:>10.2f} us  (min {r['min_us']:.2f}, +/- {r['stdev_us']:.2f})")
+
+    entry = {
+        "timestamp": time.time(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results
+    }
+    history = load_history(args.history)
+
+    comparison = None
+    regressions = []
+    if args.compare:
+        baseline = find_baseline(history, args.baseline)
+        if baseline is None:
+            print(f"No baseline found in {args.history}", file=sys.stderr)
+        else:
+            comparison = compare(results, baseline, args.threshold)
+            regressions = [row for row in comparison if row["regression"]]
+            if not args.json:
+                print(f"\nvs {baseline.get('commit')} ({time.strftime('%Y-%m-%d %H:%M', time.localtime(baseline['timestamp']))}), "
+                      f"threshold +{args.threshold:.0%}:")
+                for row in comparison:
+                    if row["change"] is None:
+                        print(f"  {row['name']:<45} new")
+                        continue
+                    flag = "  REGRESSION" if row["regression"] else ""
+                    print(f"  {row['name']:<45} {row['before_us']:>10.2f} -> {row['after_us']:>10.2f} us "
+                          f"({row['change']:+.1%}){flag}")
+
+    if not args.no_record:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    if args.json:
+        print(json.dumps({**entry, "comparison": comparison}, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
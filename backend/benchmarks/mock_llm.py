@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the Anthropic Messages API
+
+Serves `POST /v1/messages` (JSON and SSE streaming) and `GET /v1/models` with
+deterministic, rubric-shaped replies, so the full stack (`process_chat`, the
+evaluation scripts) can be load-tested without API keys, cost or rate limits.
+
+- Replies follow the phase rubric found in the system prompt (or the prompt embedded
+  in the user message, as test_claude_prompts.py sends it). Each criterion is assessed
+  at a quality level and the reply ends with a valid INSTRUCTOR_METADATA block.
+- The level comes from prompt_engineering/mock.py when the student text is one of
+  MOCK_RESPONSES, and from the text's length otherwise. The same request always gets
+  the same reply.
+- Timing: time to first token is drawn from --ttft and text is emitted at
+  --tokens-per-second, so non-streaming latency is ttft + output_tokens / rate.
+- Faults: --rate-429, --rate-529 and --rate-timeout inject rate-limit, overloaded
+  and hung responses. All randomness comes from one generator seeded with --seed.
+- Tool calls: when the request has `tools`, the reply ends with a tool_use block whose
+  input is filled in from the tool's input_schema. Without a forced tool_choice the
+  feedback text (minus the metadata block) comes first, as with the real model.
+
+Point the backend at it with ANTHROPIC_BASE_URL (any ANTHROPIC_API_KEY value works):
+
+    python -m backend.benchmarks.mock_llm --port 8999 --ttft lognormal:0.8,0.4 --tokens-per-second 60
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8999 ANTHROPIC_API_KEY=mock python run_backend.py
+
+Distributions: fixed:S, uniform:LO,HI, normal:MEAN,SD, lognormal:MEDIAN,SIGMA, exp:MEAN (seconds).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from prompt_engineering.metadata import METADATA_START
+from prompt_engineering.mock import MOCK_RESPONSES
+from prompt_engineering.rubrics import RUBRICS
+
+LEVELS = ("low", "medium", "high")
+_SCAFFOLDING_FOR_LEVEL = {"low": "high", "medium": "medium", "high": "low"}
+_MARKS = {"low": "⚠️", "medium": "🔄", "high": "✅"}
+
+# Student text -> (prompt key, level) for every example in mock.py
+_MOCK_INDEX: Dict[str, Tuple[str, str]] = {
+    text.strip(): (prompt_key, level)
+    for prompt_key, levels in MOCK_RESPONSES.items()
+    for level, texts in levels.items()
+    for text in texts
+}
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """Parse a latency distribution like `lognormal:0.8,0.4` into a sampler (seconds, never negative)"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"Unknown distribution: {spec}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return ""
+
+
+def _system_text(system: Any) -> str:
+    return _text_of(system) if system else ""
+
+
+def detect_rubric(prompt_text: str) -> Optional[str]:
+    """Rubric whose metadata keys all appear in the prompt"""
+    for prompt_key, rubric in RUBRICS.items():
+        keys = rubric["metadata_keys"] or [c["key"] for c in rubric["criteria"]]
+        if keys and all(key in prompt_text for key in keys):
+            return prompt_key
+    return None
+
+
+def student_text(user_text: str) -> str:
+    text = user_text
+    # Prompts from test_claude_prompts.py and the backend's compact revision messages
+    for marker in ("Student response:", "Revised submission:"):
+        if marker in text:
+            text = text.rsplit(marker, 1)[1]
+    # Drop the scaffolding note the split pipeline appends for its guidance call
+    return text.split("\n\n[Scaffolding:", 1)[0].strip()
+
+
+def quality_level(text: str) -> str:
+    known = _MOCK_INDEX.get(text)
+    if known is not None:
+        return known[1]
+    words = len(text.split())
+    return "low" if words < 25 else "medium" if words < 80 else "high"
+
+
+def _digest(*parts: str) -> bytes:
+    return hashlib.sha256("\x1f".join(parts).encode()).digest()
+
+
+def build_reply(prompt_key: Optional[str], text: str, padding_tokens: int = 0) -> str:
+    """Deterministic tutor reply; rubric-shaped with INSTRUCTOR_METADATA when a rubric is known"""
+    digest = _digest(prompt_key or "", text)
+    if prompt_key is None:
+        reply = ("Thanks for sharing that! Let's keep building on it. Could you tell me a bit more about "
+                 "what you're working on this week and what feels hardest right now?")
+        return reply + _padding(digest, padding_tokens)
+
+    rubric = RUBRICS[prompt_key]
+    level = quality_level(text)
+    base = LEVELS.index(level) + 1
+    # Jitter the overall score by up to +/-0.3, deterministically
+    score = min(3.0, max(1.0, round(base + (digest[0] / 255 - 0.5) * 0.6, 1)))
+    assessment = "\n".join(f"• {c['name']}: {_MARKS[level]} {c[level]}" for c in rubric["criteria"])
+    targets = "\n".join(f"• **{c['name']}**: aim for {c['high']}" for c in rubric["criteria"])
+    scores = "\n".join(f"{key}: {base}" for key in (rubric["metadata_keys"] or [c["key"] for c in rubric["criteria"]]))
+    weakest = rubric["criteria"][digest[1] % len(rubric["criteria"])]["name"]
+
+    return f"""Thanks for sharing your {rubric['focus']}! 🎯
+
+## Assessment
+{assessment}
+
+## Guidance
+{targets}{_padding(digest, padding_tokens)}
+
+## Next Steps
+📝 Revise your {rubric['focus']} with a focus on {weakest}.
+
+<!-- INSTRUCTOR_METADATA
+Score: {score}
+Scaffolding: {_SCAFFOLDING_FOR_LEVEL[level]}
+{scores}
+Rationale: Mock evaluation at {level} quality ({len(text.split())} words).
+-->"""
+
+
+_FILLER = [
+    "Try connecting this to a specific assignment coming up in your course.",
+    "Think about when during your week you do your most focused work.",
+    "Consider how you'll know, concretely, that you've made progress.",
+    "Small, regular checkpoints make it easier to adjust your plan early.",
+    "Resources like office hours and study groups are worth planning in advance.",
+]
+
+
+def _padding(digest: bytes, tokens: int) -> str:
+    """Extra guidance sentences to reach a realistic output length"""
+    sentences = []
+    i = 0
+    while tokens > 0 and estimate_tokens(" ".join(sentences)) < tokens:
+        sentences.append(_FILLER[(digest[2] + i) % len(_FILLER)])
+        i += 1
+    return ("\n\n" + " ".join(sentences)) if sentences else ""
+
+
+def fill_schema(schema: Dict[str, Any], level_score: int, rationale: str) -> Any:
+    """Build a value that satisfies a JSON schema, using the quality level for numbers"""
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][min(level_score - 1, len(schema["enum"]) - 1)]
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {name: fill_schema(sub, level_score, rationale) for name, sub in properties.items()}
+    if kind == "array":
+        items = schema.get("items", {})
+        # One entry per value of an enum-keyed item (e.g. one score per rubric criterion)
+        for name, sub in items.get("properties", {}).items():
+            if "enum" in sub and sub.get("type") == "string":
+                return [{**fill_schema(items, level_score, rationale), name: value} for value in sub["enum"]]
+        return [fill_schema(items, level_score, rationale)]
+    if kind in ("number", "integer"):
+        value = max(schema.get("minimum", level_score), min(schema.get("maximum", level_score), level_score))
+        return int(value) if kind == "integer" else float(value)
+    if kind == "boolean":
+        return level_score >= 2
+    return rationale
+
+
+class MockConfig:
+    def __init__(self, ttft: str = "lognormal:0.8,0.4", tokens_per_second: float = 60.0, rate_429: float = 0.0,
+                 rate_529: float = 0.0, rate_timeout: float = 0.0, timeout_seconds: float = 120.0,
+                 padding_tokens: int = 250, seed: int = 0):
+        self.ttft = parse_distribution(ttft)
+        self.ttft_spec = ttft
+        self.tokens_per_second = tokens_per_second
+        self.rate_429 = rate_429
+        self.rate_529 = rate_529
+        self.rate_timeout = rate_timeout
+        self.timeout_seconds = timeout_seconds
+        self.padding_tokens = padding_tokens
+        self.rng = random.Random(seed)
+
+
+def _error(status: int, error_type: str, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"type": "error", "error": {"type": error_type, "message": message}},
+                        status_code=status, headers=headers)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    config = config or MockConfig()
+    app = FastAPI(title="Mock Anthropic Messages API")
+    stats = {"requests": 0, "streamed": 0, "tool_use": 0, "429": 0, "529": 0, "timeouts": 0,
+             "input_tokens": 0, "output_tokens": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def _fault() -> Optional[str]:
+        roll = config.rng.random()
+        for name, rate in (("429", config.rate_429), ("529", config.rate_529), ("timeout", config.rate_timeout)):
+            if roll < rate:
+                return name
+            roll -= rate
+        return None
+
+    @app.get("/v1/models")
+    async def models():
+        return {"data": [{"type": "model", "id": "mock-model", "display_name": "Mock"}], "has_more": False,
+                "first_id": "mock-model", "last_id": "mock-model"}
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats, "ttft": config.ttft_spec, "tokens_per_second": config.tokens_per_second}
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        fault = _fault()
+        if fault == "429":
+            stats["429"] += 1
+            return _error(429, "rate_limit_error", "Mock rate limit", {"retry-after": "1"})
+        if fault == "529":
+            stats["529"] += 1
+            return _error(529, "overloaded_error", "Mock overload")
+        if fault == "timeout":
+            stats["timeouts"] += 1
+            await asyncio.sleep(config.timeout_seconds)
+            return _error(504, "api_error", "Mock timeout")
+
+        messages_in: List[Dict[str, Any]] = body.get("messages", [])
+        system = _system_text(body.get("system"))
+        user_text = _text_of(messages_in[-1].get("content")) if messages_in else ""
+        prompt_key = detect_rubric(system) or detect_rubric(user_text)
+        text = student_text(user_text)
+        reply = build_reply(prompt_key, text, config.padding_tokens)
+        if "Do not write the INSTRUCTOR_METADATA" in system:
+            # Guidance-only prompts (tool evaluation, split pipeline) get the feedback alone
+            reply = reply.split(METADATA_START)[0].rstrip()
+
+        input_tokens = estimate_tokens(system) + sum(estimate_tokens(_text_of(m.get("content"))) for m in messages_in)
+        max_tokens = int(body.get("max_tokens", 1024))
+        stop_reason = "end_turn"
+        if estimate_tokens(reply) > max_tokens:
+            reply = reply[:max_tokens * 4]
+            stop_reason = "max_tokens"
+
+        content: List[Dict[str, Any]] = [{"type": "text", "text": reply}]
+        tools = body.get("tools") or []
+        if tools:
+            stats["tool_use"] += 1
+            level_score = LEVELS.index(quality_level(text)) + 1
+            tool = tools[0]
+            choice = body.get("tool_choice") or {}
+            if choice.get("type") == "tool":
+                tool = next((t for t in tools if t.get("name") == choice.get("name")), tool)
+            tool_use = {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}", "name": tool.get("name"),
+                        "input": fill_schema(tool.get("input_schema", {}), level_score,
+                                             f"Mock evaluation at {quality_level(text)} quality.")}
+            if choice.get("type") in ("tool", "any"):
+                # Forced tool use: the tool call is the whole reply
+                content = [tool_use]
+                reply = json.dumps(tool_use["input"])
+            else:
+                # The model writes its feedback, then calls the tool instead of adding metadata
+                reply = reply.split(METADATA_START)[0].rstrip()
+                content = [{"type": "text", "text": reply}, tool_use]
+                reply += json.dumps(tool_use["input"])
+            stop_reason = "tool_use"
+
+        output_tokens = estimate_tokens(reply)
+        ttft = config.ttft(config.rng)
+        generation = output_tokens / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        stats["input_tokens"] += input_tokens
+        stats["output_tokens"] += output_tokens
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "mock-model")
+
+        if not body.get("stream"):
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                await asyncio.sleep(ttft + generation)
+            finally:
+                stats["in_flight"] -= 1
+            return {"id": message_id, "type": "message", "role": "assistant", "model": model, "content": content,
+                    "stop_reason": stop_reason, "stop_sequence": None,
+                    "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}}
+
+        stats["streamed"] += 1
+
+        async def events():
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                await asyncio.sleep(ttft)
+                yield _sse("message_start", {"type": "message_start", "message": {
+                    "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+                    "stop_reason": None, "stop_sequence": None,
+                    "usage": {"input_tokens": input_tokens, "output_tokens": 1}}})
+                for index, block in enumerate(content):
+                    if block["type"] == "text":
+                        yield _sse("content_block_start", {"type": "content_block_start", "index": index,
+                                                           "content_block": {"type": "text", "text": ""}})
+                        words = block["text"].split(" ")
+                        for start in range(0, len(words), 5):
+                            chunk = " ".join(words[start:start + 5]) + (" " if start + 5 < len(words) else "")
+                            if config.tokens_per_second > 0:
+                                await asyncio.sleep(estimate_tokens(chunk) / config.tokens_per_second)
+                            yield _sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                               "delta": {"type": "text_delta", "text": chunk}})
+                    else:
+                        yield _sse("content_block_start", {"type": "content_block_start", "index": index,
+                                                           "content_block": {**block, "input": {}}})
+                        await asyncio.sleep(generation)
+                        yield _sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                           "delta": {"type": "input_json_delta",
+                                                                     "partial_json": json.dumps(block["input"])}})
+                    yield _sse("content_block_stop", {"type": "content_block_stop", "index": index})
+                yield _sse("message_delta", {"type": "message_delta",
+                                             "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                                             "usage": {"output_tokens": output_tokens}})
+                yield _sse("message_stop", {"type": "message_stop"})
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a deterministic mock of the Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--ttft", default="lognormal:0.8,0.4", help="Time-to-first-token distribution (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="Output rate (0 = instant)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests rejected with 429")
+    parser.add_argument("--rate-529", type=float, default=0.0, help="Fraction of requests rejected with 529")
+    parser.add_argument("--rate-timeout", type=float, default=0.0, help="Fraction of requests that hang")
+    parser.add_argument("--timeout-seconds", type=float, default=120.0, help="How long a hung request hangs")
+    parser.add_argument("--padding-tokens", type=int, default=250, help="Extra guidance text per reply")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = MockConfig(args.ttft, args.tokens_per_second, args.rate_429, args.rate_529, args.rate_timeout,
+                        args.timeout_seconds, args.padding_tokens, args.seed)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
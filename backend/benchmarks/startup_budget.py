@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Startup budget check
+
+Starts the backend with uvicorn in a fresh process, polls /health until it answers
+and fails (exit status 1) when the time to the first successful request exceeds
+the budget. Run it in CI or before a deploy to catch slow imports creeping back in;
+the per-step breakdown is printed from the worker's own startup log line.
+
+The check runs with USE_MEMORY_DB=true and without an Anthropic key by default, so it
+measures imports and initialization rather than network round trips.
+
+Usage:
+    python -m backend.benchmarks.startup_budget [--budget 2.0] [--runs 3] [--port 8765] [--json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seconds from process start to the first 200 from /health
+DEFAULT_BUDGET = float(os.getenv("STARTUP_BUDGET_SECONDS", 2.0))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _startup_line(output: str) -> Optional[str]:
+    for line in output.splitlines():
+        if "Startup finished in" in line:
+            return line
+    return None
+
+
+def measure_once(port: int, timeout: float) -> Dict[str, Any]:
+    """Start one backend process and time it until /health returns 200"""
+    env = {
+        **os.environ,
+        "USE_MEMORY_DB": os.getenv("USE_MEMORY_DB", "true"),
+        "ENABLE_WARMUP": "false",
+        "LOG_FORMAT": "text",
+        "LOG_ASYNC": "false",
+        "PYTHONPATH": PROJECT_ROOT,
+    }
+    command = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port)]
+    url = f"http://127.0.0.1:{port}/health"
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True)
+    elapsed = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                break
+            try:
+                with urllib.request.urlopen(url, timeout=0.5) as response:
+                    if response.status == 200:
+                        elapsed = time.perf_counter() - start
+                        break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.02)
+    finally:
+        process.terminate()
+        try:
+            output, _ = process.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            output, _ = process.communicate()
+
+    return {
+        "seconds": round(elapsed, 3) if elapsed is not None else None,
+        "exit_code": process.returncode,
+        "startup_log": _startup_line(output),
+        "output_tail": None if elapsed is not None else output[-2000:]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the backend's time to first request against a budget")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="Seconds allowed (median of runs)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=0, help="Port to bind (default: a free port)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Give up on a run after this many seconds")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    runs = [measure_once(args.port or _free_port(), args.timeout) for _ in range(max(1, args.runs))]
+    times = [run["seconds"] for run in runs if run["seconds"] is not None]
+    median = round(statistics.median(times), 3) if len(times) == len(runs) else None
+    passed = median is not None and median <= args.budget
+    result = {"budget_seconds": args.budget, "median_seconds": median, "passed": passed, "runs": runs}
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for i, run in enumerate(runs, 1):
+            print(f"run {i}: {run['seconds']}s to first /health")
+            if run["startup_log"]:
+                print(f"  {run['startup_log']}")
+            if run["output_tail"]:
+                print(run["output_tail"])
+        verdict = "PASS" if passed else "FAIL"
+        print(f"{verdict}: median {median}s (budget {args.budget}s)")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
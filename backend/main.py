@@ -1,11 +1,6 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
-import uvicorn
 import os
 import sys
 import logging
-from dotenv import load_dotenv
 import datetime
 
 # Add project root and backend directory to the Python path to fix imports
@@ -14,52 +9,46 @@ project_root = os.path.dirname(current_dir)
 sys.path.append(project_root)
 sys.path.append(current_dir)
 
-# Load environment variables
-load_dotenv()
+# Imported first so every later step can be timed (see backend/utils/startup.py)
+from backend.utils.startup import startup_step, mark_ready
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
+# Load environment variables once, before any module reads its settings
+with startup_step("config"):
+    from backend.utils.config import load_config
+    load_config()
+
+# Configure logging (queued, structured output - see backend/utils/logging_setup.py)
+with startup_step("logging"):
+    from backend.utils.logging_setup import setup_logging
+    setup_logging()
 
 logger = logging.getLogger("solbot")
 
-# Import conditionally based on environment
-try:
-    # Try importing the keep_warm module
-    try:
-        logger.info("Attempting to import from backend package...")
-        from backend.utils.keep_warm import start_warmup_thread
-        # If this succeeds, we're likely running from project root
-        from backend.routes.chat import router as chat_router
-        from backend.routes.user import router as user_router
-        from backend.routes.scores import router as scores_router
-        from backend.routes.user_data import router as user_data_router
-        from backend.utils.db import init_db, close_db
-        logger.info("Successfully imported modules from backend package")
-    except ImportError as e:
-        logger.info(f"Backend package import failed: {e}, trying direct import...")
-        # If that fails, try direct import (running from backend dir)
-        from utils.keep_warm import start_warmup_thread
-        from routes.chat import router as chat_router
-        from routes.user import router as user_router
-        from routes.scores import router as scores_router
-        from routes.user_data import router as user_data_router
-        from utils.db import init_db, close_db
-        logger.info("Successfully imported modules directly")
-except Exception as e:
-    logger.error(f"All import attempts failed: {e}")
-    # Define dummy functions if imports fail
-    def start_warmup_thread():
-        logger.warning("Using dummy warmup thread function")
-    def init_db():
-        logger.warning("Using dummy init_db function")
-    def close_db():
-        logger.warning("Using dummy close_db function")
-    # But we still need routers, so raise the error
-    raise
+with startup_step("import:fastapi"):
+    from fastapi import FastAPI, Request, HTTPException
+    from fastapi.responses import JSONResponse, PlainTextResponse
+    from fastapi.middleware.cors import CORSMiddleware
+    from contextlib import asynccontextmanager
+
+# Heavy clients (Anthropic SDK, Supabase) are imported on first use, not here
+with startup_step("import:routes.chat"):
+    from backend.routes.chat import router as chat_router
+with startup_step("import:routes.user"):
+    from backend.routes.user import router as user_router
+with startup_step("import:routes.scores"):
+    from backend.routes.scores import router as scores_router
+with startup_step("import:routes.user_data"):
+    from backend.routes.user_data import router as user_data_router
+with startup_step("import:routes.admin"):
+    from backend.routes.admin import router as admin_router
+with startup_step("import:utils"):
+    from backend.utils.prewarm import start_prewarm, stop_prewarm, readiness
+    from backend.utils.leader import stop_singletons
+    from backend.utils.cache_snapshot import start_cache_snapshots, stop_cache_snapshots
+    from backend.utils.db import init_db, close_db
+    from backend.utils.metrics import render_metrics
+    from backend.utils.tracing import TracingMiddleware
+    from backend.utils.loop_monitor import start_loop_monitor, stop_loop_monitor
 
 # Startup and shutdown events
 @asynccontextmanager
@@ -69,7 +58,8 @@ async def lifespan(app: FastAPI):
     
     # Initialize database with error handling
     try:
-        init_db()
+        with startup_step("init_db"):
+            init_db()
         logger.info("Database initialized")
     except Exception as db_err:
         logger.error(f"Database initialization failed: {db_err}")
@@ -77,14 +67,26 @@ async def lifespan(app: FastAPI):
     
     logger.info("Using simplified direct LLM architecture")
     
-    # Start the warmup thread to keep the service from sleeping
-    if os.environ.get("ENABLE_WARMUP", "true").lower() == "true":
-        logger.info("Starting warmup service...")
-        start_warmup_thread()
+    # Restore the caches saved at the last shutdown and keep snapshotting them
+    with startup_step("restore_caches"):
+        start_cache_snapshots()
+    
+    # Measure event loop lag (and catch blocking calls when LOOP_BLOCK_DETECTOR is on)
+    start_loop_monitor()
+    
+    # Warm the LLM client, database and prompts in the background (see /ready)
+    start_prewarm()
+    
+    # Log the per-step startup breakdown
+    mark_ready()
     
     yield
     # Shutdown: cleanup resources
     logger.info("SoLBot backend shutting down...")
+    await stop_prewarm()
+    await stop_singletons()
+    await stop_cache_snapshots()
+    await stop_loop_monitor()
     
     # Close database connection with error handling
     try:
@@ -117,13 +119,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+# Per-request span tree, returned as a Server-Timing header
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(chat_router)  # Remove prefix for the chat router, as it already has tags
 app.include_router(user_router, prefix="/api/user", tags=["user"])
 app.include_router(scores_router, prefix="/api/scores", tags=["scores"])
 app.include_router(user_data_router, prefix="/api/user-data", tags=["user_data"])
+app.include_router(admin_router)  # Disabled unless ADMIN_TOKEN is set
 
 @app.get("/")
 async def root():
@@ -138,6 +145,18 @@ async def health():
         "version": "1.0.0"
     }
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until this worker's LLM client, database and prompts are warm."""
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics for this worker in the Prometheus text exposition format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    import uvicorn
     port = int(os.getenv("PORT", 8081))
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True) 
\ No newline at end of file
@@ -42,6 +42,7 @@ class EvaluationResults(BaseModel):
     overall_score: float
     scaffolding_level: int
     criteria_scores: List[RubricResult]
+    explanation: Optional[str] = None
 
 # Removed AgentState TypedDict as it's no longer needed with direct LLM approach
 
@@ -0,0 +1,172 @@
+"""
+Admin API routes for SoLBot
+
+Live diagnostics for the current worker: a time-boxed statistical CPU profile,
+tracemalloc snapshots and diffs, and the sizes of the in-process caches and stores.
+Every endpoint requires the ADMIN_TOKEN in an `X-Admin-Token` header and the routes
+are disabled entirely when ADMIN_TOKEN is not set.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from backend.utils import db, llm
+from backend.utils import profiling
+from backend.utils.cache_snapshot import last_snapshot
+from backend.utils.cassette import cassette
+from backend.utils.keyed_lock import conversation_locks
+from backend.utils.leader import leadership_status
+from backend.utils.loop_monitor import blocking_hotspots
+from backend.utils.prompts import registry as prompt_registry
+from backend.utils.shared_cache import shared_cache
+from backend.utils.startup import startup_report
+from backend.utils.token_budget import token_budget
+from backend.routes import chat
+
+logger = logging.getLogger("solbot.routes.admin")
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Stores that hold one list/dict per table rather than one entry per key
+_TABLE_STORES = {"db._memory_db", "llm.local_memory_db"}
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Reject requests without the admin token (404 when admin routes are disabled)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        logger.warning("Rejected admin request with a missing or invalid token")
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profile/cpu")
+async def profile_cpu(seconds: float = 5.0, interval_ms: float = 10.0, include_idle: bool = False,
+                      format: str = "collapsed"):
+    """
+    Sample this worker's thread stacks for `seconds` and return collapsed stacks
+    (one `frame;frame;frame count` line per stack, loadable by flamegraph.pl or speedscope)
+    """
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, profiling.sample_cpu, seconds, interval_ms / 1000.0, include_idle
+        )
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "json":
+        return {
+            "pid": os.getpid(),
+            "seconds": result["seconds"],
+            "interval": result["interval"],
+            "samples": result["samples"],
+            "stacks": dict(result["stacks"].most_common())
+        }
+    return PlainTextResponse(profiling.format_collapsed(result["stacks"]))
+
+
+@router.post("/memory/tracemalloc/start")
+async def tracemalloc_start(frames: int = 10) -> Dict[str, Any]:
+    """Start tracing allocations (slows the worker down while active)"""
+    return profiling.start_tracemalloc(max(1, min(frames, 50)))
+
+
+@router.post("/memory/tracemalloc/stop")
+async def tracemalloc_stop() -> Dict[str, Any]:
+    """Stop tracing allocations and drop stored snapshots"""
+    return profiling.stop_tracemalloc()
+
+
+@router.get("/memory/tracemalloc")
+async def tracemalloc_status() -> Dict[str, Any]:
+    return {"pid": os.getpid(), **profiling.tracemalloc_status()}
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(label: Optional[str] = None, limit: int = 25, key_type: str = "lineno") -> Dict[str, Any]:
+    """Take a tracemalloc snapshot and return its largest allocation sites"""
+    try:
+        snapshot = profiling.take_snapshot(label)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {**snapshot, "pid": os.getpid(), "top": profiling.top_allocations(snapshot["id"], limit, key_type)}
+
+
+@router.get("/memory/diff")
+async def memory_diff(base: int, target: Optional[int] = None, limit: int = 25, key_type: str = "lineno") -> Dict[str, Any]:
+    """Diff two snapshots (a new snapshot is taken when `target` is omitted)"""
+    try:
+        if target is None:
+            target = profiling.take_snapshot("diff")["id"]
+        return {"pid": os.getpid(), "base": base, "target": target,
+                "growth": profiling.diff_snapshots(base, target, limit, key_type)}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot {e}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/loop/hotspots")
+async def loop_hotspots(limit: int = 20) -> Dict[str, Any]:
+    """Places the event loop was caught blocking (requires LOOP_BLOCK_DETECTOR=true)"""
+    return {"pid": os.getpid(), "hotspots": blocking_hotspots(limit)}
+
+
+@router.get("/startup")
+async def startup_timing() -> Dict[str, Any]:
+    """How long each import and init step took while this worker started"""
+    return {"pid": os.getpid(), **startup_report()}
+
+
+@router.get("/leaders")
+async def leaders() -> Dict[str, Any]:
+    """Singleton jobs this worker campaigns for and who leads each"""
+    return {"pid": os.getpid(), "jobs": leadership_status()}
+
+
+@router.get("/cassette")
+async def cassette_status() -> Dict[str, Any]:
+    """Whether Claude calls are being recorded or replayed, and how many so far"""
+    return {"pid": os.getpid(), "cassette": cassette.status() if cassette is not None else {"mode": "off"}}
+
+
+@router.get("/token-budgets")
+async def token_budgets() -> Dict[str, Any]:
+    """Output-length percentiles and truncation rates behind the adaptive max_tokens budgets"""
+    return {"pid": os.getpid(), **token_budget.stats()}
+
+
+@router.get("/locks")
+async def locks() -> Dict[str, Any]:
+    """Per-conversation lock backend, live keys and contention counts for this worker"""
+    return {"pid": os.getpid(), "conversation": conversation_locks.status()}
+
+
+@router.get("/caches")
+async def cache_sizes() -> Dict[str, Any]:
+    """Entry counts and approximate retained sizes of the module-level caches and stores"""
+    stores = {
+        "db._memory_db": db._memory_db,
+        "db._scaffolding_cache": db._scaffolding_cache,
+        "llm.response_cache": llm.response_cache,
+        "llm.local_memory_db": llm.local_memory_db,
+        "llm._inflight_calls": llm._inflight_calls,
+        "chat._response_cache": chat._response_cache,
+    }
+    return {
+        "pid": os.getpid(),
+        "stores": {name: profiling.describe_store(store, per_table=name in _TABLE_STORES)
+                   for name, store in stores.items()},
+        "prompt_registry": prompt_registry.stats(),
+        "shared_cache": shared_cache.stats() if shared_cache is not None else None,
+        "snapshot": last_snapshot
+    }
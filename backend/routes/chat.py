@@ -9,36 +9,72 @@ import uuid
 from datetime import datetime
 import traceback
 import time
-import re
 import json
+import hashlib
 import sys
 import os
 sys.path.append(os.path.abspath('..'))
-from prompt_engineering.scripts.final_prompts import FINAL_PROMPTS
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
 from pydantic import BaseModel, Field
 
 # Remove manager agent import and replace with direct LLM utility
-from backend.utils.llm import call_claude
-from backend.models.schemas import ChatRequest, ChatResponse
-from backend.utils.db import save_message, get_user_profile, get_messages, _memory_db, _using_memory_db, save_scaffolding_level
+from backend.utils.llm import EVALUATION_MODE, call_claude, coalescing_stats, get_rubric_evaluation_tool, log_llm_interaction, parse_evaluation
+from backend.utils.admission import AdmissionController, AdmissionRejected
+from backend.utils.disconnect import ClientDisconnected, cancel_on_disconnect, disconnect_stats
+from backend.utils.prescorer import prescore, prescreen_submission
+from backend.utils.routing import select_route, record_route_outcome, route_stats
+from backend.utils.prompts import get_prompt, get_prompt_key, MODE_CHAT, MODE_SUBMISSION, MODE_TOOL_SUBMISSION
+from backend.utils import metrics
+from backend.utils.metrics import CACHE_REQUESTS, REQUEST_SECONDS, observe_stage, stage_timer
+from backend.utils.cache_snapshot import SnapshotSource, register_snapshot
+from backend.utils.shared_cache import shared_get, shared_set
+from backend.utils.tracing import current_trace, debug_timing_requested, span
+from backend.models.schemas import ChatRequest, ChatResponse, EvaluationResults
+from prompt_engineering.metadata import FORMAT_EVALUATION_SCORES, FORMAT_INSTRUCTOR_METADATA, FORMAT_INSTRUCTOR_NOTE, parse_metadata, rubric_keys
+from backend.utils.revisions import revision_message
+from backend.utils.token_budget import budget_key, token_budget
+from backend.utils.evaluation_pipeline import evaluate_and_guide, provisional_level, split_enabled
+from backend.utils.keyed_lock import CONVERSATION_LOCK_ENABLED, conversation_locks
+from backend.utils.db import save_message, get_user_profile, get_messages, _memory_db, _using_memory_db, save_scaffolding_level, get_cached_scaffolding_level
 
 logger = logging.getLogger("solbot.routes.chat")
 
 # Create router
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+# Per-worker admission control shared by /api/chat/ and /api/chat/submit
+chat_admission = AdmissionController()
+
+def _collect_chat_stats():
+    """Export the admission, disconnect, coalescing and routing stats for /metrics"""
+    yield "solbot_admission_active", "gauge", "Chat requests currently being processed", [({}, chat_admission.active)]
+    yield "solbot_admission_queued", "gauge", "Chat requests waiting for a slot", [({}, chat_admission.queued)]
+    yield ("solbot_admission_events_total", "counter", "Admission control decisions",
+           [({"event": key}, value) for key, value in chat_admission.stats.items()])
+    yield ("solbot_llm_coalescing_total", "counter", "Coalesced in-flight Claude calls",
+           [({"event": key}, value) for key, value in coalescing_stats.items()])
+    yield ("solbot_requests_abandoned_total", "counter", "Requests abandoned because the client disconnected",
+           [({}, disconnect_stats["requests_abandoned"])])
+    for stat in ("requests", "errors", "cache_hits", "input_tokens", "output_tokens", "cost_usd"):
+        yield (f"solbot_route_{stat}_total", "counter", f"Model route {stat.replace('_', ' ')}",
+               [({"route": name}, values[stat]) for name, values in list(route_stats.items())])
+
+metrics.registry.register_collector(_collect_chat_stats)
+
 # Simple in-memory cache for recent responses
 # This is a very basic cache - for production, consider using a proper caching solution
 _response_cache = {}
 _cache_ttl = 60  # Cache entries expire after 60 seconds
+register_snapshot(SnapshotSource("chat_response", _response_cache, _cache_ttl, lambda entry: entry["timestamp"],
+                                 prompt_bound=True, shared_namespace="chat_response"))
 
 def _get_cache_key(user_id: str, phase: str, message: str) -> str:
     """Generate a cache key based on user, phase, and message"""
     # Strip whitespace and use first 100 chars to increase cache hit rate
     message_normalized = message.strip()[:100]
-    return f"{user_id}:{phase}:{hash(message_normalized)}"
+    # A stable digest rather than hash(), which is salted per process, so workers share keys
+    return f"{user_id}:{phase}:{hashlib.md5(message_normalized.encode()).hexdigest()}"
 
 def _cache_response(user_id: str, phase: str, message: str, response: dict):
     """Cache a response for future use"""
@@ -47,10 +83,15 @@ def _cache_response(user_id: str, phase: str, message: str, response: dict):
         "response": response,
         "timestamp": time.time()
     }
+    shared_set("chat_response", key, _response_cache[key], _cache_ttl)
 
 def _get_cached_response(user_id: str, phase: str, message: str) -> Optional[dict]:
     """Get a cached response if available and not expired"""
     key = _get_cache_key(user_id, phase, message)
+    if key not in _response_cache:
+        shared_entry = shared_get("chat_response", key)
+        if shared_entry is not None:
+            _response_cache[key] = shared_entry
     if key in _response_cache:
         cache_entry = _response_cache[key]
         if time.time() - cache_entry["timestamp"] < _cache_ttl:
@@ -60,95 +101,170 @@ def _get_cached_response(user_id: str, phase: str, message: str) -> Optional[dic
             del _response_cache[key]
     return None
 
-def _get_system_prompt(phase: str, component: str, scaffolding_level: int) -> str:
-    """Generate appropriate system prompt based on phase, component and scaffolding level"""
-    
-    # Define criteria sections based on phase
-    phase_criteria = {
-        "phase2": "• Goal Clarity: [⚠️/💡/✅] [brief feedback]\n• Background Connection: [⚠️/💡/✅] [brief feedback]\n• Study Resources: [⚠️/💡/✅] [brief feedback]",
-        "phase4_long_term": "• Goal Clarity: [⚠️/💡/✅] [brief feedback]\n• Timeline: [⚠️/💡/✅] [brief feedback]\n• Measurement: [⚠️/💡/✅] [brief feedback]",
-        "phase4_short_term": "• SMART Elements: [⚠️/💡/✅] [brief feedback]\n• Step-by-step Plan: [⚠️/💡/✅] [brief feedback]\n• Long-term Alignment: [⚠️/💡/✅] [brief feedback]",
-        "phase4_contingency": "• Problem Description: [⚠️/💡/✅] [brief feedback]\n• Response Clarity: [⚠️/💡/✅] [brief feedback]\n• Feasibility: [⚠️/💡/✅] [brief feedback]",
-        "phase5": "• Progress Checks: [⚠️/💡/✅] [brief feedback]\n• Adaptation Trigger: [⚠️/💡/✅] [brief feedback]\n• Strategy Alternatives: [⚠️/💡/✅] [brief feedback]\n• Success Criteria: [⚠️/💡/✅] [brief feedback]"
-    }
-    
-    # Select the right criteria based on phase and component
-    criteria_section = phase_criteria.get(phase)
-    phase_focus = "strategy"
-    
-    # Handle phase4 with different components
-    if phase == "phase4":
-        if component in ["longtermgoal", "long_term_goals"]:
-            criteria_section = phase_criteria["phase4_long_term"]
-            phase_focus = "long-term goal"
-        elif component in ["shorttermgoal", "short_term_goals"]:
-            criteria_section = phase_criteria["phase4_short_term"]
-            phase_focus = "short-term goal"
-        elif component in ["ifthen", "contingency_strategies"]:
-            criteria_section = phase_criteria["phase4_contingency"]
-            phase_focus = "contingency strategies"
-    elif phase == "phase2":
-        phase_focus = "learning objective"
-    elif phase == "phase5":
-        phase_focus = "monitoring & adaptation system"
-            
-    # Use generic template if no specific criteria found
-    if not criteria_section:
-        criteria_section = "• Key Element 1: [⚠️/💡/✅] [brief feedback]\n• Key Element 2: [⚠️/💡/✅] [brief feedback]\n• Key Element 3: [⚠️/💡/✅] [brief feedback]"
-    
-    # Get the rubric for this phase and component - try importing from backend.rubrics
+async def _run_admitted(request: dict, http_request: Request, handler):
+    """Run a chat handler under admission control, shedding load with a 503 when overloaded"""
+    user_key = str(request.get("user_id") or "anonymous")
+    phase = str(request.get("phase") or "").lower()
+    endpoint = handler.__name__.lstrip("_")
+    start = time.perf_counter()
+    status = "error"
     try:
-        # Remove the rubrics import since we don't need it
-        rubric = None
-    except Exception:
-        rubric = None
-    
-    # Create base prompt with consistent structure
-    prompt = f"""You are SoLBot, an AI tutor for self-regulated learning.
+        async with chat_admission.admit(user_key):
+            observe_stage("queue_wait", time.perf_counter() - start, phase, request.get("component", "general"))
+            result = await handler(request, http_request)
+            status = result.get("status", "error") if "error" in result else "success"
+            trace = current_trace()
+            if trace is not None and debug_timing_requested(http_request):
+                result["debug_timing"] = trace.to_dict()
+            return result
+    except AdmissionRejected as rejected:
+        status = "rejected"
+        raise HTTPException(
+            status_code=rejected.status_code,
+            detail={"error": "Server is busy, please try again shortly", "reason": rejected.reason, "status": "overloaded"},
+            headers={"Retry-After": str(rejected.retry_after)}
+        )
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, phase=phase, status=status)
 
-Your response MUST follow this exact structure:
+# Components averaged into a missing overall score for prompts without a rubric
+_LEGACY_COMPONENTS = ("Specificity", "Timeline", "Measurement")
 
-## Greeting
-Brief, personalized greeting acknowledging the student's focus.
+def parse_response_metadata(content: str, prompt_key: Optional[str] = None) -> Dict[str, Any]:
+    """Extract evaluation scores and metadata from an LLM response
 
-## Assessment
-```
-Looking at your {phase_focus}:
-{criteria_section}
-```
+    Parsing is done by prompt_engineering.metadata, which understands the
+    INSTRUCTOR_METADATA comment (current prompts), the older INSTRUCTOR NOTE comment and
+    the bracketed "[Evaluation Scores:" block. The two older formats are removed from
+    the visible content; INSTRUCTOR_METADATA is kept.
 
-## Guidance
-Provide specific, actionable advice using templates, examples, or frameworks appropriate to their current level.
+    Args:
+        content: The response text
+        prompt_key: FINAL_PROMPTS key whose rubric components make up the score when
+            the block gives none
 
-## Next Steps
-Progress indicator: [▫▫▫▫▫▫] (X%)
-Ask ONE reflection question to deepen their understanding.
+    Returns:
+        Dict with the (possibly trimmed) content, score, scaffolding_level (None when
+        neither given nor derivable), rationale, the legacy component scores and all
+        extracted metadata (every criterion score under "criteria")
+    """
+    extracted_metadata = {}
+    parsed = parse_metadata(content)
+    if parsed is None:
+        return {"content": content, "score": None, "scaffolding_level": None, "specificity_score": None,
+                "timeline_score": None, "measurement_score": None, "rationale": None, "metadata": extracted_metadata}
+
+    score = parsed.score
+    recommended_scaffolding = parsed.scaffolding_level
+    criteria = parsed.criteria
+    if parsed.format == FORMAT_INSTRUCTOR_NOTE:
+        extracted_metadata["instructor_note"] = parsed.raw
+    elif parsed.format == FORMAT_EVALUATION_SCORES:
+        extracted_metadata["evaluation_text"] = parsed.raw
+        for key in ("Alignment", "Timeframe", "Measurability"):
+            if key in criteria:
+                extracted_metadata[f"{key.lower()}_score"] = criteria[key]
+    if parsed.format != FORMAT_INSTRUCTOR_METADATA:
+        # Older formats are removed from the content shown to the user
+        content = content[:parsed.span[0]].strip()
+    if parsed.fields.get("Scaffolding") and recommended_scaffolding is None:
+        logger.warning("Could not parse Scaffolding from metadata: %s", parsed.fields["Scaffolding"])
 
-When student achieves excellence (score ≥ 2.5), end with: "Your {phase_focus} is excellent! Please click the Continue button below to proceed to the next step in your learning journey."
+    # Calculate overall score if not directly provided but every component score exists
+    # (only the rubric's own keys: any other "Key: 2" line in the block is not a criterion)
+    components = rubric_keys(prompt_key) or _LEGACY_COMPONENTS
+    if score is None and all(key in criteria for key in components):
+        score = sum(criteria[key] for key in components) / len(components)
+        logger.debug("Calculated overall score from components: %s", score)
 
-Use supportive, encouraging tone with educational emojis (🔍, 📝, 🔄, 📊, 🎯).
+    # Determine scaffolding level if not directly provided but score exists
+    if recommended_scaffolding is None and score is not None:
+        if score < 1.5:
+            recommended_scaffolding = 1  # High support
+        elif score < 2.0:
+            recommended_scaffolding = 2  # Medium support
+        else:
+            recommended_scaffolding = 3  # Low support
+        logger.debug("Determined scaffolding level from score: %s", recommended_scaffolding)
 
-⚠️ SCORING INSTRUCTIONS (NOT VISIBLE TO STUDENTS):
-Score 1-3 on each criterion.
-Calculate overall Score as the average.
-Set Scaffolding level based on score:
-- Score <1.5: Scaffolding 3 (HIGH support)
-- Score 1.5-2.0: Scaffolding 2 (MEDIUM support)
-- Score >2.0: Scaffolding 1 (LOW support)
+    if score is not None:
+        extracted_metadata["score"] = score
+    if recommended_scaffolding is not None:
+        extracted_metadata["scaffolding_level"] = recommended_scaffolding
+    if parsed.rationale is not None:
+        extracted_metadata["rationale"] = parsed.rationale
+    legacy_scores = {name: criteria.get(key) for name, key in
+                     (("specificity_score", "Specificity"), ("timeline_score", "Timeline"),
+                      ("measurement_score", "Measurement"))}
+    extracted_metadata.update({name: value for name, value in legacy_scores.items() if value is not None})
+    if criteria:
+        extracted_metadata["criteria"] = criteria
 
-ALWAYS end with metadata in this exact format:
-<!-- INSTRUCTOR_METADATA
-Score: [1.0-3.0]
-Scaffolding: [1-3]
-[Phase-specific criteria scores]
-Rationale: [brief explanation]
--->"""
+    return {
+        "content": content,
+        "score": score,
+        "scaffolding_level": recommended_scaffolding,
+        **legacy_scores,
+        "rationale": parsed.rationale,
+        "metadata": extracted_metadata
+    }
 
-    return prompt
+def parse_tool_evaluation(content: str, evaluation: EvaluationResults) -> Dict[str, Any]:
+    """Same shape as parse_response_metadata, from an evaluate_response tool call
+
+    The scores arrive typed and validated, so nothing is scraped from the text.
+    """
+    criteria = {result.criteria: result.score for result in evaluation.criteria_scores}
+    extracted_metadata = {
+        "score": evaluation.overall_score,
+        "scaffolding_level": evaluation.scaffolding_level,
+        "criteria": criteria,
+        "evaluation_source": "tool"
+    }
+    if evaluation.explanation is not None:
+        extracted_metadata["rationale"] = evaluation.explanation
+    feedback = {result.criteria: result.feedback for result in evaluation.criteria_scores if result.feedback}
+    if feedback:
+        extracted_metadata["criteria_feedback"] = feedback
+    legacy_scores = {name: criteria.get(key) for name, key in
+                     (("specificity_score", "Specificity"), ("timeline_score", "Timeline"),
+                      ("measurement_score", "Measurement"))}
+    extracted_metadata.update({name: value for name, value in legacy_scores.items() if value is not None})
+    return {
+        "content": content,
+        "score": evaluation.overall_score,
+        "scaffolding_level": evaluation.scaffolding_level,
+        **legacy_scores,
+        "rationale": evaluation.explanation,
+        "metadata": extracted_metadata
+    }
 
 @router.post("/")
-async def process_chat(request: dict):
+async def process_chat(request: dict, http_request: Request):
     """Process a chat message and return a response using direct Claude API call"""
+    return await _run_admitted(request, http_request, _process_chat)
+
+async def _process_chat(request: dict, http_request: Optional[Request] = None):
+    """Process a chat message once it has been admitted, one turn per conversation at a time
+
+    Turns on the same conversation are serialized so a second message sees the first
+    one's conversation row and history; other conversations are not held up.
+    """
+    conversation_id = request.get("conversation_id")
+    if not conversation_id or not CONVERSATION_LOCK_ENABLED:
+        return await _process_chat_turn(request, http_request)
+    start = time.perf_counter()
+    async with conversation_locks.hold(str(conversation_id)):
+        observe_stage("conversation_lock", time.perf_counter() - start,
+                      str(request.get("phase") or "").lower(), request.get("component", "general"))
+        return await _process_chat_turn(request, http_request)
+
+async def _process_chat_turn(request: dict, http_request: Optional[Request] = None):
+    """Process one chat turn
+    
+    If `http_request` is given and the client disconnects while Claude is generating,
+    the call is cancelled and nothing downstream is persisted.
+    """
     start_time = time.time()
     
     try:
@@ -163,13 +279,14 @@ async def process_chat(request: dict):
         if not user_id or not phase or not message:
             return {"error": "userId, phase, and message are required", "status": "error"}
         
-        logger.info(f"Processing request: phase={phase}, component={component}, userId={user_id[:8]}...")
-        logger.info(f"Message: \"{message[:20]}...\"")
+        logger.info("Processing request: phase=%s, component=%s, userId=%s...", phase, component, user_id[:8])
+        logger.debug("Message: \"%s...\"", message[:20])
         
         # Check cache first for identical request
         cached_response = _get_cached_response(user_id, phase, message)
+        CACHE_REQUESTS.inc(cache="chat_response", result="hit" if cached_response else "miss")
         if cached_response:
-            logger.info(f"Using cached response for user {user_id[:8]}")
+            logger.info("Using cached response for user %s", user_id[:8])
             return {"success": True, "data": cached_response}
             
         # Check if the phase is intro or summary - return a direct response without LLM call
@@ -245,27 +362,34 @@ async def process_chat(request: dict):
             conversation_id = str(uuid.uuid4())
             
         # Get the appropriate prompt based on phase and component
-        if phase == "phase2":
-            system_prompt = FINAL_PROMPTS["phase2_learning_objectives"]
-        elif phase == "phase4":
-            if component in ["longtermgoal", "long_term_goals"]:
-                system_prompt = FINAL_PROMPTS["phase4_long_term_goals"]
-            elif component in ["shorttermgoal", "short_term_goals"]:
-                system_prompt = FINAL_PROMPTS["phase4_short_term_goals"]
-            elif component in ["ifthen", "contingency_strategies"]:
-                system_prompt = FINAL_PROMPTS["phase4_contingency_strategies"]
-            else:
-                system_prompt = FINAL_PROMPTS["phase4_long_term_goals"]  # Default for phase 4
-        elif phase == "phase5":
-            system_prompt = FINAL_PROMPTS["phase5_monitoring_adaptation"]
-        else:
-            # For other phases that don't have specific prompts yet
-            system_prompt = _get_system_prompt(phase, component, scaffolding_level)
+        # (submissions get the rubric evaluation instructions appended; in tool
+        # evaluation mode they are scored through the evaluate_response tool)
+        prompt_key = get_prompt_key(phase, component)
+        evaluation_tools = None
+        mode = MODE_CHAT
+        # Two-call submissions (EVALUATION_PIPELINE=split/parallel) resolve their own prompts
+        split_submission = bool(request.get("is_submission")) and split_enabled(phase, component)
+        early_scaffolding: Dict[str, int] = {}
+        if request.get("is_submission"):
+            mode = MODE_SUBMISSION
+            if EVALUATION_MODE == "tool" and not split_submission:
+                evaluation_tools = get_rubric_evaluation_tool(phase, component) or None
+                if evaluation_tools:
+                    mode = MODE_TOOL_SUBMISSION
+        prompt = get_prompt(
+            phase,
+            component,
+            mode=mode,
+            submission_type=request.get("submission_type")
+        )
+        system_prompt = prompt.content
         
         # Get recent conversation history (last 8 messages)
         # Using try-except since we're not sure if get_messages is async
+        chat_history = []
         try:
-            chat_history = get_messages(user_id, conversation_id, limit=8)
+            with stage_timer("history_fetch", phase, component):
+                chat_history = get_messages(user_id, conversation_id, limit=8)
             
             # Format chat history for LLM
             formatted_history = []
@@ -283,39 +407,139 @@ async def process_chat(request: dict):
             logger.error(f"Error getting chat history: {e}")
             formatted_history = []
         
+        # A revised submission goes to Claude as one compact message (previous scores,
+        # a feedback summary and a diff) instead of behind the full history
+        llm_message = message
+        if request.get("is_submission") and chat_history:
+            compact = revision_message(chat_history, request.get("submission_type"), message,
+                                       request.get("attempt_number"))
+            if compact is not None:
+                llm_message = compact
+                formatted_history = []
+        
         # Save the user message first to get a message_id
         message_id = None
         try:
-            saved_message = save_message(
-                user_id=user_id,
-                conversation_id=conversation_id,
-                role="user",
-                content=message,
-                phase=phase,
-                component=component,
-                metadata={
-                    "raw_message": request.get("raw_message", message),
-                    "is_submission": request.get("is_submission", False),
-                    "submission_type": request.get("submission_type")
-                }
-            )
+            with stage_timer("user_save", phase, component):
+                saved_message = save_message(
+                    user_id=user_id,
+                    conversation_id=conversation_id,
+                    role="user",
+                    content=message,
+                    phase=phase,
+                    component=component,
+                    metadata={
+                        "raw_message": request.get("raw_message", message),
+                        "is_submission": request.get("is_submission", False),
+                        "submission_type": request.get("submission_type")
+                    }
+                )
             message_id = saved_message.get("id")
         except Exception as e:
             logger.error(f"Error saving user message: {e}")
         
-        # Make API call to Claude with all necessary context for logging
-        response = await call_claude(
-            system_prompt=system_prompt,
-            user_message=message,
-            chat_history=formatted_history,
-            temperature=0.5,  
-            max_tokens=1000,   # Reduced max tokens for faster responses
-            user_id=user_id,
-            conversation_id=conversation_id,
-            message_id=message_id,
-            phase=phase,
-            component=component
-        )
+        # Obviously low-quality submissions get a templated high-support response
+        # from the local pre-scorer without an LLM call
+        response = None
+        if request.get("is_submission"):
+            with span("prescreen", prompt_key=prompt_key):
+                response = prescreen_submission(prompt_key, message)
+            if response is not None:
+                await log_llm_interaction(
+                    user_id=user_id,
+                    conversation_id=conversation_id,
+                    message_id=message_id,
+                    phase=phase,
+                    component=component,
+                    system_prompt=system_prompt,
+                    user_message=message,
+                    raw_llm_response=response["content"],
+                    processed_response=response["content"],
+                    model_name=response["model"],
+                    duration_ms=int((time.time() - start_time) * 1000),
+                    metadata={"prescore": response["prescore"], "prompt_key": prompt_key, "prompt_hash": prompt.hash}
+                )
+        
+        # Make API call to Claude with all necessary context for logging,
+        # abandoning it if the client goes away in the meantime
+        try:
+            if response is None:
+                # Pick the model and token budget for this turn
+                high_support_probability = prescore(prompt_key, message) if prompt_key else None
+                cached_scaffolding = get_cached_scaffolding_level(user_id, phase, component)
+                route = select_route(
+                    phase=phase,
+                    component=component,
+                    message=message,
+                    prescore=high_support_probability,
+                    scaffolding_level=cached_scaffolding,
+                    is_submission=bool(request.get("is_submission"))
+                )
+                # Tighten the route's max_tokens to what replies for this phase and level need.
+                # Single-call submissions keep the route cap: their evaluation comes last, and
+                # a budget that truncates ~1% of replies would cut it off
+                kind = "guidance" if split_submission else "submission" if request.get("is_submission") else "chat"
+                output_key = budget_key(phase, component, cached_scaffolding or scaffolding_level, kind)
+                if kind != "submission":
+                    route["max_tokens"] = token_budget.budget(output_key, route["max_tokens"])
+                llm_start = time.time()
+                if split_submission:
+                    # Scores come back from a short evaluation call and are persisted
+                    # right away; the guidance is generated by a second call
+                    def persist_evaluation(evaluation: EvaluationResults) -> None:
+                        save_scaffolding_level(
+                            user_id=user_id,
+                            phase=phase,
+                            component=component,
+                            level=evaluation.scaffolding_level,
+                            conversation_id=conversation_id,
+                            reason=f"Submission evaluation for {request.get('submission_type', 'goal')}"
+                        )
+                        early_scaffolding["level"] = evaluation.scaffolding_level
+
+                    response = await cancel_on_disconnect(http_request, evaluate_and_guide(
+                        message=llm_message,
+                        chat_history=formatted_history,
+                        phase=phase,
+                        component=component,
+                        submission_type=request.get("submission_type"),
+                        route=route,
+                        provisional=provisional_level(cached_scaffolding, high_support_probability),
+                        on_evaluation=persist_evaluation,
+                        budget_key=output_key,
+                        user_id=user_id,
+                        conversation_id=conversation_id,
+                        message_id=message_id
+                    ))
+                else:
+                    response = await cancel_on_disconnect(http_request, call_claude(
+                        system_prompt=system_prompt,
+                        user_message=llm_message,
+                        chat_history=formatted_history,
+                        tools=evaluation_tools,
+                        temperature=0.5,  
+                        max_tokens=route["max_tokens"],
+                        user_id=user_id,
+                        conversation_id=conversation_id,
+                        message_id=message_id,
+                        phase=phase,
+                        component=component,
+                        model=route["model"],
+                        route=route["name"],
+                        prompt_hash=prompt.hash,
+                        budget_key=output_key
+                    ))
+                observe_stage("llm_generation", time.time() - llm_start, phase, component)
+                record_route_outcome(
+                    route,
+                    duration_ms=(time.time() - llm_start) * 1000,
+                    usage=response.get("usage"),
+                    error="error" in response,
+                    cache_hit=response.get("cache_hit", False)
+                )
+        except ClientDisconnected:
+            logger.info("Client disconnected during LLM call for user %s, skipping persistence", user_id[:8])
+            return {"error": "Client disconnected", "status": "cancelled"}
         
         # Handle API error
         if "error" in response:
@@ -328,190 +552,46 @@ async def process_chat(request: dict):
         # -------------------------------------------------------------------------
         # Extract evaluation scores and metadata but retain them in the response
         # -------------------------------------------------------------------------
-        score = None
-        recommended_scaffolding = None
-        specificity_score = None
-        timeline_score = None
-        measurement_score = None
-        rationale = None
-        extracted_metadata = {}
-        
-        # 1. Extract from HTML comment format (preferred new format)
-        # Format: <!-- INSTRUCTOR_METADATA\nScore: 2.1\nScaffolding: 2\n... -->
-        html_metadata_start = content.find("<!-- INSTRUCTOR_METADATA")
-        html_metadata_end = content.find("-->", html_metadata_start) if html_metadata_start != -1 else -1
-        
-        if html_metadata_start != -1 and html_metadata_end != -1:
-            # Extract the metadata section
-            metadata_text = content[html_metadata_start:html_metadata_end + 3]
-            logger.info(f"Found instructor metadata in HTML comment format")
-            
-            # Important: No longer remove metadata from visible content
-            # Just extract the values for database storage
-            
-            # Parse score and scaffolding level
-            for line in metadata_text.split('\n'):
-                line = line.strip()
-                if line.startswith("Score:"):
-                    try:
-                        score = float(line.replace("Score:", "").strip())
-                        extracted_metadata["score"] = score
-                    except ValueError:
-                        logger.warning(f"Could not parse Score from metadata: {line}")
-                elif line.startswith("Scaffolding:"):
-                    try:
-                        recommended_scaffolding = int(line.replace("Scaffolding:", "").strip())
-                        extracted_metadata["scaffolding_level"] = recommended_scaffolding
-                    except ValueError:
-                        logger.warning(f"Could not parse Scaffolding from metadata: {line}")
-                elif line.startswith("Specificity:"):
-                    try:
-                        specificity_score = int(line.replace("Specificity:", "").strip())
-                        extracted_metadata["specificity_score"] = specificity_score
-                    except ValueError:
-                        logger.warning(f"Could not parse Specificity from metadata: {line}")
-                elif line.startswith("Timeline:"):
-                    try:
-                        timeline_score = int(line.replace("Timeline:", "").strip())
-                        extracted_metadata["timeline_score"] = timeline_score
-                    except ValueError:
-                        logger.warning(f"Could not parse Timeline from metadata: {line}")
-                elif line.startswith("Measurement:"):
-                    try:
-                        measurement_score = int(line.replace("Measurement:", "").strip())
-                        extracted_metadata["measurement_score"] = measurement_score
-                    except ValueError:
-                        logger.warning(f"Could not parse Measurement from metadata: {line}")
-                elif line.startswith("Rationale:"):
-                    rationale = line.replace("Rationale:", "").strip()
-                    extracted_metadata["rationale"] = rationale
-            
-            logger.info(f"Extracted score: {score}, scaffolding: {recommended_scaffolding}")
+        parse_start = time.perf_counter()
+        # Pre-screened responses are templated with INSTRUCTOR_METADATA, never a tool call
+        scored_by_tool = bool(evaluation_tools) and "prescore" not in response
+        if "evaluation_seconds" in response:
+            evaluation = response["evaluation"]
+            evaluation_ready = llm_start + response["evaluation_seconds"]
+        else:
+            evaluation = parse_evaluation(response) if scored_by_tool else None
+            evaluation_ready = time.time()
+        if evaluation is not None:
+            parsed = parse_tool_evaluation(content, evaluation)
+        else:
+            if scored_by_tool:
+                logger.warning("No usable %s tool call in response; falling back to metadata parsing",
+                               evaluation_tools[0]["name"])
+            parsed = parse_response_metadata(content, prompt_key)
+        content = parsed["content"]
+        score = parsed["score"]
+        recommended_scaffolding = parsed["scaffolding_level"]
+        specificity_score = parsed["specificity_score"]
+        timeline_score = parsed["timeline_score"]
+        measurement_score = parsed["measurement_score"]
+        rationale = parsed["rationale"]
+        extracted_metadata = parsed["metadata"]
+        
+        # A reply cut off at max_tokens may have lost its evaluation; its fallback level
+        # must not overwrite the student's real one, and the reply must not be cached
+        truncated = response.get("stop_reason") == "max_tokens"
+        unscored = truncated and score is None and recommended_scaffolding is None
+        if unscored and request.get("is_submission"):
+            logger.warning("Submission reply for %s/%s hit max_tokens before its evaluation", phase, component)
         
-        # 2. Extract from older HTML comment format (fallback)
-        # Format: <!-- INSTRUCTOR NOTE: Goal Score: 2.1/3.0, Recommended Scaffolding: Level 2 -->
-        elif "<!-- INSTRUCTOR NOTE:" in content:
-            note_start = content.find("<!-- INSTRUCTOR NOTE:")
-            note_end = content.find("-->", note_start)
-            
-            if note_start != -1 and note_end != -1:
-                # Extract the instructor note
-                instructor_note = content[note_start:note_end + 3]
-                logger.info(f"Found instructor note in older HTML format")
-                
-                # Remove the instructor note from the content shown to the user
-                content = content[:note_start].strip()
-                
-                # Parse score from note
-                score_match = re.search(r"Goal Score: (\d+\.\d+)\/3\.0", instructor_note)
-                if score_match:
-                    try:
-                        score = float(score_match.group(1))
-                        extracted_metadata["score"] = score
-                        logger.info(f"Extracted score: {score}")
-                    except ValueError:
-                        logger.warning(f"Could not convert score to float: {score_match.group(1)}")
-                
-                # Parse scaffolding level from note
-                scaffolding_match = re.search(r"Scaffolding: Level (\d+)", instructor_note)
-                if scaffolding_match:
-                    try:
-                        recommended_scaffolding = int(scaffolding_match.group(1))
-                        extracted_metadata["scaffolding_level"] = recommended_scaffolding
-                        logger.info(f"Extracted scaffolding level: {recommended_scaffolding}")
-                    except ValueError:
-                        logger.warning(f"Could not convert scaffolding level to int: {scaffolding_match.group(1)}")
-                        
-                extracted_metadata["instructor_note"] = instructor_note
-        
-        # 3. Extract from bracket format (fallback for existing format)
-        # Format: [Evaluation Scores:\nAlignment: 2 (Partial alignment...)\nTimeframe: 2...]
-        elif "[Evaluation Scores:" in content:
-            bracket_start = content.find("[Evaluation Scores:")
-            bracket_end = content.find("]", bracket_start) if bracket_start != -1 else -1
-            
-            if bracket_start != -1 and bracket_end != -1:
-                # Extract the evaluation section
-                evaluation_text = content[bracket_start:bracket_end + 1]
-                logger.info(f"Found evaluation scores in bracket format")
-                
-                # Remove the evaluation section from the content shown to the user
-                content = content[:bracket_start].strip()
-                
-                # Parse scores from evaluation text
-                alignment_match = re.search(r"Alignment:\s+(\d+)", evaluation_text)
-                if alignment_match:
-                    try:
-                        alignment_score = int(alignment_match.group(1))
-                        extracted_metadata["alignment_score"] = alignment_score
-                    except ValueError:
-                        logger.warning(f"Could not parse alignment score: {alignment_match.group(1)}")
-                        
-                timeframe_match = re.search(r"Timeframe:\s+(\d+)", evaluation_text)
-                if timeframe_match:
-                    try:
-                        timeframe_score = int(timeframe_match.group(1))
-                        extracted_metadata["timeframe_score"] = timeframe_score
-                    except ValueError:
-                        logger.warning(f"Could not parse timeframe score: {timeframe_match.group(1)}")
-                        
-                measurability_match = re.search(r"Measurability:\s+(\d+)", evaluation_text)
-                if measurability_match:
-                    try:
-                        measurability_score = int(measurability_match.group(1))
-                        extracted_metadata["measurability_score"] = measurability_score
-                    except ValueError:
-                        logger.warning(f"Could not parse measurability score: {measurability_match.group(1)}")
-                
-                # Parse overall score
-                overall_match = re.search(r"Overall Score:\s+([\d\.]+)", evaluation_text)
-                if overall_match:
-                    try:
-                        score = float(overall_match.group(1))
-                        extracted_metadata["score"] = score
-                    except ValueError:
-                        logger.warning(f"Could not parse overall score: {overall_match.group(1)}")
-                
-                # Extract support level or scaffolding recommendation
-                support_match = re.search(r"Providing\s+(HIGH|MEDIUM|LOW)\s+support", evaluation_text, re.IGNORECASE)
-                if support_match:
-                    support_level = support_match.group(1).upper()
-                    if support_level == "HIGH":
-                        recommended_scaffolding = 1
-                    elif support_level == "MEDIUM":
-                        recommended_scaffolding = 2
-                    elif support_level == "LOW":
-                        recommended_scaffolding = 3
-                    
-                    extracted_metadata["scaffolding_level"] = recommended_scaffolding
-                
-                extracted_metadata["evaluation_text"] = evaluation_text
-                logger.info(f"Extracted score: {score}, scaffolding: {recommended_scaffolding}")
-        
-        # Calculate overall score if not directly provided but component scores exist
-        if score is None and specificity_score and timeline_score and measurement_score:
-            score = (specificity_score + timeline_score + measurement_score) / 3.0
-            extracted_metadata["score"] = score
-            logger.info(f"Calculated overall score from components: {score}")
-        
-        # Determine scaffolding level if not directly provided but score exists
-        if recommended_scaffolding is None and score is not None:
-            if score < 1.5:
-                recommended_scaffolding = 1  # High support
-            elif score < 2.0:
-                recommended_scaffolding = 2  # Medium support
-            else:
-                recommended_scaffolding = 3  # Low support
-                
-            extracted_metadata["scaffolding_level"] = recommended_scaffolding
-            logger.info(f"Determined scaffolding level from score: {recommended_scaffolding}")
-            
         # If we still don't have a scaffolding level, use default
         if recommended_scaffolding is None:
             recommended_scaffolding = scaffolding_level
             
         # Log all extracted metadata
-        logger.info(f"All extracted metadata: {extracted_metadata}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("All extracted metadata: %s", extracted_metadata)
+        observe_stage("metadata_parse", time.perf_counter() - parse_start, phase, component)
         
         # Final cleanup - just remove any trailing whitespace
         content = content.strip()
@@ -533,6 +613,7 @@ async def process_chat(request: dict):
             next_phase = phase_progression.get(phase)
         
         # Try to store the feedback for this submission
+        submission_start = time.perf_counter()
         try:
             if "is_submission" in request and request["is_submission"]:
                 # Save the submission
@@ -576,21 +657,25 @@ async def process_chat(request: dict):
                         _memory_db["assessments"] = []
                     _memory_db["assessments"].append(assessment_data)
                     
-                # Save the scaffolding level to the database
+                # Save the scaffolding level to the database (unless the split
+                # pipeline already saved this level when the evaluation came in)
                 try:
-                    save_scaffolding_level(
-                        user_id=user_id, 
-                        phase=phase, 
-                        component=component,
-                        level=recommended_scaffolding,
-                        conversation_id=conversation_id,
-                        reason=f"Submission evaluation for {request.get('submission_type', 'goal')}"
-                    )
+                    if not unscored and early_scaffolding.get("level") != recommended_scaffolding:
+                        save_scaffolding_level(
+                            user_id=user_id, 
+                            phase=phase, 
+                            component=component,
+                            level=recommended_scaffolding,
+                            conversation_id=conversation_id,
+                            reason=f"Submission evaluation for {request.get('submission_type', 'goal')}"
+                        )
                 except Exception as scaffolding_err:
                     logger.error(f"Error saving scaffolding level: {scaffolding_err}")
         except Exception as e:
             logger.error(f"Error saving submission: {e}")
             # Continue even if saving fails
+        if request.get("is_submission"):
+            observe_stage("submission_save", time.perf_counter() - submission_start, phase, component)
         
         # Create response data object
         response_data = {
@@ -606,10 +691,14 @@ async def process_chat(request: dict):
             "next_phase": next_phase,
             "evaluation": extracted_metadata if extracted_metadata else None
         }
+        if request.get("is_submission"):
+            # When the scores were known, for comparing the single and split pipelines
+            response_data["evaluation_ready_ms"] = int((evaluation_ready - start_time) * 1000)
         
         # Save the assistant response to database with metadata
         response_message_id = None
         try:
+            assistant_save_start = time.perf_counter()
             saved_response = save_message(
                 user_id=user_id,
                 conversation_id=conversation_id,
@@ -632,15 +721,17 @@ async def process_chat(request: dict):
                 }
             )
             response_message_id = saved_response.get("id")
+            observe_stage("assistant_save", time.perf_counter() - assistant_save_start, phase, component)
         except Exception as e:
             logger.error(f"Error saving assistant message: {e}")
         
-        # Cache the response for future identical requests
-        _cache_response(user_id, phase, message, response_data)
+        # Cache the response for future identical requests (not a truncated reply)
+        if not truncated:
+            _cache_response(user_id, phase, message, response_data)
         
         # Log completion time
         elapsed = time.time() - start_time
-        logger.info(f"Request completed in {elapsed:.2f}s")
+        logger.info("Request completed in %.2fs", elapsed)
         
         return {"success": True, "data": response_data}
             
@@ -669,13 +760,17 @@ async def health_check() -> Dict[str, str]:
     return {"status": "healthy"}
 
 @router.post("/submit")
-async def submit_work(request: dict):
+async def submit_work(request: dict, http_request: Request):
     """
     Handle student submissions for different phases and components
     
     This endpoint allows students to submit their work for evaluation,
     which will be saved separately from regular chat messages.
     """
+    return await _run_admitted(request, http_request, _submit_work)
+
+async def _submit_work(request: dict, http_request: Optional[Request] = None):
+    """Evaluate a submission once it has been admitted"""
     try:
         # Extract request parameters
         user_id = request.get("user_id")
@@ -690,34 +785,14 @@ async def submit_work(request: dict):
             logger.error(f"Missing required fields in submission: {request}")
             return {"error": "userId, phase, and message are required", "status": "error"}
         
-        logger.info(f"Processing submission: phase={phase}, type={submission_type}, userId={user_id[:8]}...")
+        logger.info("Processing submission: phase=%s, type=%s, userId=%s...", phase, submission_type, user_id[:8])
         
         # Generate a new conversation ID if not provided
         if not conversation_id:
             conversation_id = str(uuid.uuid4())
             
-        # Get the appropriate prompt based on phase and component
-        if phase == "phase2":
-            system_prompt = FINAL_PROMPTS["phase2_learning_objectives"]
-        elif phase == "phase4":
-            if component in ["longtermgoal", "long_term_goals"]:
-                system_prompt = FINAL_PROMPTS["phase4_long_term_goals"]
-            elif component in ["shorttermgoal", "short_term_goals"]:
-                system_prompt = FINAL_PROMPTS["phase4_short_term_goals"]
-            elif component in ["ifthen", "contingency_strategies"]:
-                system_prompt = FINAL_PROMPTS["phase4_contingency_strategies"]
-            else:
-                system_prompt = FINAL_PROMPTS["phase4_long_term_goals"]  # Default for phase 4
-        elif phase == "phase5":
-            system_prompt = FINAL_PROMPTS["phase5_monitoring_adaptation"]
-        else:
-            # For other phases that don't have specific prompts yet
-            system_prompt = _get_system_prompt(phase, component, 2)  # Use medium scaffolding for evaluation
-        
-        # Add specific evaluation instructions
-        system_prompt += f"\n\nThis is a student submission for {phase}, {submission_type}. Please evaluate it carefully against the rubric criteria."
-        
-        # Process this as a submission through the chat endpoint
+        # Process this as a submission through the chat endpoint, which resolves the
+        # submission prompt (with evaluation instructions) from the prompt registry
         chat_request = {
             "user_id": user_id,
             "phase": phase,
@@ -731,8 +806,9 @@ async def submit_work(request: dict):
         }
         
         # Call the chat endpoint to process this submission
-        logger.info(f"Sending submission to process_chat: {chat_request}")
-        response = await process_chat(chat_request)
+        logger.debug("Sending submission to process_chat: conversation=%s, attempt=%s",
+                     conversation_id, chat_request["attempt_number"])
+        response = await _process_chat(chat_request, http_request)
         
         # Handle error responses
         if "error" in response:
@@ -740,7 +816,7 @@ async def submit_work(request: dict):
             return response
         
         # Log successful responses    
-        logger.info(f"Submission processed successfully: {response.get('data', {}).get('message', '')[:100]}...")
+        logger.debug("Submission processed successfully: %s...", response.get("data", {}).get("message", "")[:100])
             
         # Add submission-specific data to the response
         if "data" in response:
@@ -0,0 +1,85 @@
+"""Revision prompts diff each attempt against the one right before it, in long conversations too"""
+
+import json
+
+import pytest
+
+from backend.utils import db
+from backend.utils.revisions import find_previous_attempt, revision_message
+
+ATTEMPTS = [
+    "I will study more for my exam",
+    "I will study 1 hour daily for my biology exam",
+    "I will study 2 hours daily for my biology exam next month",
+    "I will study 2 hours daily for my biology exam next month and track it in a planner",
+]
+
+
+def _conversation():
+    """Chat turns between submissions push early attempts out of the last 8 messages"""
+    messages = []
+    for number, text in enumerate(ATTEMPTS[:-1], start=1):
+        messages.append({"role": "user", "content": "What makes a goal specific?", "metadata": {}})
+        messages.append({"role": "assistant", "content": "A specific goal names what and when.", "metadata": {}})
+        messages.append({"role": "user", "content": text,
+                         "metadata": {"is_submission": True, "submission_type": "short_term_goals", "raw_message": text}})
+        messages.append({"role": "assistant", "content": f"• Timeline: attempt {number} feedback",
+                         "metadata": {"score": float(number), "scaffolding_level": number}})
+    return messages
+
+
+class _FakeQuery:
+    """The part of the Supabase query builder get_messages uses"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, *_):
+        return self
+
+    def eq(self, *_):
+        return self
+
+    def order(self, column, desc=False):
+        return _FakeQuery(sorted(self.rows, key=lambda row: row[column], reverse=desc))
+
+    def limit(self, count):
+        return _FakeQuery(self.rows[:count])
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+
+class _FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, _):
+        return _FakeQuery(self.rows)
+
+
+@pytest.fixture
+def supabase_history(monkeypatch):
+    rows = [{"id": str(index), "sender_type": message["role"], "content": message["content"],
+             "timestamp": f"2026-01-01T00:{index:02d}:00", "metadata": json.dumps(message["metadata"])}
+            for index, message in enumerate(_conversation())]
+    monkeypatch.setattr(db, "_using_memory_db", False)
+    monkeypatch.setattr(db, "get_db", lambda: _FakeClient(rows))
+    return rows
+
+
+def test_get_messages_returns_newest_in_order(supabase_history):
+    history = db.get_messages("user-1", "conv_1", limit=8)
+    assert [m["id"] for m in history] == [row["id"] for row in supabase_history[-8:]]
+
+
+def test_revision_diffs_against_previous_attempt(supabase_history):
+    history = db.get_messages("user-1", "conv_1", limit=8)
+    previous = find_previous_attempt(history, "short_term_goals")
+    assert previous["text"] == ATTEMPTS[2]
+    assert previous["score"] == 3.0
+
+    message = revision_message(history, "short_term_goals", ATTEMPTS[3], attempt_number=4)
+    assert "Previous evaluation: Score 3.0" in message
+    assert 'added "and track it in a planner"' in message
+    assert "attempt 3 feedback" in message
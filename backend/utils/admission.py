@@ -0,0 +1,191 @@
+"""
+Admission control for the chat endpoints
+
+Each uvicorn worker only runs a bounded number of chat requests at once. Requests
+beyond that wait in a bounded queue that is served round-robin per user, so one
+student's rapid resubmits cannot starve everybody else. When the expected queue
+wait would exceed the latency SLO the request is shed immediately with a
+503 + Retry-After instead of timing out on the client after the LLM call is paid for.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+
+logger = logging.getLogger("solbot.admission")
+
+# Per-worker limits (override through environment variables)
+ADMISSION_ENABLED = os.getenv("ENABLE_ADMISSION_CONTROL", "true").lower() == "true"
+MAX_CONCURRENT = int(os.getenv("CHAT_MAX_CONCURRENT", 8))
+MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", 32))
+QUEUE_SLO_SECONDS = float(os.getenv("CHAT_QUEUE_SLO_SECONDS", 15))
+MAX_PER_USER = int(os.getenv("CHAT_MAX_PER_USER", 2))
+
+# Initial guess for how long one chat request holds a slot, refined with an EWMA
+INITIAL_SERVICE_TIME = 8.0
+SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being admitted"""
+
+    def __init__(self, reason: str, retry_after: int, status_code: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class AdmissionController:
+    """Bounded concurrency with a per-user fair waiting queue
+
+    Slots are handed directly from a finishing request to the next waiter, picking
+    users in round-robin order, so the active count never overshoots the limit.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT, max_queue: int = MAX_QUEUE,
+                 queue_slo: float = QUEUE_SLO_SECONDS, max_per_user: int = MAX_PER_USER,
+                 enabled: bool = ADMISSION_ENABLED):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_slo = queue_slo
+        self.max_per_user = max(1, max_per_user)
+        self.enabled = enabled
+
+        self._active = 0
+        self._queued = 0
+        # user -> FIFO of waiting futures; dict order is the round-robin order
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        # in-flight + queued requests per user
+        self._per_user: Dict[str, int] = {}
+        self._service_time = INITIAL_SERVICE_TIME
+
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_slo": 0,
+            "rejected_user_limit": 0,
+            "queue_timeouts": 0,
+        }
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def estimated_wait(self, ahead: int) -> float:
+        """Estimate the queue wait in seconds for a request with `ahead` requests in front"""
+        if self._active < self.max_concurrent and ahead == 0:
+            return 0.0
+        return (ahead + 1) * self._service_time / self.max_concurrent
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.estimated_wait(self._queued)))
+
+    def _reject(self, reason: str, stat: str, status_code: int = 503):
+        self.stats[stat] += 1
+        retry_after = self._retry_after()
+        logger.warning(f"Shedding chat request ({reason}): active={self._active}, "
+                       f"queued={self._queued}, retry_after={retry_after}s")
+        raise AdmissionRejected(reason, retry_after, status_code)
+
+    async def _acquire(self, user_key: str):
+        if self._per_user.get(user_key, 0) >= self.max_per_user:
+            self._reject("too many concurrent requests for this user", "rejected_user_limit", status_code=429)
+
+        # Fast path: free slot and nobody waiting
+        if self._active < self.max_concurrent and self._queued == 0:
+            self._active += 1
+            self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+            return
+
+        if self._queued >= self.max_queue:
+            self._reject("queue full", "rejected_queue_full")
+        if self.estimated_wait(self._queued) > self.queue_slo:
+            self._reject("expected queue wait exceeds SLO", "rejected_slo")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user_key, deque()).append(future)
+        self._queued += 1
+        self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+        self.stats["queued"] += 1
+
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_slo)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up - pass it on
+                self._release(user_key)
+            else:
+                self._drop_waiter(user_key, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["queue_timeouts"] += 1
+                raise AdmissionRejected("timed out waiting in queue", self._retry_after())
+            raise
+
+    def _drop_waiter(self, user_key: str, future: asyncio.Future):
+        waiters = self._waiters.get(user_key)
+        if waiters is not None:
+            try:
+                waiters.remove(future)
+                self._queued -= 1
+            except ValueError:
+                pass
+            if not waiters:
+                del self._waiters[user_key]
+        self._decrement_user(user_key)
+
+    def _decrement_user(self, user_key: str):
+        remaining = self._per_user.get(user_key, 0) - 1
+        if remaining > 0:
+            self._per_user[user_key] = remaining
+        else:
+            self._per_user.pop(user_key, None)
+
+    def _release(self, user_key: str):
+        self._decrement_user(user_key)
+
+        # Hand the slot to the next user in round-robin order
+        while self._waiters:
+            next_user, waiters = self._waiters.popitem(last=False)
+            future = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._waiters[next_user] = waiters
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self._active -= 1
+
+    def _record_service_time(self, elapsed: float):
+        self._service_time += SERVICE_TIME_ALPHA * (elapsed - self._service_time)
+
+    @asynccontextmanager
+    async def admit(self, user_key: str):
+        """Hold a chat slot for the duration of the block
+
+        Raises:
+            AdmissionRejected: if the request is shed before it gets a slot
+        """
+        if not self.enabled:
+            yield
+            return
+
+        await self._acquire(user_key)
+        self.stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record_service_time(time.monotonic() - started)
+            self._release(user_key)
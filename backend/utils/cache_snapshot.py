@@ -0,0 +1,247 @@
+"""
+Warm-restart cache snapshots
+
+The in-process caches (LLM responses, chat responses, scaffolding levels) are written
+to a gzip'd JSON file at shutdown and every CACHE_SNAPSHOT_INTERVAL seconds. When the
+app starts, they are restored, so hit rates survive a deploy or a free-tier sleep
+instead of rebuilding over tens of minutes.
+
+- Owning modules register their cache dicts with `register_snapshot`, the same way
+  metrics collectors are registered.
+- Restored entries keep their original timestamps and are dropped if their TTL has
+  passed. They are also copied into the shared tier (backend.utils.shared_cache), so
+  every worker benefits.
+- The snapshot records the prompt registry fingerprint. If any prompt changed since
+  the snapshot was taken, caches marked `prompt_bound` are not restored.
+- Every worker writes to the same file. Writes merge with what is already there under
+  a file lock and are atomic (temp file + rename), so the snapshot holds the union of
+  the workers' caches.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from backend.utils.shared_cache import shared_set
+
+logger = logging.getLogger("solbot.cache_snapshot")
+
+CACHE_SNAPSHOT_ENABLED = os.getenv("CACHE_SNAPSHOT_ENABLED", "true").lower() == "true"
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "/tmp/solbot-cache-snapshot.json.gz")
+# Seconds between periodic snapshots (0 = only at shutdown)
+CACHE_SNAPSHOT_INTERVAL = float(os.getenv("CACHE_SNAPSHOT_INTERVAL", 300))
+
+# Bump when the file layout changes; older files are ignored
+SNAPSHOT_FORMAT = 1
+
+
+@dataclass
+class SnapshotSource:
+    """A cache dict to persist, and how to tell whether its entries are still fresh"""
+    name: str
+    store: Dict[str, Any]
+    ttl: float
+    timestamp: Callable[[Any], float]
+    # Entries depend on prompt content and are dropped when the prompt registry changes
+    prompt_bound: bool = False
+    # Shared-tier namespace to seed on restore, and the value to store there for an entry
+    shared_namespace: Optional[str] = None
+    shared_value: Optional[Callable[[Any], Any]] = None
+
+
+_sources: Dict[str, SnapshotSource] = {}
+_task: Optional[asyncio.Task] = None
+last_snapshot: Dict[str, Any] = {}
+
+
+def register_snapshot(source: SnapshotSource) -> None:
+    _sources[source.name] = source
+
+
+def _prompt_fingerprint() -> Optional[str]:
+    try:
+        from backend.utils.prompts import registry
+    except ImportError:
+        return None
+    return registry.fingerprint
+
+
+def _is_fresh(source: SnapshotSource, entry: Any, now: float) -> bool:
+    try:
+        return now - source.timestamp(entry) < source.ttl
+    except (TypeError, KeyError, IndexError):
+        return False
+
+
+def _serializable(entries: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        json.dumps(entries)
+        return entries
+    except (TypeError, ValueError):
+        kept = {}
+        for key, entry in entries.items():
+            try:
+                json.dumps(entry)
+                kept[key] = entry
+            except (TypeError, ValueError):
+                continue
+        return kept
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Serialize read-merge-write cycles between workers (no-op without fcntl)"""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache snapshot {path}: {e}")
+        return None
+    if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT:
+        logger.info(f"Ignoring cache snapshot {path} with an unknown format")
+        return None
+    return data
+
+
+def save_snapshot(path: str = CACHE_SNAPSHOT_PATH) -> Dict[str, int]:
+    """Merge this worker's fresh cache entries into the snapshot file
+
+    Returns:
+        Entries written per cache
+    """
+    now = time.time()
+    fingerprint = _prompt_fingerprint()
+    caches = {}
+    for name, source in _sources.items():
+        caches[name] = _serializable({key: entry for key, entry in list(source.store.items())
+                                      if _is_fresh(source, entry, now)})
+
+    with _file_lock(path):
+        existing = _read(path)
+        if existing is not None:
+            same_prompts = existing.get("prompt_fingerprint") == fingerprint
+            for name, entries in existing.get("caches", {}).items():
+                source = _sources.get(name)
+                if source is None or (source.prompt_bound and not same_prompts):
+                    continue
+                merged = caches.setdefault(name, {})
+                for key, entry in entries.items():
+                    if not _is_fresh(source, entry, now):
+                        continue
+                    # Keep whichever copy is newer
+                    if key not in merged or source.timestamp(entry) > source.timestamp(merged[key]):
+                        merged[key] = entry
+
+        data = {"format": SNAPSHOT_FORMAT, "created_at": now, "pid": os.getpid(),
+                "prompt_fingerprint": fingerprint, "caches": caches}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    counts = {name: len(entries) for name, entries in caches.items()}
+    last_snapshot.update({"saved_at": now, "saved": counts, "path": path})
+    logger.debug("Cache snapshot written to %s: %s", path, counts)
+    return counts
+
+
+def restore_snapshot(path: str = CACHE_SNAPSHOT_PATH) -> Dict[str, int]:
+    """Load fresh entries from the snapshot into the registered caches and the shared tier
+
+    Returns:
+        Entries restored per cache
+    """
+    data = _read(path)
+    if data is None:
+        return {}
+    now = time.time()
+    same_prompts = data.get("prompt_fingerprint") == _prompt_fingerprint()
+    restored = {}
+    for name, entries in data.get("caches", {}).items():
+        source = _sources.get(name)
+        if source is None:
+            continue
+        if source.prompt_bound and not same_prompts:
+            logger.info(f"Prompts changed since the snapshot; not restoring {name}")
+            continue
+        count = 0
+        for key, entry in entries.items():
+            if key in source.store or not _is_fresh(source, entry, now):
+                continue
+            source.store[key] = entry
+            if source.shared_namespace:
+                remaining = source.ttl - (now - source.timestamp(entry))
+                value = source.shared_value(entry) if source.shared_value else entry
+                shared_set(source.shared_namespace, key, value, remaining)
+            count += 1
+        restored[name] = count
+
+    age = now - data.get("created_at", now)
+    last_snapshot.update({"restored_at": now, "restored": restored, "snapshot_age_seconds": round(age, 1)})
+    logger.info(f"Restored caches from a {age:.0f}s old snapshot: {restored}")
+    return restored
+
+
+async def _snapshot_periodically(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(save_snapshot)
+        except Exception as e:
+            logger.warning(f"Periodic cache snapshot failed: {e}")
+
+
+def start_cache_snapshots() -> Dict[str, int]:
+    """Restore caches and start periodic snapshots (call from the app lifespan)"""
+    global _task
+    if not CACHE_SNAPSHOT_ENABLED:
+        return {}
+    try:
+        restored = restore_snapshot()
+    except Exception as e:
+        logger.warning(f"Cache restore failed, starting cold: {e}")
+        restored = {}
+    if CACHE_SNAPSHOT_INTERVAL > 0 and _task is None:
+        _task = asyncio.get_running_loop().create_task(_snapshot_periodically(CACHE_SNAPSHOT_INTERVAL))
+    return restored
+
+
+async def stop_cache_snapshots() -> None:
+    """Stop periodic snapshots and write a final one"""
+    global _task
+    if not CACHE_SNAPSHOT_ENABLED:
+        return
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    try:
+        counts = await asyncio.to_thread(save_snapshot)
+        logger.info(f"Cache snapshot written at shutdown: {counts}")
+    except Exception as e:
+        logger.warning(f"Cache snapshot at shutdown failed: {e}")
@@ -0,0 +1,219 @@
+"""
+Record/replay cassettes for Claude API calls
+
+LLM_CASSETTE_MODE=record writes every upstream messages call made by call_claude to an
+append-only JSONL file (LLM_CASSETTE_PATH), one compact line per call:
+
+- the key: a hash of the system prompt, the conversation history, the user message and
+  the generation parameters (model, max_tokens, temperature, tools, tool_choice)
+- the parts it was built from: prompt hash (the same content hash the prompt registry
+  and llm_interactions metadata use), history hash and message hash
+- the response (content blocks, usage, stop reason, model) and the upstream latency
+
+Prompts and student text are stored only as hashes. Join on prompt_hash and time with
+llm_interactions to see what was asked.
+
+LLM_CASSETTE_MODE=replay serves the recorded responses instead of calling the API.
+Each one waits its recorded latency times LLM_CASSETTE_LATENCY_SCALE (0 = full speed).
+A key that was recorded several times replays its responses in order, then repeats the
+last one. A request that was never recorded raises CassetteMiss, which call_claude
+reports like any other API error. With LLM_CASSETTE_MISS=passthrough it goes to the
+API instead.
+
+Recording a day of production traffic and replaying it against a branch gives
+repeatable performance experiments on a real workload.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from backend.utils.metrics import registry
+from backend.utils.prompts import content_hash
+
+logger = logging.getLogger("solbot.cassette")
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", MODE_OFF).lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl")
+# Multiplier on recorded latencies during replay (1 = as recorded, 0 = no delay)
+LLM_CASSETTE_LATENCY_SCALE = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", 1.0))
+# What replay does with an unrecorded request: "error" or "passthrough" (call the API)
+LLM_CASSETTE_MISS = os.getenv("LLM_CASSETTE_MISS", "error").lower()
+
+# Bump when the line layout changes
+CASSETTE_FORMAT = 1
+
+CASSETTE_EVENTS = registry.counter(
+    "solbot_llm_cassette_total",
+    "Claude calls recorded to or replayed from the cassette",
+    ["event"]
+)
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a request the cassette has no recording of"""
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
+
+
+def request_key(params: Dict[str, Any]) -> Dict[str, str]:
+    """Hashes that identify a messages request"""
+    messages = params.get("messages", [])
+    system = params.get("system") or ""
+    parts = {
+        "prompt_hash": content_hash(system if isinstance(system, str) else json.dumps(system, sort_keys=True)),
+        "history_hash": _digest(messages[:-1]),
+        "message_hash": _digest(messages[-1:]),
+        "params_hash": _digest({name: params.get(name) for name in ("model", "max_tokens", "temperature", "tools")
+                                # Only when set, so recordings made without it keep their keys
+                                + (("tool_choice",) if "tool_choice" in params else ())})
+    }
+    parts["key"] = _digest(parts)
+    return parts
+
+
+def _block_to_dict(block: Any) -> Dict[str, Any]:
+    if hasattr(block, "model_dump"):
+        return block.model_dump(exclude_none=True)
+    if isinstance(block, dict):
+        return block
+    return {name: value for name, value in vars(block).items() if value is not None}
+
+
+def _to_response(recorded: Dict[str, Any]) -> SimpleNamespace:
+    """Rebuild an object with the attributes call_claude reads from SDK responses"""
+    return SimpleNamespace(
+        content=[SimpleNamespace(**block) for block in recorded["content"]],
+        usage=SimpleNamespace(**recorded["usage"]),
+        stop_reason=recorded.get("stop_reason"),
+        model=recorded.get("model"),
+        replayed=True
+    )
+
+
+class Cassette:
+    """Append-only JSONL recording of Claude calls, replayable by request key"""
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0, passthrough_misses: bool = False):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.passthrough_misses = passthrough_misses
+        self._lock = threading.Lock()
+        self._recordings: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Dict[str, int] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        if mode == MODE_REPLAY:
+            self.load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == MODE_RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    def load(self) -> int:
+        """Index the cassette file by request key"""
+        self._recordings.clear()
+        self._positions.clear()
+        count = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A torn final line from an interrupted recording
+                    if entry.get("format") != CASSETTE_FORMAT:
+                        continue
+                    self._recordings.setdefault(entry["key"], []).append(entry)
+                    count += 1
+        except FileNotFoundError:
+            logger.warning(f"Cassette {self.path} does not exist; every request will miss")
+        logger.info(f"Loaded {count} recorded Claude calls ({len(self._recordings)} distinct) from {self.path}")
+        return count
+
+    def record(self, params: Dict[str, Any], response: Any, latency: float) -> None:
+        entry = {
+            "format": CASSETTE_FORMAT,
+            **request_key(params),
+            "model": params.get("model"),
+            "max_tokens": params.get("max_tokens"),
+            "temperature": params.get("temperature"),
+            "recorded_at": round(time.time(), 3),
+            "latency_ms": round(latency * 1000, 1),
+            "response": {
+                "content": [_block_to_dict(block) for block in (response.content or [])],
+                "usage": {"input_tokens": response.usage.input_tokens,
+                          "output_tokens": response.usage.output_tokens},
+                "stop_reason": getattr(response, "stop_reason", None),
+                "model": getattr(response, "model", None)
+            }
+        }
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n"
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            logger.warning(f"Could not record Claude call to {self.path}: {e}")
+            return
+        self.stats["recorded"] += 1
+        CASSETTE_EVENTS.inc(event="recorded")
+
+    def lookup(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Next recording for this request, or None"""
+        key = request_key(params)["key"]
+        entries = self._recordings.get(key)
+        if not entries:
+            return None
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+        return entries[min(position, len(entries) - 1)]
+
+    async def replay(self, params: Dict[str, Any]) -> Optional[SimpleNamespace]:
+        """Serve a recorded response (None means: call the API)"""
+        entry = self.lookup(params)
+        if entry is None:
+            self.stats["misses"] += 1
+            CASSETTE_EVENTS.inc(event="miss")
+            if self.passthrough_misses:
+                return None
+            raise CassetteMiss(f"No recording for request {request_key(params)['key']} in {self.path}")
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["latency_ms"] / 1000 * self.latency_scale)
+        self.stats["replayed"] += 1
+        CASSETTE_EVENTS.inc(event="replayed")
+        return _to_response(entry["response"])
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "latency_scale": self.latency_scale,
+            "recordings": sum(len(entries) for entries in self._recordings.values()),
+            **self.stats
+        }
+
+
+cassette: Optional[Cassette] = None
+if LLM_CASSETTE_MODE in (MODE_RECORD, MODE_REPLAY):
+    cassette = Cassette(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE, LLM_CASSETTE_LATENCY_SCALE,
+                        passthrough_misses=LLM_CASSETTE_MISS == "passthrough")
+    logger.warning(f"Claude calls are being {LLM_CASSETTE_MODE}ed ({LLM_CASSETTE_PATH})")
+elif LLM_CASSETTE_MODE != MODE_OFF:
+    logger.warning(f"Unknown LLM_CASSETTE_MODE {LLM_CASSETTE_MODE!r}; cassettes are off")
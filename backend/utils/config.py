@@ -0,0 +1,42 @@
+"""
+Process configuration
+
+Settings come from the environment, optionally populated from a .env file. The file
+is loaded once per process by `load_config()`; modules that read settings with
+os.getenv at import time call it first, and every call after the first is a no-op.
+"""
+
+import logging
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger("solbot.config")
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_config(dotenv_path: Optional[str] = None) -> bool:
+    """Load the .env file into the environment (existing variables win)
+
+    Args:
+        dotenv_path: Explicit .env path (default: DOTENV_PATH or the nearest .env)
+
+    Returns:
+        True if this call loaded the configuration, False if it was already loaded
+    """
+    global _loaded
+    if _loaded:
+        return False
+    with _lock:
+        if _loaded:
+            return False
+        try:
+            from dotenv import load_dotenv
+        except ImportError:
+            logger.warning("python-dotenv is not installed; using the process environment only")
+        else:
+            load_dotenv(dotenv_path or os.getenv("DOTENV_PATH") or None)
+        _loaded = True
+        return True
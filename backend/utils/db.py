@@ -1,33 +1,22 @@
 import os
 import logging
 import json
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
 
-# Define global variables at module level
-supabase_available = False
-create_client = None
-Client = None
+from backend.utils.config import load_config
+from backend.utils.cache_snapshot import SnapshotSource, register_snapshot
+from backend.utils.metrics import DB_FALLBACKS
+from backend.utils.shared_cache import SHARED_CACHE_ENABLED, shared_get, shared_set
+from backend.utils.tracing import traced
 
-try:
-    # Try to import supabase - use proper technique to get global references
-    from supabase import create_client as _create_client, Client as _Client
-    # Explicitly assign to module level variables
-    create_client = _create_client
-    Client = _Client
-    supabase_available = True
-    logging.getLogger("solbot.db").info("Supabase package successfully imported")
-except ImportError as e:
-    # Create placeholder for type hints
-    class Client:
-        pass
-    logging.getLogger("solbot.db").warning(f"Supabase package import failed: {e}. Using in-memory storage.")
-
-from dotenv import load_dotenv
+if TYPE_CHECKING:
+    from supabase import Client
 
 # Load environment variables if not already loaded
-load_dotenv()
+load_config()
 
 logger = logging.getLogger("solbot.db")
 
@@ -36,7 +25,7 @@ supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_KEY")
 
 # Global client
-_supabase_client: Optional[Client] = None
+_supabase_client: Optional["Client"] = None
 # Set to False to use Supabase
 _using_memory_db = os.getenv("USE_MEMORY_DB", "false").lower() == "true"
 
@@ -50,7 +39,14 @@ _memory_db = {
 }
 
 # Add a scaffolding level cache at the top of the file
+# key -> (level, cached_at); backed by the shared cache tier so every worker sees saves
 _scaffolding_cache = {}
+# Seconds an in-process entry is trusted before re-reading the shared tier
+# (bounds how stale a level written by another worker can be)
+SCAFFOLDING_L1_TTL = float(os.getenv("SCAFFOLDING_L1_TTL", 5))
+SCAFFOLDING_CACHE_TTL = float(os.getenv("SCAFFOLDING_CACHE_TTL", 3600))
+register_snapshot(SnapshotSource("scaffolding", _scaffolding_cache, SCAFFOLDING_CACHE_TTL, lambda entry: entry[1],
+                                 shared_namespace="scaffolding", shared_value=lambda entry: entry[0]))
 
 def is_valid_uuid(val):
     """Check if a string is a valid UUID"""
@@ -97,12 +93,6 @@ def init_db():
     """Initialize the database connection or fallback to memory storage"""
     global _supabase_client, _using_memory_db
     
-    # First check if Supabase package is available and create_client is defined
-    if not supabase_available or create_client is None:
-        logger.warning("Supabase package not properly installed or create_client not defined. Using in-memory storage.")
-        _using_memory_db = True
-        return
-    
     # Check if we should use memory DB
     if _using_memory_db:
         logger.info("Using in-memory storage for database operations")
@@ -113,6 +103,14 @@ def init_db():
         _using_memory_db = True
         return
     
+    # Import supabase only when it is actually used (it is slow to import)
+    try:
+        from supabase import create_client
+    except ImportError as e:
+        logger.warning(f"Supabase package import failed: {e}. Using in-memory storage.")
+        _using_memory_db = True
+        return
+    
     try:
         # Create Supabase client
         logger.info(f"Initializing database connection to {supabase_url}")
@@ -151,20 +149,27 @@ def close_db():
     _supabase_client = None
     logger.info("Database connection closed")
 
-def get_db() -> Optional[Client]:
+def ping_db() -> bool:
+    """Run a trivial query to open (or keep open) the database connection
+
+    Returns:
+        True if the database answered, False when using in-memory storage
+    """
+    client = get_db()
+    if client is None:
+        return False
+    client.table("users").select("id").limit(1).execute()
+    return True
+
+def get_db() -> Optional["Client"]:
     """Get the database client if available"""
-    global _supabase_client, supabase_available
-    
-    if not supabase_available:
-        logger.debug("Supabase package not available")
-        return None
-    
     if not _using_memory_db and _supabase_client is None:
         init_db()
     
     return _supabase_client
 
 # User profile operations
+@traced("db.get_user_profile")
 def get_user_profile(user_id: str) -> Dict[str, Any]:
     """Get user profile data from Supabase or memory"""
     if _using_memory_db:
@@ -202,6 +207,7 @@ def get_user_profile(user_id: str) -> Dict[str, Any]:
         logger.error(f"Error fetching user profile: {e}")
         return {"id": user_id}
 
+@traced("db.ensure_user_exists")
 def ensure_user_exists(user_id: str) -> str:
     """Ensure a user exists in the database, creating if needed, and return the UUID"""
     if _using_memory_db:
@@ -257,6 +263,7 @@ def ensure_user_exists(user_id: str) -> str:
         logger.error(f"Error ensuring user exists: {e}")
         return uuid_user_id  # Return the UUID anyway to continue the process
 
+@traced("db.save_message")
 def save_message(user_id: str, conversation_id: str, role: str, content: str, phase: str = None, component: str = None, metadata: dict = None) -> Dict[str, Any]:
     """Save message to database or memory"""
     # Generate a message ID
@@ -363,6 +370,7 @@ def save_message(user_id: str, conversation_id: str, role: str, content: str, ph
                 except Exception as retry_err:
                     logger.error(f"Final attempt failed: {retry_err}")
                     # Fall back to memory storage
+                    DB_FALLBACKS.inc(operation="save_message")
                     _memory_db["messages"].append(message)
                     return message
             else:
@@ -370,9 +378,11 @@ def save_message(user_id: str, conversation_id: str, role: str, content: str, ph
     except Exception as e:
         logger.error(f"Error saving message: {e}")
         # Fall back to memory storage on failure
+        DB_FALLBACKS.inc(operation="save_message")
         _memory_db["messages"].append(message)
         return message
 
+@traced("db.save_scores")
 def save_scores(user_id: str, phase: str, component: str, criteria: str, score: int, feedback: str = None) -> Dict[str, Any]:
     """Save rubric scores to database or memory"""
     # Generate a score ID
@@ -419,9 +429,11 @@ def save_scores(user_id: str, phase: str, component: str, criteria: str, score:
     except Exception as e:
         logger.error(f"Error saving scores: {e}")
         # Fall back to memory storage
+        DB_FALLBACKS.inc(operation="save_scores")
         _memory_db["criterion_scores"].append(score_data)
         return score_data
 
+@traced("db.get_user_scores")
 def get_user_scores(user_id: str, phase: str = None, component: str = None) -> List[Dict[str, Any]]:
     """Get user scores from database or memory with optional filtering"""
     if _using_memory_db:
@@ -482,14 +494,27 @@ def get_user_scores(user_id: str, phase: str = None, component: str = None) -> L
 def get_cached_scaffolding_level(user_id: str, phase: str, component: str = None) -> Optional[int]:
     """Get a cached scaffolding level for the user, phase, and component"""
     cache_key = f"{user_id}:{phase}:{component or 'general'}"
-    return _scaffolding_cache.get(cache_key)
+    entry = _scaffolding_cache.get(cache_key)
+    if entry is not None and (not SHARED_CACHE_ENABLED or time.time() - entry[1] < SCAFFOLDING_L1_TTL):
+        return entry[0]
+    
+    # Fall back to the shared tier, which reflects saves made by any worker
+    level = shared_get("scaffolding", cache_key)
+    if level is not None:
+        _scaffolding_cache[cache_key] = (level, time.time())
+        return level
+    if entry is not None:
+        del _scaffolding_cache[cache_key]
+    return None
 
 def cache_scaffolding_level(user_id: str, phase: str, component: str = None, level: int = 2):
-    """Cache a scaffolding level for the user, phase, and component"""
+    """Cache a scaffolding level for the user, phase, and component (in this worker and the shared tier)"""
     cache_key = f"{user_id}:{phase}:{component or 'general'}"
-    _scaffolding_cache[cache_key] = level
+    _scaffolding_cache[cache_key] = (level, time.time())
+    shared_set("scaffolding", cache_key, level, SCAFFOLDING_CACHE_TTL)
     logger.debug(f"Cached scaffolding level {level} for {cache_key}")
 
+@traced("db.get_scaffolding_level")
 def get_scaffolding_level(user_id: str, phase: str, component: str = None) -> int:
     """Get the scaffolding level for a user in a specific phase and component"""
     # First check the cache
@@ -539,6 +564,7 @@ def get_scaffolding_level(user_id: str, phase: str, component: str = None) -> in
         logger.error(f"Error fetching scaffolding level: {e}")
         return 2  # Default to medium scaffolding on error
 
+@traced("db.save_scaffolding_level")
 def save_scaffolding_level(user_id: str, phase: str, level: int, component: str = None, 
                            conversation_id: str = None, previous_level: int = None, 
                            reason: str = None) -> Dict[str, Any]:
@@ -581,7 +607,7 @@ def save_scaffolding_level(user_id: str, phase: str, level: int, component: str
         "created_at": datetime.now().isoformat()
     }
     
-    # Update the cache first
+    # Update the cache first; overwriting the shared entry invalidates it for every worker
     cache_scaffolding_level(user_id, phase, component, level)
     
     # Use in-memory storage if required
@@ -655,6 +681,7 @@ def save_scaffolding_level(user_id: str, phase: str, level: int, component: str
         logger.error(f"Error saving scaffolding level: {e}")
         
         # Fall back to memory storage
+        DB_FALLBACKS.inc(operation="save_scaffolding_level")
         if "scaffolding_levels" not in _memory_db:
             _memory_db["scaffolding_levels"] = {}
             
@@ -667,6 +694,7 @@ def save_scaffolding_level(user_id: str, phase: str, level: int, component: str
         _memory_db["scaffolding_history"].append(record)
         return record
 
+@traced("db.get_message_count")
 def get_message_count(user_id: str, phase: str, component: str = None) -> int:
     """Get count of messages for this user/phase/component"""
     if _using_memory_db:
@@ -698,6 +726,7 @@ def get_message_count(user_id: str, phase: str, component: str = None) -> int:
         logger.error(f"Error counting messages: {e}")
         return 0
 
+@traced("db.get_messages")
 def get_messages(user_id: str, conversation_id: str, limit: int = 5) -> List[Dict[str, Any]]:
     """Get conversation messages from database or memory
     
@@ -728,11 +757,12 @@ def get_messages(user_id: str, conversation_id: str, limit: int = 5) -> List[Dic
         # Format IDs as UUIDs if needed
         uuid_conv_id = format_uuid(conversation_id, "conv_")
         
-        # Query for messages - note we only filter by conversation_id as user_id column doesn't exist
+        # Query for messages - note we only filter by conversation_id as user_id column doesn't exist.
+        # With a limit, fetch the newest rows (like the memory backend) and put them back in order
         query = (db.table("messages")
                 .select("*")
                 .eq("conversation_id", uuid_conv_id)
-                .order("timestamp", desc=False))
+                .order("timestamp", desc=limit > 0))
         
         # Apply limit if specified
         if limit > 0:
@@ -742,10 +772,11 @@ def get_messages(user_id: str, conversation_id: str, limit: int = 5) -> List[Dic
         
         if not response.data:
             return []
+        rows = list(reversed(response.data)) if limit > 0 else response.data
             
         # Format messages for consistency
         result = []
-        for msg in response.data:
+        for msg in rows:
             # Extract metadata
             metadata = {}
             if "metadata" in msg and msg["metadata"]:
@@ -763,14 +794,17 @@ def get_messages(user_id: str, conversation_id: str, limit: int = 5) -> List[Dic
                 "content": msg.get("content", ""),
                 "phase": metadata.get("phase", ""),
                 "component": metadata.get("component", ""),
-                "timestamp": msg.get("timestamp", "")
+                "timestamp": msg.get("timestamp", ""),
+                "metadata": metadata
             })
             
         return result
     except Exception as e:
         logger.error(f"Error fetching messages: {e}")
+        DB_FALLBACKS.inc(operation="get_messages")
         return []
 
+@traced("db.save_llm_interaction")
 def save_llm_interaction(user_id: str, model: str, tokens_in: int, tokens_out: int, 
                         phase: str = None, component: str = None, metadata: dict = None) -> Dict[str, Any]:
     """Save LLM interaction details to database or memory"""
@@ -884,6 +918,7 @@ def save_llm_interaction(user_id: str, model: str, tokens_in: int, tokens_out: i
                     logger.error(f"Minimal llm_interactions insert failed: {minimal_err}")
             
             # Fall back to memory storage if all database attempts fail
+            DB_FALLBACKS.inc(operation="save_llm_interaction")
             if "llm_interactions" not in _memory_db:
                 _memory_db["llm_interactions"] = []
             _memory_db["llm_interactions"].append(interaction)
@@ -892,6 +927,7 @@ def save_llm_interaction(user_id: str, model: str, tokens_in: int, tokens_out: i
     except Exception as e:
         logger.error(f"Error saving LLM interaction: {e}")
         # Fall back to memory storage
+        DB_FALLBACKS.inc(operation="save_llm_interaction")
         if "llm_interactions" not in _memory_db:
             _memory_db["llm_interactions"] = []
         _memory_db["llm_interactions"].append(interaction)
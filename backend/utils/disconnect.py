@@ -0,0 +1,75 @@
+"""
+Client disconnect detection for long-running chat requests
+
+When a student navigates away or the Next.js proxy gives up, there is no point in
+waiting for Claude and persisting a response nobody will read. `cancel_on_disconnect`
+runs the awaitable while polling the HTTP connection and cancels it as soon as the
+client is gone.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Optional
+
+from fastapi import Request
+
+logger = logging.getLogger("solbot.disconnect")
+
+# How often to check whether the client is still connected (seconds)
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", 0.5))
+
+disconnect_stats = {
+    "requests_abandoned": 0  # requests whose LLM call was cancelled because the client left
+}
+
+
+class ClientDisconnected(Exception):
+    """Raised when the HTTP client went away before the work finished"""
+
+
+async def cancel_on_disconnect(http_request: Optional[Request], awaitable: Awaitable[Any],
+                               poll_interval: float = DISCONNECT_POLL_INTERVAL) -> Any:
+    """Await `awaitable`, cancelling it if the HTTP client disconnects first
+
+    Args:
+        http_request: The incoming request to watch (None disables the check)
+        awaitable: The work to run, typically a `call_claude(...)` coroutine
+        poll_interval: Seconds between connection checks
+
+    Returns:
+        The result of the awaitable
+
+    Raises:
+        ClientDisconnected: if the client disconnected before the work finished
+    """
+    if http_request is None:
+        return await awaitable
+
+    if await http_request.is_disconnected():
+        # The client left while the request was queued - don't start the work at all
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        disconnect_stats["requests_abandoned"] += 1
+        raise ClientDisconnected()
+
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    disconnect_stats["requests_abandoned"] += 1
+    logger.info("Client disconnected, cancelled in-flight work")
+    raise ClientDisconnected()
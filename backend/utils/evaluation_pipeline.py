@@ -0,0 +1,165 @@
+"""
+Split evaluation and guidance for submissions
+
+With EVALUATION_PIPELINE=single (the default) one Claude call writes the greeting,
+assessment and guidance and ends with the INSTRUCTOR_METADATA block, so the score and
+scaffolding level are only known once the whole reply has been generated.
+
+The other modes make two calls:
+
+- An evaluation call with a small max_tokens budget (SPLIT_EVALUATION_MAX_TOKENS) that
+  is forced to call the evaluate_response tool. Its reply is a few dozen tokens of typed
+  scores, so they can be persisted long before the feedback is written.
+- A guidance call that writes the feedback without metadata.
+
+In "split" mode the guidance call starts once the evaluation is in and is told the
+scaffolding level it decided. In "parallel" mode both start at once and the guidance
+is conditioned on a provisional level (the student's last level, or one derived from
+the pre-scorer), which trades some consistency for the latency of the evaluation call.
+Either way the scores that are stored come from the evaluation call.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.models.schemas import EvaluationResults
+from backend.utils.llm import EVALUATION_TOOL_NAME, call_claude, get_rubric_evaluation_tool, parse_evaluation
+from backend.utils.metrics import observe_stage
+from backend.utils.prompts import MODE_EVALUATION, MODE_GUIDANCE, get_prompt
+
+logger = logging.getLogger("solbot.evaluation_pipeline")
+
+PIPELINE_SINGLE = "single"
+PIPELINE_SPLIT = "split"
+PIPELINE_PARALLEL = "parallel"
+
+EVALUATION_PIPELINE = os.getenv("EVALUATION_PIPELINE", PIPELINE_SINGLE).lower()
+SPLIT_EVALUATION_MAX_TOKENS = int(os.getenv("SPLIT_EVALUATION_MAX_TOKENS", 400))
+
+_SUPPORT = {1: "high", 2: "medium", 3: "low"}
+
+
+def split_enabled(phase: str, component: str) -> bool:
+    """Whether submissions for this phase and component use the two-call pipeline"""
+    return EVALUATION_PIPELINE in (PIPELINE_SPLIT, PIPELINE_PARALLEL) and bool(get_rubric_evaluation_tool(phase, component))
+
+
+def provisional_level(cached_level: Optional[int], high_support_probability: Optional[float]) -> int:
+    """Scaffolding level to write guidance for before the evaluation is known"""
+    if cached_level is not None:
+        return cached_level
+    if high_support_probability is not None and high_support_probability >= 0.5:
+        return 1
+    return 2
+
+
+def guidance_note(level: int, evaluation: Optional[EvaluationResults] = None) -> str:
+    """Appended to the student's text for the guidance call"""
+    if evaluation is None:
+        return f"\n\n[Scaffolding: {_SUPPORT.get(level, 'medium')} support]"
+    scores = ", ".join(f"{result.criteria}: {result.score}" for result in evaluation.criteria_scores)
+    return (f"\n\n[Scaffolding: {_SUPPORT.get(evaluation.scaffolding_level, 'medium')} support. "
+            f"Scores: {scores}]")
+
+
+async def evaluate_and_guide(
+    message: str,
+    chat_history: List[Dict[str, Any]],
+    phase: str,
+    component: str,
+    submission_type: Optional[str],
+    route: Dict[str, Any],
+    provisional: int,
+    on_evaluation: Optional[Callable[[EvaluationResults], None]] = None,
+    temperature: float = 0.5,
+    budget_key: Optional[str] = None,
+    user_id: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+    message_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Run the evaluation and guidance calls for one submission
+
+    Args:
+        message: The student's submission
+        chat_history: Conversation history for both calls
+        phase: The learning phase
+        component: The component within the phase
+        submission_type: Submission type for the prompt
+        route: Routing decision (model and max_tokens for the guidance call)
+        provisional: Scaffolding level for guidance written before the evaluation is in
+        on_evaluation: Called with the evaluation as soon as it is available
+        temperature: Temperature of the guidance call (the evaluation uses 0)
+        budget_key: token_budget key the guidance call's output length is recorded under
+        user_id, conversation_id, message_id: For interaction logging
+
+    Returns:
+        A call_claude-style result: the guidance content, summed usage, and
+        "evaluation" (EvaluationResults or None) and "evaluation_seconds"
+    """
+    parallel = EVALUATION_PIPELINE == PIPELINE_PARALLEL
+    evaluation_prompt = get_prompt(phase, component, MODE_EVALUATION, submission_type)
+    guidance_prompt = get_prompt(phase, component, MODE_GUIDANCE, submission_type)
+    context = {"user_id": user_id, "conversation_id": conversation_id, "message_id": message_id,
+               "phase": phase, "component": component, "model": route["model"], "route": route["name"]}
+    start = time.perf_counter()
+
+    async def evaluate():
+        result = await call_claude(
+            system_prompt=evaluation_prompt.content,
+            user_message=message,
+            chat_history=chat_history,
+            tools=get_rubric_evaluation_tool(phase, component),
+            tool_choice={"type": "tool", "name": EVALUATION_TOOL_NAME},
+            temperature=0.0,
+            max_tokens=SPLIT_EVALUATION_MAX_TOKENS,
+            prompt_hash=evaluation_prompt.hash,
+            **context
+        )
+        elapsed = time.perf_counter() - start
+        observe_stage("evaluation", elapsed, phase, component)
+        evaluation = parse_evaluation(result) if "error" not in result else None
+        if evaluation is None:
+            logger.warning("Evaluation call for %s/%s returned no usable scores", phase, component)
+        elif on_evaluation is not None:
+            try:
+                on_evaluation(evaluation)
+            except Exception as e:
+                logger.error(f"Error handling early evaluation: {e}")
+        return result, evaluation, elapsed
+
+    def guide(note: str):
+        return call_claude(
+            system_prompt=guidance_prompt.content,
+            user_message=message + note,
+            chat_history=chat_history,
+            temperature=temperature,
+            max_tokens=route["max_tokens"],
+            prompt_hash=guidance_prompt.hash,
+            budget_key=budget_key,
+            **context
+        )
+
+    if parallel:
+        evaluation_task = asyncio.ensure_future(evaluate())
+        try:
+            guidance = await guide(guidance_note(provisional))
+            evaluation_result, evaluation, evaluation_seconds = await evaluation_task
+        finally:
+            if not evaluation_task.done():
+                evaluation_task.cancel()
+    else:
+        evaluation_result, evaluation, evaluation_seconds = await evaluate()
+        guidance = await guide(guidance_note(provisional, evaluation))
+
+    usage = {name: guidance.get("usage", {}).get(name, 0) + evaluation_result.get("usage", {}).get(name, 0)
+             for name in ("input_tokens", "output_tokens")}
+    return {
+        **guidance,
+        "usage": usage,
+        "evaluation": evaluation,
+        "evaluation_seconds": evaluation_seconds,
+        "cache_hit": guidance.get("cache_hit", False) and evaluation_result.get("cache_hit", False)
+    }
@@ -0,0 +1,168 @@
+"""
+Per-key async locks
+
+Two quick messages on the same conversation used to race: both could see the
+conversation missing and insert it (sending save_message down its foreign-key retry
+path), and both read history that was about to change. A `KeyedLock` serializes work
+per key, such as a conversation id, while other keys proceed in parallel:
+
+    async with conversation_locks.hold(conversation_id):
+        ...
+
+- local (default): one asyncio.Lock per key, created on first use and dropped as soon
+  as nobody holds or waits for it, so idle keys cost nothing and nothing needs sweeping.
+- flock: additionally takes an exclusive flock() on one of `shards` files in the lock
+  directory, chosen by a hash of the key, so workers on one host serialize too. Keys
+  that share a shard also wait for each other; more shards make that rarer. The kernel
+  drops the lock if a worker dies.
+
+A waiter gives up after `timeout` seconds and proceeds without the lock rather than
+failing the request. Wait times go to solbot_lock_wait_seconds{lock} and give-ups to
+solbot_lock_timeouts_total{lock}.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import zlib
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from backend.utils.metrics import registry
+
+logger = logging.getLogger("solbot.keyed_lock")
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+BACKEND_LOCAL = "local"
+BACKEND_FLOCK = "flock"
+
+CONVERSATION_LOCK_ENABLED = os.getenv("CONVERSATION_LOCK_ENABLED", "true").lower() == "true"
+CONVERSATION_LOCK_BACKEND = os.getenv("CONVERSATION_LOCK_BACKEND", BACKEND_LOCAL).lower()
+CONVERSATION_LOCK_TIMEOUT = float(os.getenv("CONVERSATION_LOCK_TIMEOUT", 30))
+CONVERSATION_LOCK_SHARDS = int(os.getenv("CONVERSATION_LOCK_SHARDS", 64))
+CONVERSATION_LOCK_DIR = os.getenv("CONVERSATION_LOCK_DIR", os.getenv("LEADER_LOCK_DIR", "/tmp"))
+
+LOCK_WAIT = registry.histogram(
+    "solbot_lock_wait_seconds",
+    "Time spent waiting for a keyed lock",
+    ["lock"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+LOCK_TIMEOUTS = registry.counter(
+    "solbot_lock_timeouts_total",
+    "Keyed lock waits that gave up and proceeded without the lock",
+    ["lock"]
+)
+
+
+class KeyedLock:
+    """Serializes async work per key; different keys run in parallel"""
+
+    def __init__(self, name: str, backend: str = BACKEND_LOCAL, timeout: float = 30.0, shards: int = 64,
+                 lock_dir: str = "/tmp"):
+        if backend == BACKEND_FLOCK and fcntl is None:
+            logger.warning(f"flock is unavailable; {name} locks are per process")
+            backend = BACKEND_LOCAL
+        self.name = name
+        self.backend = backend
+        self.timeout = timeout
+        self.shards = shards
+        self.lock_dir = lock_dir
+        # key -> [asyncio.Lock, number of holders and waiters]
+        self._entries: Dict[str, List[Any]] = {}
+        self.stats = {"acquired": 0, "contended": 0, "timeouts": 0}
+
+    def shard(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shards
+
+    async def _acquire_local(self, lock: asyncio.Lock, timeout: float) -> bool:
+        if not lock.locked():
+            return await lock.acquire()  # Uncontended: returns without yielding to the loop
+        self.stats["contended"] += 1
+        task = asyncio.ensure_future(lock.acquire())
+        try:
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+        except asyncio.CancelledError:
+            # The caller was cancelled: the acquire must not go on to take the lock for nobody
+            task.cancel()
+            if task.done() and not task.cancelled():
+                lock.release()
+            raise
+        if done:
+            return True
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return False
+        return True  # Acquired just as the wait timed out
+
+    async def _acquire_file(self, key: str, deadline: float) -> Optional[Any]:
+        path = os.path.join(self.lock_dir, f"solbot-{self.name}-{self.shard(key):03d}.lock")
+        try:
+            lock_file = open(path, "a+")
+        except OSError as e:
+            logger.warning(f"Cannot open lock file {path}: {e}")
+            return None
+        delay = 0.005
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except OSError:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                lock_file.close()
+                return None
+            # Polling keeps the event loop free; a blocking flock would stall every request
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        """Hold the lock for `key`; yields False if the wait timed out and the lock was skipped"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        lock: asyncio.Lock = entry[0]
+        start = time.perf_counter()
+        acquired = False
+        lock_file = None
+        try:
+            acquired = await self._acquire_local(lock, self.timeout)
+            if acquired and self.backend == BACKEND_FLOCK:
+                lock_file = await self._acquire_file(key, start + self.timeout)
+            waited = time.perf_counter() - start
+            LOCK_WAIT.observe(waited, lock=self.name)
+            locked = acquired and (lock_file is not None or self.backend != BACKEND_FLOCK)
+            if locked:
+                self.stats["acquired"] += 1
+            else:
+                self.stats["timeouts"] += 1
+                LOCK_TIMEOUTS.inc(lock=self.name)
+                logger.warning("Gave up waiting %.1fs for %s lock on %s; proceeding without it",
+                               waited, self.name, key[:16])
+            yield locked
+        finally:
+            if lock_file is not None:
+                lock_file.close()  # Closing the descriptor drops the flock
+            if acquired:
+                lock.release()
+            entry[1] -= 1
+            if entry[1] == 0 and self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def status(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "timeout": self.timeout, "active_keys": len(self._entries),
+                "waiting": sum(max(0, holders - 1) for _, holders in self._entries.values()), **self.stats}
+
+
+conversation_locks = KeyedLock("conversation", CONVERSATION_LOCK_BACKEND, CONVERSATION_LOCK_TIMEOUT,
+                               CONVERSATION_LOCK_SHARDS, CONVERSATION_LOCK_DIR)
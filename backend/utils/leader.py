@@ -0,0 +1,214 @@
+"""
+Leader election for singleton background jobs
+
+`run_backend.py` starts several uvicorn workers on one host, and every worker runs
+the app lifespan. Jobs that must run once per host (the self-ping, flushers, job
+runners) are wrapped in a `SingletonJob`, which campaigns for leadership and only
+runs the job while it leads.
+
+Leadership is an exclusive, non-blocking flock() on a per-job file in
+LEADER_LOCK_DIR. The kernel drops the lock when the leader process exits or dies.
+Followers retry every LEADER_RETRY_INTERVAL seconds, so the job fails over to a
+surviving worker within one interval. If the job itself crashes, the leader steps
+down so another worker can take over.
+
+LEADER_BACKEND=local (the default where fcntl is unavailable) swaps the file lock
+for an in-process lock. Each process then leads its own jobs, which is right for a
+single worker, tests and platforms without flock.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.utils.metrics import registry
+
+logger = logging.getLogger("solbot.leader")
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LEADER_BACKEND = os.getenv("LEADER_BACKEND", "flock" if fcntl is not None else "local").lower()
+LEADER_LOCK_DIR = os.getenv("LEADER_LOCK_DIR", "/tmp")
+LEADER_RETRY_INTERVAL = float(os.getenv("LEADER_RETRY_INTERVAL", 5))
+# Seconds to wait before campaigning again after the job crashed while leading
+LEADER_CRASH_BACKOFF = float(os.getenv("LEADER_CRASH_BACKOFF", 30))
+
+IS_LEADER = registry.gauge(
+    "solbot_leader",
+    "1 if this worker currently leads the singleton job",
+    ["job"]
+)
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+class _FileLease:
+    """Exclusive flock on LEADER_LOCK_DIR/solbot-<name>.lock"""
+
+    def __init__(self, name: str):
+        self.path = os.path.join(LEADER_LOCK_DIR, f"solbot-{name}.lock")
+        self._file = None
+
+    def acquire(self) -> bool:
+        try:
+            lock_file = open(self.path, "a+")
+        except OSError as e:
+            logger.warning(f"Cannot open leader lock {self.path}: {e}")
+            return False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()  # Another process leads
+            return False
+        # Record the holder for humans; the lock itself is what counts
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{os.getpid()}\n")
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            self._file.close()  # Closing the descriptor drops the flock
+            self._file = None
+
+    def holder(self) -> Optional[int]:
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+
+class _LocalLease:
+    """In-process stand-in: one leader per name within this process"""
+
+    def __init__(self, name: str):
+        with _local_locks_guard:
+            self._lock = _local_locks.setdefault(name, threading.Lock())
+        self._held = False
+
+    def acquire(self) -> bool:
+        if not self._held:
+            self._held = self._lock.acquire(blocking=False)
+        return self._held
+
+    def release(self) -> None:
+        if self._held:
+            self._held = False
+            self._lock.release()
+
+    def holder(self) -> Optional[int]:
+        return os.getpid() if self._lock.locked() else None
+
+
+class SingletonJob:
+    """Runs an async job in at most one worker per host, with failover"""
+
+    def __init__(self, name: str, job: Callable[[], Awaitable[Any]], retry_interval: float = LEADER_RETRY_INTERVAL,
+                 backend: str = LEADER_BACKEND):
+        self.name = name
+        self.job = job
+        self.retry_interval = retry_interval
+        self.backend = backend if fcntl is not None else "local"
+        self._lease = _FileLease(name) if self.backend == "flock" else _LocalLease(name)
+        self.is_leader = False
+        self.elected_at: Optional[float] = None
+        self.terms = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._campaign())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._step_down()
+
+    def _step_down(self) -> None:
+        if self.is_leader:
+            logger.info(f"Worker {os.getpid()} stepped down as leader of {self.name}")
+        self.is_leader = False
+        self.elected_at = None
+        IS_LEADER.set(0, job=self.name)
+        self._lease.release()
+
+    async def _campaign(self) -> None:
+        IS_LEADER.set(0, job=self.name)
+        while True:
+            if not self._lease.acquire():
+                await asyncio.sleep(self.retry_interval)
+                continue
+
+            self.is_leader = True
+            self.elected_at = time.time()
+            self.terms += 1
+            IS_LEADER.set(1, job=self.name)
+            logger.info(f"Worker {os.getpid()} is now leader of {self.name}")
+            try:
+                await self.job()
+                logger.info(f"Singleton job {self.name} finished")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Singleton job {self.name} crashed: {e}", exc_info=True)
+            finally:
+                self._step_down()
+            # Let another worker take over before trying again ourselves
+            await asyncio.sleep(max(self.retry_interval, LEADER_CRASH_BACKOFF))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "job": self.name,
+            "backend": self.backend,
+            "leader": self.is_leader,
+            "leader_pid": self._lease.holder(),
+            "elected_at": self.elected_at,
+            "terms": self.terms
+        }
+
+
+_jobs: Dict[str, SingletonJob] = {}
+
+
+def run_singleton(name: str, job: Callable[[], Awaitable[Any]], **options: Any) -> SingletonJob:
+    """Campaign for `name` in this worker and run `job` whenever it leads (call from the lifespan)
+
+    Args:
+        name: Job name; workers that use the same name share one leader
+        job: Coroutine function run while leading; it normally loops until cancelled
+        **options: retry_interval or backend overrides
+
+    Returns:
+        The SingletonJob (see `status()`)
+    """
+    singleton = _jobs.get(name)
+    if singleton is None:
+        singleton = _jobs[name] = SingletonJob(name, job, **options)
+    singleton.start()
+    return singleton
+
+
+async def stop_singletons() -> None:
+    for singleton in list(_jobs.values()):
+        await singleton.stop()
+    _jobs.clear()
+
+
+def leadership_status() -> List[Dict[str, Any]]:
+    return [singleton.status() for singleton in _jobs.values()]
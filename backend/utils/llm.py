@@ -7,18 +7,29 @@ import os
 import json
 from typing import Dict, List, Any, Optional, Union
 import asyncio
-from anthropic import AsyncAnthropic
-from dotenv import load_dotenv
+import functools
 import hashlib
+import threading
 import time
-import aiohttp
 import traceback
 import uuid
 import datetime
 
+from pydantic import ValidationError
+
+from backend.models.schemas import EvaluationResults
+from backend.utils.config import load_config
+from backend.utils.cache_snapshot import SnapshotSource, register_snapshot
+from backend.utils.cassette import cassette
+from backend.utils.prompts import get_prompt_key
+from backend.utils.shared_cache import shared_get, shared_set
+from backend.utils.token_budget import token_budget
+from backend.utils.tracing import span, traced
+from backend.utils.metrics import CACHE_REQUESTS, DB_FALLBACKS, LLM_ERRORS, LLM_OUTPUT_TOKENS, LLM_RETRIES, LLM_TOKENS
+from prompt_engineering.rubrics import RUBRICS
 
 # Load environment variables
-load_dotenv()
+load_config()
 
 # Configure logging
 logger = logging.getLogger("solbot.llm")
@@ -26,52 +37,113 @@ logger = logging.getLogger("solbot.llm")
 # Get API key from environment - IMPORTANT: Must be named ANTHROPIC_API_KEY 
 # The correct environment variable name is "ANTHROPIC_API_KEY" (not CLAUDE_API_KEY)
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-# Hard-code the model to ensure we use the right version
-CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
+# Alternate API endpoint, e.g. the offline stand-in in backend/benchmarks/mock_llm.py
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL") or None
+# Default model; backend.utils.routing may pick a different one per request
+CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-3-5-sonnet-20241022")
 
 logger.info(f"Using Claude model: {CLAUDE_MODEL}")
 
-# Initialize Anthropic client with increased timeout
-try:
-    client = AsyncAnthropic(
-        api_key=ANTHROPIC_API_KEY,
-        timeout=60.0  # Increase timeout to 60 seconds
-    )
-    logger.info(f"Anthropic client initialized with model: {CLAUDE_MODEL}")
-except Exception as e:
-    logger.error(f"Error initializing Anthropic client: {e}")
-    client = None
+# Idle seconds before a pooled API connection is closed (httpx defaults to 5s, which
+# means a new TLS handshake for almost every request; see backend.utils.prewarm)
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 120))
+
+# Anthropic client, created on first use: importing the SDK takes over a second, which
+# would otherwise be paid by every worker before it can answer a health check.
+# Tests and benchmarks may assign `client` directly to substitute a fake.
+client = None
+_client_lock = threading.Lock()
+# Connection-level errors raised by the SDK (filled in when the client is created)
+_CONNECTION_ERRORS: tuple = ()
+
+
+def get_client():
+    """Return the shared Anthropic client, creating it on first call"""
+    global client, _CONNECTION_ERRORS
+    if client is not None:
+        return client
+    with _client_lock:
+        if client is None:
+            try:
+                import httpx
+                from anthropic import APIConnectionError, AsyncAnthropic
+                _CONNECTION_ERRORS = (APIConnectionError,)
+                options = {}
+                try:
+                    from anthropic import DefaultAsyncHttpxClient
+                    options["http_client"] = DefaultAsyncHttpxClient(limits=httpx.Limits(
+                        max_connections=1000, max_keepalive_connections=100, keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                    ))
+                except ImportError:
+                    pass  # Older SDKs: default pool settings
+                if ANTHROPIC_BASE_URL:
+                    options["base_url"] = ANTHROPIC_BASE_URL
+                    logger.warning(f"Anthropic client using base URL {ANTHROPIC_BASE_URL}")
+                client = AsyncAnthropic(
+                    api_key=ANTHROPIC_API_KEY,
+                    timeout=60.0,  # Increase timeout to 60 seconds
+                    **options
+                )
+                logger.info(f"Anthropic client initialized with model: {CLAUDE_MODEL}")
+            except Exception as e:
+                logger.error(f"Error initializing Anthropic client: {e}")
+                raise
+    return client
+
+# How submissions are scored: "metadata" (INSTRUCTOR_METADATA block in the reply text)
+# or "tool" (a structured evaluate_response tool call, see get_rubric_evaluation_tool)
+EVALUATION_MODE = os.getenv("EVALUATION_MODE", "metadata").lower()
+EVALUATION_TOOL_NAME = "evaluate_response"
+# prompt key -> [tool]; stable list objects so cache keys and request bodies are reused
+_tool_lists: Dict[str, List[Dict[str, Any]]] = {}
 
 # Simple in-memory LRU cache with expiry
 response_cache = {}
 cache_size_limit = 150  # Increased from 100 to 150 to store more responses
 cache_ttl = 1200  # Increased from 600 (10 minutes) to 1200 (20 minutes)
 
+# Persisted across restarts (see backend.utils.cache_snapshot)
+register_snapshot(SnapshotSource("llm_response", response_cache, cache_ttl, lambda entry: entry["timestamp"],
+                                 prompt_bound=True, shared_namespace="llm_response"))
+
+# Upstream calls currently in flight, keyed by cache key (see _create_message_shared)
+_inflight_calls: Dict[str, Dict[str, Any]] = {}
+coalescing_stats = {
+    "coalesced": 0,  # callers that joined an existing in-flight call
+    "cancelled": 0,  # upstream calls cancelled because every caller went away
+    "detached": 0    # callers that went away while others kept waiting
+}
+
 # Local memory DB fallback for logging
 local_memory_db = {
     "llm_interactions": []
 }
 
-def create_cache_key(system_prompt: str, user_message: str, tools: Optional[List[Dict[str, Any]]] = None, chat_history: Optional[List[Dict[str, Any]]] = None) -> str:
+def create_cache_key(system_prompt: str, user_message: str, tools: Optional[List[Dict[str, Any]]] = None, chat_history: Optional[List[Dict[str, Any]]] = None, model: str = "", prompt_hash: Optional[str] = None, tool_choice: Optional[Dict[str, Any]] = None) -> str:
     """Create a cache key for the given parameters with fuzzy matching"""
-    # Create a string representation of parameters that's more likely to match similar requests
-    # Truncate the system prompt to first 800 chars to increase cache hits
-    system_truncated = system_prompt[:800] if system_prompt else ""
+    # Identify the system prompt by its registry content hash; hash the full text for ad-hoc prompts
+    # (a truncated prefix would let prompts that only differ further down share responses)
+    prompt_id = prompt_hash or hashlib.md5((system_prompt or "").encode()).hexdigest()
     
     # Only use essential parts for the key
     key_parts = [
-        system_truncated,
+        prompt_id,
         user_message.strip(),  # Remove whitespace for better matching
         # Only include tools if actually present
         json.dumps(tools) if tools else "",
         # Only use the last message from chat history for caching to increase cache hits
-        json.dumps(chat_history[-1:]) if chat_history else ""
+        json.dumps(chat_history[-1:]) if chat_history else "",
+        # Different models must not share cached responses
+        model
     ]
+    if tools and tool_choice:
+        key_parts.append(json.dumps(tool_choice, sort_keys=True))
     
     # Create a hash of the key parts
     key = hashlib.md5("".join(key_parts).encode()).hexdigest()
     return key
 
+@traced("log_llm_interaction")
 async def log_llm_interaction(
     user_id: Optional[str] = None,
     conversation_id: Optional[str] = None,
@@ -102,6 +174,11 @@ async def log_llm_interaction(
     # Declare global at the top of the function
     global local_memory_db
     
+    # Feed the output-length histograms (fresh, successful replies only)
+    if metadata and metadata.get("budget_key") and not cache_hit and output_tokens:
+        token_budget.observe(metadata["budget_key"], output_tokens,
+                             truncated=metadata.get("stop_reason") == "max_tokens")
+    
     # Import here to avoid circular imports
     try:
         from backend.utils.db import get_db
@@ -197,12 +274,120 @@ async def log_llm_interaction(
         except Exception as db_error:
             logger.warning(f"Error saving to database: {db_error}")
             # Fallback to memory storage but don't let it interrupt the main thread
+            DB_FALLBACKS.inc(operation="log_llm_interaction")
             local_memory_db["llm_interactions"].append(interaction)
             
     except Exception as e:
         # Make sure this function never fails and interrupts the main application flow
         logger.error(f"Error logging LLM interaction: {e}")
 
+async def _create_message(params: Dict[str, Any], api_timeout: float, max_retries: int):
+    """Call the messages API with a per-attempt timeout, retrying failed attempts"""
+    # Serve the call from a recorded cassette instead (see backend.utils.cassette)
+    if cassette is not None and cassette.replaying:
+        with span("cassette_replay", model=params.get("model")):
+            recorded = await cassette.replay(params)
+        if recorded is not None:
+            return recorded
+    
+    retry_count = 0
+    last_error = None
+    
+    while retry_count <= max_retries:
+        try:
+            # The first call imports the SDK; do that off the event loop
+            api_client = client or await asyncio.to_thread(get_client)
+            # Create the API call as a task
+            api_task = api_client.messages.create(**params)
+            
+            # Wait for the task with a timeout
+            attempt_start = time.perf_counter()
+            with span("anthropic_request", attempt=retry_count + 1, model=params.get("model")):
+                response = await asyncio.wait_for(api_task, timeout=api_timeout)
+            if cassette is not None and cassette.recording:
+                cassette.record(params, response, time.perf_counter() - attempt_start)
+            
+            # If we get here, the call succeeded
+            break
+            
+        except asyncio.TimeoutError:
+            retry_count += 1
+            last_error = "timeout"
+            LLM_RETRIES.inc(reason="timeout")
+            logger.warning("API call timed out (attempt %d/%d)", retry_count, max_retries)
+            if retry_count <= max_retries:
+                # Wait before retrying
+                await asyncio.sleep(2)
+            else:
+                # Max retries reached, re-raise
+                raise
+                
+        except _CONNECTION_ERRORS as e:
+            retry_count += 1
+            last_error = f"connection: {str(e)}"
+            LLM_RETRIES.inc(reason="connection")
+            logger.warning("API connection error (attempt %d/%d): %s", retry_count, max_retries, e)
+            if retry_count <= max_retries:
+                # Wait before retrying
+                await asyncio.sleep(2)
+            else:
+                # Max retries reached, re-raise
+                raise
+                
+        except Exception as e:
+            retry_count += 1
+            last_error = f"other: {str(e)}"
+            LLM_RETRIES.inc(reason="other")
+            logger.warning("API call error (attempt %d/%d): %s", retry_count, max_retries, e)
+            if retry_count <= max_retries:
+                # Wait before retrying
+                await asyncio.sleep(2)
+            else:
+                # Max retries reached, re-raise
+                raise
+    
+    # Check if we exhausted all retries
+    if retry_count > max_retries:
+        raise Exception(f"Failed after {max_retries} retries. Last error: {last_error}")
+    
+    return response
+
+async def _create_message_shared(cache_key: str, params: Dict[str, Any], api_timeout: float, max_retries: int):
+    """Coalesce identical in-flight API calls into one upstream request
+    
+    Every caller waits on the same task through a shield. A caller that is cancelled
+    (e.g. because its HTTP client disconnected) only detaches; the upstream request is
+    cancelled once no caller is left waiting for it.
+    """
+    entry = _inflight_calls.get(cache_key)
+    if entry is None:
+        task = asyncio.ensure_future(_create_message(params, api_timeout, max_retries))
+        entry = {"task": task, "waiters": 0}
+        _inflight_calls[cache_key] = entry
+        
+        def _forget(_task, key=cache_key, owner=entry):
+            if _inflight_calls.get(key) is owner:
+                del _inflight_calls[key]
+        task.add_done_callback(_forget)
+    else:
+        coalescing_stats["coalesced"] += 1
+        logger.debug("Joining in-flight Claude call for %s...", cache_key[:8])
+    
+    entry["waiters"] += 1
+    try:
+        return await asyncio.shield(entry["task"])
+    except asyncio.CancelledError:
+        if entry["waiters"] == 1 and not entry["task"].done():
+            entry["task"].cancel()
+            coalescing_stats["cancelled"] += 1
+            logger.info("Cancelled upstream Claude call for %s: no callers left", cache_key[:8])
+        else:
+            coalescing_stats["detached"] += 1
+        raise
+    finally:
+        entry["waiters"] -= 1
+
+@traced("call_claude")
 async def call_claude(
     system_prompt: str,
     user_message: str,
@@ -216,7 +401,12 @@ async def call_claude(
     conversation_id: Optional[str] = None,
     message_id: Optional[str] = None,
     phase: Optional[str] = None,
-    component: Optional[str] = None
+    component: Optional[str] = None,
+    model: Optional[str] = None,
+    route: Optional[str] = None,
+    prompt_hash: Optional[str] = None,
+    tool_choice: Optional[Dict[str, Any]] = None,
+    budget_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Call Claude with the specified prompts and parameters
@@ -235,6 +425,11 @@ async def call_claude(
         message_id: Optional message ID for logging
         phase: Optional phase for logging
         component: Optional component for logging
+        model: Optional model override (default: CLAUDE_MODEL)
+        route: Optional routing decision name for logging
+        prompt_hash: Optional prompt registry hash, used for the cache key and logging
+        tool_choice: Optional tool_choice, e.g. {"type": "tool", "name": ...} to force a tool call
+        budget_key: Optional token_budget key; the reply's length is added to its histogram
         
     Returns:
         Dictionary containing the model's response
@@ -242,19 +437,26 @@ async def call_claude(
     # Track request start time
     request_timestamp = time.time()
     cache_hit = False
+    model = model or CLAUDE_MODEL
     
     try:
         # Optimize: Cache for temperatures up to 0.6 for more cache hits
         if use_cache and temperature <= 0.6:
-            cache_key = create_cache_key(system_prompt, user_message, tools, chat_history)
+            cache_key = create_cache_key(system_prompt, user_message, tools, chat_history, model, prompt_hash,
+                                         tool_choice)
             
-            # Check if we have a cached response
+            # Check if we have a cached response (here, or from another worker via the shared tier)
+            if cache_key not in response_cache:
+                shared_entry = shared_get("llm_response", cache_key)
+                if shared_entry is not None:
+                    response_cache[cache_key] = shared_entry
             if cache_key in response_cache:
                 cache_entry = response_cache[cache_key]
                 
                 # Check if cache entry is still valid
                 if time.time() - cache_entry["timestamp"] < cache_ttl:
-                    logger.info(f"Using cached response for {cache_key[:8]}...")
+                    logger.debug("Using cached response for %s...", cache_key[:8])
+                    CACHE_REQUESTS.inc(cache="llm_response", result="hit")
                     
                     # Extract response from cache
                     result = cache_entry["response"]
@@ -274,7 +476,7 @@ async def call_claude(
                         user_message=user_message,
                         raw_llm_response=result.get("content", ""),
                         processed_response=result.get("content", ""),
-                        model_name=result.get("model", CLAUDE_MODEL),
+                        model_name=result.get("model", model),
                         temperature=temperature,
                         max_tokens=max_tokens,
                         input_tokens=result.get("usage", {}).get("input_tokens", 0),
@@ -284,16 +486,19 @@ async def call_claude(
                         duration_ms=int((response_timestamp - request_timestamp) * 1000),
                         cache_hit=True,
                         metadata={
-                            "tools": tools,
+                            "tools": [tool["name"] for tool in tools] if tools else None,
                             "cache_key": cache_key,
+                            "route": route,
+                            "prompt_hash": prompt_hash,
                             "chat_history_length": len(chat_history) if chat_history else 0
                         }
                     )
                     
-                    return result
+                    return {**result, "cache_hit": True}
                 else:
                     # Remove expired cache entry
                     del response_cache[cache_key]
+            CACHE_REQUESTS.inc(cache="llm_response", result="miss")
         
         # Format messages - use up to 8 recent messages for full context
         messages = []
@@ -312,7 +517,7 @@ async def call_claude(
         
         # Prepare API call parameters
         params = {
-            "model": CLAUDE_MODEL,
+            "model": model,
             "max_tokens": max_tokens,
             "temperature": temperature,
             "system": system_prompt,
@@ -322,13 +527,15 @@ async def call_claude(
         # Add tools if provided
         if tools:
             params["tools"] = tools
+            if tool_choice:
+                params["tool_choice"] = tool_choice
         
         # Make API call with proper timeout handling using asyncio.wait_for
         try:
             # Set a reasonable timeout for the API call (60 seconds)
             api_timeout = 60  # Increased timeout for complex prompts
             
-            logger.info(f"Calling Claude API with model={CLAUDE_MODEL}, temperature={temperature}")
+            logger.debug("Calling Claude API with model=%s, temperature=%s", model, temperature)
             
             # Create the API call as a task
             if stream:
@@ -338,59 +545,16 @@ async def call_claude(
             
             # Implement retry logic for API calls
             max_retries = 2
-            retry_count = 0
-            last_error = None
             
-            while retry_count <= max_retries:
-                try:
-                    # Create the API call as a task
-                    api_task = client.messages.create(**params)
-                    
-                    # Wait for the task with a timeout
-                    response = await asyncio.wait_for(api_task, timeout=api_timeout)
-                    
-                    # If we get here, the call succeeded
-                    break
-                    
-                except asyncio.TimeoutError:
-                    retry_count += 1
-                    last_error = "timeout"
-                    logger.warning(f"API call timed out (attempt {retry_count}/{max_retries})")
-                    if retry_count <= max_retries:
-                        # Wait before retrying
-                        await asyncio.sleep(2)
-                    else:
-                        # Max retries reached, re-raise
-                        raise
-                        
-                except aiohttp.ClientError as e:
-                    retry_count += 1
-                    last_error = f"connection: {str(e)}"
-                    logger.warning(f"API connection error (attempt {retry_count}/{max_retries}): {e}")
-                    if retry_count <= max_retries:
-                        # Wait before retrying
-                        await asyncio.sleep(2)
-                    else:
-                        # Max retries reached, re-raise
-                        raise
-                        
-                except Exception as e:
-                    retry_count += 1
-                    last_error = f"other: {str(e)}"
-                    logger.warning(f"API call error (attempt {retry_count}/{max_retries}): {e}")
-                    if retry_count <= max_retries:
-                        # Wait before retrying
-                        await asyncio.sleep(2)
-                    else:
-                        # Max retries reached, re-raise
-                        raise
-            
-            # Check if we exhausted all retries
-            if retry_count > max_retries:
-                raise Exception(f"Failed after {max_retries} retries. Last error: {last_error}")
+            if use_cache and temperature <= 0.6:
+                # Identical concurrent requests share a single upstream call
+                response = await _create_message_shared(cache_key, params, api_timeout, max_retries)
+            else:
+                response = await _create_message(params, api_timeout, max_retries)
             
         except asyncio.TimeoutError:
             logger.error(f"API call timed out after {api_timeout} seconds and {max_retries} retries")
+            LLM_ERRORS.inc(reason="timeout")
             result = {
                 "error": "The request timed out", 
                 "content": "I'm taking too long to respond. Please try again with a simpler query or check your network connection."
@@ -409,7 +573,7 @@ async def call_claude(
                 system_prompt=system_prompt,
                 user_message=user_message,
                 raw_llm_response="TIMEOUT",
-                model_name=CLAUDE_MODEL,
+                model_name=model,
                 temperature=temperature,
                 max_tokens=max_tokens,
                 request_timestamp=request_timestamp,
@@ -418,15 +582,17 @@ async def call_claude(
                 cache_hit=False,
                 metadata={
                     "error": "timeout",
-                    "tools": tools,
+                    "prompt_hash": prompt_hash,
+                    "tools": [tool["name"] for tool in tools] if tools else None,
                     "chat_history_length": len(chat_history) if chat_history else 0,
                     "timeout_seconds": api_timeout
                 }
             )
             
             return result
-        except aiohttp.ClientError as e:
+        except _CONNECTION_ERRORS as e:
             logger.error(f"API connection error after {max_retries} retries: {e}")
+            LLM_ERRORS.inc(reason="connection")
             result = {
                 "error": str(e), 
                 "content": "I'm having network connectivity issues right now. Please check your internet connection and try again."
@@ -445,7 +611,7 @@ async def call_claude(
                 system_prompt=system_prompt,
                 user_message=user_message,
                 raw_llm_response=f"CONNECTION_ERROR: {str(e)}",
-                model_name=CLAUDE_MODEL,
+                model_name=model,
                 temperature=temperature,
                 max_tokens=max_tokens,
                 request_timestamp=request_timestamp,
@@ -454,8 +620,9 @@ async def call_claude(
                 cache_hit=False,
                 metadata={
                     "error": "connection",
+                    "prompt_hash": prompt_hash,
                     "error_details": str(e),
-                    "tools": tools,
+                    "tools": [tool["name"] for tool in tools] if tools else None,
                     "chat_history_length": len(chat_history) if chat_history else 0
                 }
             )
@@ -465,26 +632,34 @@ async def call_claude(
         # Record response timestamp
         response_timestamp = time.time()
         
-        # Extract content from response
+        # Extract text and tool calls from the response content blocks
         content = ""
+        tool_calls = []
         if response.content:
             for block in response.content:
                 if block.type == "text":
                     content += block.text
+                elif block.type == "tool_use":
+                    tool_calls.append({"id": block.id, "name": block.name, "input": block.input})
         
         # Create result object
         result = {
             "content": content,
-            "model": CLAUDE_MODEL,
+            "model": model,
+            "stop_reason": getattr(response, "stop_reason", None),
             "usage": {
                 "input_tokens": response.usage.input_tokens,
                 "output_tokens": response.usage.output_tokens
             }
         }
         
+        LLM_TOKENS.inc(response.usage.input_tokens, model=model, direction="input")
+        LLM_TOKENS.inc(response.usage.output_tokens, model=model, direction="output")
+        LLM_OUTPUT_TOKENS.observe(response.usage.output_tokens, model=model)
+        
         # Add tool calls if present
-        if hasattr(response, "tool_calls") and response.tool_calls:
-            result["tool_calls"] = response.tool_calls
+        if tool_calls:
+            result["tool_calls"] = tool_calls
         
         # Log the successful interaction
         await log_llm_interaction(
@@ -497,7 +672,7 @@ async def call_claude(
             user_message=user_message,
             raw_llm_response=content,
             processed_response=content,
-            model_name=CLAUDE_MODEL,
+            model_name=model,
             temperature=temperature,
             max_tokens=max_tokens,
             input_tokens=response.usage.input_tokens,
@@ -507,19 +682,24 @@ async def call_claude(
             duration_ms=int((response_timestamp - request_timestamp) * 1000),
             cache_hit=False,
             metadata={
-                "has_tool_calls": hasattr(response, "tool_calls") and len(response.tool_calls) > 0,
-                "tools": tools,
+                "has_tool_calls": bool(tool_calls),
+                "tools": [tool["name"] for tool in tools] if tools else None,
+                "stop_reason": result["stop_reason"],
+                "budget_key": budget_key,
+                "route": route,
+                "prompt_hash": prompt_hash,
                 "chat_history_length": len(chat_history) if chat_history else 0
             }
         )
         
-        # Cache the result if caching is enabled
-        if use_cache and temperature <= 0.6:
+        # Cache the result if caching is enabled (a reply cut off at max_tokens is not reused)
+        if use_cache and temperature <= 0.6 and result["stop_reason"] != "max_tokens":
             # Add to cache with compression
             response_cache[cache_key] = {
                 "response": result,
                 "timestamp": time.time()
             }
+            shared_set("llm_response", cache_key, response_cache[cache_key], cache_ttl)
             
             # Prune cache if necessary
             if len(response_cache) > cache_size_limit:
@@ -534,6 +714,7 @@ async def call_claude(
     
     except Exception as e:
         logger.error(f"Error calling Claude: {e}")
+        LLM_ERRORS.inc(reason="other")
         result = {"error": str(e), "content": "I'm having trouble processing your request right now."}
         
         # Calculate response time for logging
@@ -549,7 +730,7 @@ async def call_claude(
             system_prompt=system_prompt,
             user_message=user_message,
             raw_llm_response=f"ERROR: {str(e)}",
-            model_name=CLAUDE_MODEL,
+            model_name=model,
             temperature=temperature,
             max_tokens=max_tokens,
             request_timestamp=request_timestamp,
@@ -560,130 +741,128 @@ async def call_claude(
                 "error": "exception",
                 "error_details": str(e),
                 "traceback": traceback.format_exc(),
-                "tools": tools,
+                "tools": [tool["name"] for tool in tools] if tools else None,
                 "chat_history_length": len(chat_history) if chat_history else 0
             }
         )
         
         return result
 
-def get_rubric_evaluation_tool(phase: str, component: str = "general") -> List[Dict[str, Any]]:
-    """
-    Create a tool for evaluating user responses against rubrics
-    
-    Args:
-        phase: The learning phase
-        component: The specific component within the phase
-        
-    Returns:
-        A list containing the evaluation tool definition
-    """
-    # Get criteria for this phase and component
-    criteria = get_criteria_for_phase(phase, component)
-    
-    # Create properties for each criterion
-    criteria_properties = {}
-    required_criteria = []
-    
-    for criterion, details in criteria.items():
-        criteria_properties[criterion] = {
-            "type": "object",
-            "properties": {
-                "score": {
-                    "type": "integer",
-                    "enum": [1, 2, 3],
-                    "description": f"Score for {criterion}"
-                },
-                "feedback": {
-                    "type": "string",
-                    "description": f"Feedback explaining the score for {criterion}"
-                }
-            },
-            "required": ["score", "feedback"],
-            "description": details.get("description", f"Evaluation for {criterion}")
-        }
-        required_criteria.append(criterion)
-    
-    # Define the evaluation tool
-    evaluation_tool = {
-        "name": "evaluate_response",
-        "description": f"Evaluate the student's response against the {phase} rubric for {component}",
+@functools.lru_cache(maxsize=None)
+def _evaluation_tool(prompt_key: str) -> Optional[Dict[str, Any]]:
+    rubric = RUBRICS.get(prompt_key)
+    if not rubric or not rubric["criteria"]:
+        return None
+    keys = rubric["metadata_keys"] or [c["key"] for c in rubric["criteria"]]
+    descriptions = {c["key"]: c for c in rubric["criteria"]}
+    criteria_help = "; ".join(
+        f"{key}: 1 = {descriptions[key]['low']} 2 = {descriptions[key]['medium']} 3 = {descriptions[key]['high']}"
+        if key in descriptions else f"{key}: 1-3"
+        for key in keys
+    )
+    # Cutoffs come from the prompt's own scaffolding table so the schema cannot disagree with it
+    scaffolding = rubric.get("scaffolding") or {}
+    if len(scaffolding) == 3:
+        scaffolding_help = ", ".join(f"{level}: {support} support ({scaffolding[support]})"
+                                     for level, support in ((1, "high"), (2, "medium"), (3, "low")))
+    else:
+        scaffolding_help = "1: high, 2: medium, 3: low support, per the rubric's scaffolding table"
+    return {
+        "name": EVALUATION_TOOL_NAME,
+        "description": (f"Record your rubric evaluation of the student's {rubric['focus']}. "
+                        f"Call this once, after writing your feedback. Criteria: {criteria_help}"),
         "input_schema": {
             "type": "object",
             "properties": {
+                "criteria_scores": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "criteria": {"type": "string", "enum": keys},
+                            "score": {"type": "integer", "enum": [1, 2, 3]},
+                            "feedback": {"type": "string", "description": "At most one short sentence"}
+                        },
+                        "required": ["criteria", "score"]
+                    },
+                    "description": "One entry per criterion"
+                },
                 "overall_score": {
                     "type": "number",
-                    "description": "The overall score (average of all criteria scores)"
+                    "description": "Average of the criteria scores (1.0-3.0)"
                 },
                 "scaffolding_level": {
                     "type": "integer",
                     "enum": [1, 2, 3],
-                    "description": "The scaffolding level based on the overall score (1: high support, 2: medium support, 3: low support)"
+                    "description": scaffolding_help
                 },
                 "explanation": {
                     "type": "string",
-                    "description": "Explanation of the overall evaluation"
-                },
-                "criteria_scores": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "criteria": {
-                                "type": "string",
-                                "description": "The name of the criterion"
-                            },
-                            "score": {
-                                "type": "integer",
-                                "enum": [1, 2, 3],
-                                "description": "The score for this criterion (1-3)"
-                            },
-                            "feedback": {
-                                "type": "string",
-                                "description": "Specific feedback for this criterion"
-                            }
-                        },
-                        "required": ["criteria", "score", "feedback"]
-                    },
-                    "description": "Scores and feedback for each criterion"
+                    "description": "Brief rationale for the instructor"
                 }
             },
-            "required": ["overall_score", "scaffolding_level", "explanation", "criteria_scores"]
+            "required": ["criteria_scores", "overall_score", "scaffolding_level"]
         }
     }
-    
-    return [evaluation_tool]
 
-def parse_tool_output(tool_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+
+def get_rubric_evaluation_tool(phase: str, component: str = "general") -> List[Dict[str, Any]]:
     """
-    Parse the output from a tool call
+    Create a tool for evaluating user responses against rubrics
+    
+    The criteria come from the rubric registry (prompt_engineering.rubrics, parsed from
+    FINAL_PROMPTS). Schemas are built once per phase and component and cached, so the
+    same list object is returned on every call; callers must not modify it.
     
     Args:
-        tool_calls: List of tool calls from the model
+        phase: The learning phase
+        component: The specific component within the phase
         
     Returns:
-        The parsed tool output
+        A list containing the evaluation tool definition (empty for phases without a rubric)
+    """
+    prompt_key = get_prompt_key(phase, component)
+    tool = _evaluation_tool(prompt_key) if prompt_key else None
+    return _tool_lists.setdefault(prompt_key, [tool]) if tool is not None else []
+
+
+def parse_tool_output(tool_calls: List[Dict[str, Any]], name: Optional[str] = None) -> Dict[str, Any]:
     """
-    if not tool_calls:
-        return {}
+    Parse the output from a tool call
     
-    try:
-        # Get the first tool call
-        tool_call = tool_calls[0]
+    Args:
+        tool_calls: Tool calls from a call_claude result (dicts) or SDK tool_use blocks
+        name: Only consider calls to this tool (default: the first call)
         
-        # Parse the output
-        if isinstance(tool_call, dict) and "input" in tool_call:
-            # Already parsed
-            return tool_call["input"]
-        elif hasattr(tool_call, "input"):
-            # Parse from object
-            input_data = tool_call.input
-            if isinstance(input_data, str):
+    Returns:
+        The parsed tool input ({} when there is none)
+    """
+    for tool_call in tool_calls or []:
+        call_name = tool_call.get("name") if isinstance(tool_call, dict) else getattr(tool_call, "name", None)
+        if name is not None and call_name != name:
+            continue
+        input_data = tool_call.get("input") if isinstance(tool_call, dict) else getattr(tool_call, "input", None)
+        if isinstance(input_data, str):
+            try:
                 return json.loads(input_data)
-            elif isinstance(input_data, dict):
-                return input_data
-    
-    except Exception as e:
-        logger.error(f"Error parsing tool output: {e}")
+            except ValueError as e:
+                logger.error(f"Error parsing tool output: {e}")
+                return {}
+        return input_data if isinstance(input_data, dict) else {}
+    return {}
+
+
+def parse_evaluation(result: Dict[str, Any]) -> Optional[EvaluationResults]:
+    """Typed rubric evaluation from a call_claude result made with the evaluation tool
     
-    return {} 
\ No newline at end of file
+    Returns:
+        EvaluationResults, or None when the model did not call the tool or its input is invalid
+    """
+    data = parse_tool_output(result.get("tool_calls", []), name=EVALUATION_TOOL_NAME)
+    if not data:
+        return None
+    try:
+        return EvaluationResults.model_validate(data)
+    except ValidationError as e:
+        logger.warning(f"Invalid {EVALUATION_TOOL_NAME} input: {e}")
+        return None
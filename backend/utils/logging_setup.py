@@ -0,0 +1,199 @@
+"""
+Logging configuration for the backend
+
+Log calls only enqueue the record: a QueueHandler puts it on an in-memory queue
+and a QueueListener thread formats it and writes it out, so a slow or blocked
+stderr pipe never stalls the event loop. Records are emitted as one JSON object
+per line (LOG_FORMAT=text gives the previous human-readable format).
+
+Formatting is lazy: %-style arguments are merged into the message on the
+listener thread, unless they are mutable objects that could change before then.
+High-volume INFO/DEBUG messages can be sampled per logger with LOG_SAMPLE_RATES,
+e.g. "solbot.routes.chat=0.1,solbot.llm=0.5". Warnings and errors are never sampled.
+"""
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from typing import Dict, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Args of these types can't change between the log call and formatting on the listener thread
+_IMMUTABLE_TYPES = (str, int, float, bool, type(None), bytes)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including `extra` fields and the request trace id"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            payload["trace_id"] = trace_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N INFO/DEBUG records for configured loggers (and their children)"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._every: Dict[str, int] = {}
+        self._counts: Dict[str, int] = {}
+
+    @staticmethod
+    def parse(spec: str) -> Dict[str, float]:
+        rates = {}
+        for item in spec.split(","):
+            if "=" in item:
+                name, rate = item.split("=", 1)
+                try:
+                    rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+                except ValueError:
+                    continue
+        return rates
+
+    def _rate_for(self, name: str) -> Optional[float]:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        every = self._every.get(record.name)
+        if every is None:
+            rate = self._rate_for(record.name)
+            every = 1 if rate is None else (0 if rate == 0 else max(1, round(1 / rate)))
+            self._every[record.name] = every
+        if every == 1:
+            return True
+        if every == 0:
+            return False
+        count = self._counts.get(record.name, 0)
+        self._counts[record.name] = count + 1
+        return count % every == 0
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread when it is safe to"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        if record.args and not all(isinstance(arg, _IMMUTABLE_TYPES) for arg in
+                                   (record.args.values() if isinstance(record.args, dict) else record.args)):
+            # Mutable args (dicts, lists, objects) are rendered now
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # Tracebacks reference live frames; render them in the calling thread
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.trace_id = _current_trace_id()
+        return record
+
+
+def _current_trace_id() -> Optional[str]:
+    try:
+        from backend.utils.tracing import current_trace
+    except ImportError:
+        return None
+    trace = current_trace()
+    return trace.trace_id if trace is not None else None
+
+
+def _make_formatter() -> logging.Formatter:
+    return logging.Formatter(TEXT_FORMAT) if LOG_FORMAT == "text" else JsonFormatter()
+
+
+def build_handler(stream=None, use_queue: bool = LOG_ASYNC, sample_rates: str = LOG_SAMPLE_RATES):
+    """Build the root handler (and its listener when queued) without installing it
+
+    Returns:
+        Tuple of (handler, listener or None); the listener is already started
+    """
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(_make_formatter())
+
+    listener = None
+    if use_queue:
+        handler = LazyQueueHandler(queue.SimpleQueue())
+        listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        listener.start()
+    else:
+        handler = output
+
+    rates = SamplingFilter.parse(sample_rates)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+    return handler, listener
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None) -> Optional[logging.handlers.QueueListener]:
+    """Configure the root logger once per process (later calls are no-ops)
+
+    Args:
+        level: Root log level
+        stream: Output stream (default: stderr)
+
+    Returns:
+        The running QueueListener, or None when LOG_ASYNC is disabled
+    """
+    global _listener
+    with _setup_lock:
+        root = logging.getLogger()
+        if getattr(root, "_solbot_configured", False):
+            return _listener
+
+        handler, _listener = build_handler(stream)
+        if _listener is not None:
+            atexit.register(stop_logging)
+
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+        root._solbot_configured = True
+        return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
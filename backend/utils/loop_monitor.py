@@ -0,0 +1,173 @@
+"""
+Event-loop lag monitor and blocking-call detector
+
+A background task sleeps for a fixed interval and records how late it wakes up.
+The overshoot is the time the loop spent unable to schedule anything, and it is
+exported as `solbot_event_loop_lag_seconds`.
+
+When LOOP_BLOCK_DETECTOR is enabled (debug mode), a watchdog thread also watches
+the task's heartbeat. If the loop does not check in for LOOP_BLOCK_THRESHOLD_MS, the
+watchdog captures the loop thread's stack while it is still blocked and logs it.
+Each stall is counted against the innermost backend frame, which builds up a ranked
+list of blocking hotspots (see `blocking_hotspots()` and /api/admin/loop/hotspots).
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from backend.utils.metrics import registry
+
+logger = logging.getLogger("solbot.loop_monitor")
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.1))
+LOOP_BLOCK_DETECTOR = os.getenv("LOOP_BLOCK_DETECTOR", "false").lower() == "true"
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 100))
+
+# Frames from these paths are attributed as hotspots; everything else is library code
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOOP_LAG = registry.histogram(
+    "solbot_event_loop_lag_seconds",
+    "Delay between when the loop monitor should have woken up and when it did",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_LAG_MAX = registry.gauge(
+    "solbot_event_loop_lag_max_seconds",
+    "Largest loop lag seen in the last minute"
+)
+LOOP_BLOCKED = registry.counter(
+    "solbot_event_loop_blocked_total",
+    "Times the loop was blocked past LOOP_BLOCK_THRESHOLD_MS (block detector only)"
+)
+
+
+class LoopMonitor:
+    """Measures scheduling lag on one event loop and optionally watches for stalls"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, detect_blocking: bool = LOOP_BLOCK_DETECTOR,
+                 block_threshold: float = LOOP_BLOCK_THRESHOLD_MS / 1000):
+        self.interval = interval
+        self.detect_blocking = detect_blocking
+        self.block_threshold = block_threshold
+        self.hotspots: Counter = Counter()
+        self.last_stacks: Dict[str, List[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._window_max = 0.0
+        self._window_start = time.monotonic()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.detect_blocking:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+        logger.info(f"Event loop monitor started (interval={self.interval * 1000:.0f}ms, "
+                    f"block detector={'on' if self.detect_blocking else 'off'})")
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.monotonic()
+            self._heartbeat = start
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - start - self.interval)
+            LOOP_LAG.observe(lag)
+
+            # Max over a rolling one-minute window
+            if now - self._window_start > 60:
+                self._window_max = 0.0
+                self._window_start = now
+            if lag > self._window_max:
+                self._window_max = lag
+                LOOP_LAG_MAX.set(lag)
+
+    def _watch(self) -> None:
+        check_every = max(0.01, self.block_threshold / 4)
+        reported_heartbeat = None
+        while not self._stopping.wait(check_every):
+            heartbeat = self._heartbeat
+            # The monitor sleeps for `interval` between heartbeats, so only count time beyond that
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.block_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat  # One report per stall
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame)
+            hotspot = self._attribute(frame)
+            self.hotspots[hotspot] += 1
+            self.last_stacks[hotspot] = stack
+            LOOP_BLOCKED.inc()
+            logger.warning(f"Event loop blocked for >{blocked_for * 1000:.0f}ms at {hotspot}\n{''.join(stack)}")
+
+    @staticmethod
+    def _attribute(frame) -> str:
+        """Innermost frame in backend code (or the innermost frame if none)"""
+        innermost = frame
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(_BACKEND_DIR) and "loop_monitor" not in filename:
+                return f"{os.path.relpath(filename, os.path.dirname(_BACKEND_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}"
+            frame = frame.f_back
+        return f"{os.path.basename(innermost.f_code.co_filename)}:{innermost.f_lineno} in {innermost.f_code.co_name}"
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor() -> Optional[LoopMonitor]:
+    """Start monitoring the running event loop (call from the app lifespan)"""
+    global _monitor
+    if not LOOP_MONITOR_ENABLED:
+        return None
+    if _monitor is None:
+        _monitor = LoopMonitor()
+        _monitor.start()
+    return _monitor
+
+
+async def stop_loop_monitor() -> None:
+    global _monitor
+    if _monitor is not None:
+        await _monitor.stop()
+        _monitor = None
+
+
+def blocking_hotspots(limit: int = 20) -> List[Dict[str, Any]]:
+    """Ranked list of places the loop was caught blocking, with the last stack seen at each"""
+    if _monitor is None:
+        return []
+    return [
+        {"location": location, "count": count, "last_stack": _monitor.last_stacks.get(location, [])}
+        for location, count in _monitor.hotspots.most_common(limit)
+    ]
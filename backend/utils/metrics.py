@@ -0,0 +1,273 @@
+"""
+In-process metrics registry
+
+Counters, gauges and fixed-bucket histograms with labels, rendered in the
+Prometheus text exposition format by the /metrics endpoint. Updates are a dict
+lookup plus an add (histograms also do a bisect), so they are cheap enough for the
+request hot path. Each worker process keeps its own registry.
+
+Stats dicts kept by other modules (admission, coalescing, routing, ...) are
+exported through collectors registered with `register_collector`.
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend.utils.tracing import record_span, span
+
+logger = logging.getLogger("solbot.metrics")
+
+# Seconds; covers in-memory DB calls (~ms) up to slow Claude generations (~60s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+TOKEN_BUCKETS = (50, 100, 200, 400, 600, 800, 1000, 1500, 2000, 4000, 8000)
+
+# Label values come from request fields; anything past this many series is folded into "other"
+MAX_SERIES_PER_METRIC = 500
+
+# A collector yields (name, type, help, [(labels, value), ...]) tuples at scrape time
+Sample = Tuple[Dict[str, str], float]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str], series: Dict) -> Tuple[str, ...]:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        if key not in series and len(series) >= MAX_SERIES_PER_METRIC:
+            key = tuple("other" for _ in self.labelnames)
+        return key
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels, self._values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in list(self._values.items())]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels, self._values)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution over fixed, cumulative buckets"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels, self._series)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Observe the duration of the enclosed block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels: str) -> Optional[Dict[str, float]]:
+        """Count, sum and bucket counts for one series (None if never observed)"""
+        series = self._series.get(tuple(str(labels.get(n, "")) for n in self.labelnames))
+        if series is None:
+            return None
+        return {"count": series[2], "sum": series[1], "buckets": dict(zip(self.buckets + (math.inf,), series[0]))}
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and collectors and renders them for scraping"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Re-registering (e.g. a module imported twice) returns the original metric
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric and collector in the Prometheus text format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                for name, metric_type, documentation, samples in collector():
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    for labels, value in samples:
+                        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} "
+                                     f"{_format_value(value)}")
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# Shared metrics used across the backend
+STAGE_SECONDS = registry.histogram(
+    "solbot_stage_seconds",
+    "Duration of chat pipeline stages",
+    ["stage", "phase", "component"]
+)
+REQUEST_SECONDS = registry.histogram(
+    "solbot_chat_request_seconds",
+    "End-to-end chat request duration",
+    ["endpoint", "phase", "status"]
+)
+CACHE_REQUESTS = registry.counter(
+    "solbot_cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+LLM_TOKENS = registry.counter(
+    "solbot_llm_tokens_total",
+    "Tokens sent to and generated by the LLM",
+    ["model", "direction"]
+)
+LLM_OUTPUT_TOKENS = registry.histogram(
+    "solbot_llm_output_tokens",
+    "Output tokens per LLM call",
+    ["model"],
+    buckets=TOKEN_BUCKETS
+)
+LLM_RETRIES = registry.counter(
+    "solbot_llm_retries_total",
+    "LLM API attempts that were retried",
+    ["reason"]
+)
+LLM_ERRORS = registry.counter(
+    "solbot_llm_errors_total",
+    "LLM calls that failed after retries",
+    ["reason"]
+)
+DB_FALLBACKS = registry.counter(
+    "solbot_db_fallbacks_total",
+    "Database operations that fell back to in-memory storage",
+    ["operation"]
+)
+
+
+def observe_stage(stage: str, seconds: float, phase: Optional[str] = None, component: Optional[str] = None) -> None:
+    """Record how long a chat pipeline stage took (also as a span of the current trace)"""
+    STAGE_SECONDS.observe(seconds, stage=stage, phase=phase or "", component=component or "")
+    record_span(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str, phase: Optional[str] = None, component: Optional[str] = None):
+    """Time the enclosed block as a chat pipeline stage and a trace span"""
+    with span(stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, phase=phase or "", component=component or "")
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,179 @@
+"""
+Local rubric pre-scorer for submissions
+
+A small per-phase logistic model (trained offline by
+`prompt_engineering/scripts/train_prescorer.py`) estimates the probability that Claude
+would put a submission in the high-support band (score < 1.8). When it is confident,
+the chat route answers with a templated high-scaffolding response built from the
+rubric instead of calling the LLM.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from prompt_engineering.rubrics import RUBRICS
+
+logger = logging.getLogger("solbot.prescorer")
+
+PRESCORER_ENABLED = os.getenv("ENABLE_PRESCORER", "true").lower() == "true"
+PRESCORER_MODEL_PATH = os.getenv(
+    "PRESCORER_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "prescorer_model.json")
+)
+# Overrides the calibrated per-phase threshold when set
+PRESCORER_THRESHOLD = os.getenv("PRESCORER_THRESHOLD")
+# Never short-circuit anything longer than this, whatever the model says
+PRESCORER_MAX_CHARS = int(os.getenv("PRESCORER_MAX_CHARS", 200))
+
+PRESCORER_MODEL_NAME = "local-prescorer"
+
+_WORD = re.compile(r"[A-Za-z']+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?%?")
+_SENTENCE = re.compile(r"[.!?]+(?:\s|$)")
+_TIME = re.compile(r"\b(?:day|daily|week|weekly|month|monthly|hour|hours|minute|minutes|semester|deadline|"
+                   r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|weekend|morning|evening|by end)\b", re.I)
+_RESOURCE = re.compile(r"\b(?:textbook|video|videos|khan|office hours|notes|practice|flashcards?|tutor|website|"
+                       r"lecture|lectures|study group|documentation|course|quiz|quizzes|problems|exercises)\b", re.I)
+_CONDITION = re.compile(r"\b(?:if|when|whenever|then|unless)\b", re.I)
+_MEASURE = re.compile(r"\b(?:score|percent|measure|track|metric|metrics|rate|threshold|at least|checkpoint)\b", re.I)
+_GRADE_ONLY = re.compile(r"\b(?:pass|passing|grade|an a|fail|failing|gpa|get through)\b", re.I)
+_AGENCY = re.compile(r"\b(?:i will|i'll|i plan|i am going to|i'm going to)\b", re.I)
+
+FEATURE_NAMES = [
+    "log_chars", "log_words", "sentences", "numbers", "time_refs",
+    "resource_refs", "conditions", "measures", "grade_only", "agency"
+]
+
+_model: Optional[Dict[str, Any]] = None
+
+
+def extract_features(text: str) -> List[float]:
+    """Cheap lexical features shared by training and inference (order matches FEATURE_NAMES)"""
+    text = text or ""
+    return [
+        math.log1p(len(text)),
+        math.log1p(len(_WORD.findall(text))),
+        float(max(1, len(_SENTENCE.findall(text)))),
+        float(len(_NUMBER.findall(text))),
+        float(len(_TIME.findall(text))),
+        float(len(_RESOURCE.findall(text))),
+        float(len(_CONDITION.findall(text))),
+        float(len(_MEASURE.findall(text))),
+        float(len(_GRADE_ONLY.findall(text))),
+        float(len(_AGENCY.findall(text))),
+    ]
+
+
+def load_model(path: str = PRESCORER_MODEL_PATH) -> Optional[Dict[str, Any]]:
+    """Load (or reload) the trained model weights from disk"""
+    global _model
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            model = json.load(f)
+        if model.get("features") != FEATURE_NAMES:
+            logger.warning("Pre-scorer model was trained with different features, ignoring it")
+            model = None
+    except FileNotFoundError:
+        logger.info(f"No pre-scorer model found at {path}")
+        model = None
+    except Exception as e:
+        logger.error(f"Error loading pre-scorer model: {e}")
+        model = None
+    _model = model
+    return _model
+
+
+def _get_model() -> Optional[Dict[str, Any]]:
+    if _model is None:
+        load_model()
+    return _model
+
+
+def prescore(prompt_key: str, text: str) -> Optional[float]:
+    """Probability that the submission lands in the high-support band, None if no model covers the phase"""
+    model = _get_model()
+    if not model or prompt_key not in model.get("models", {}):
+        return None
+
+    phase_model = model["models"][prompt_key]
+    z = phase_model["bias"]
+    for value, mean, std, weight in zip(extract_features(text), phase_model["mean"],
+                                        phase_model["std"], phase_model["weights"]):
+        z += weight * (value - mean) / std
+    # Numerically safe sigmoid
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+def get_threshold(prompt_key: str) -> float:
+    """Confidence threshold for short-circuiting a phase"""
+    if PRESCORER_THRESHOLD:
+        return float(PRESCORER_THRESHOLD)
+    model = _get_model() or {}
+    return model.get("models", {}).get(prompt_key, {}).get("threshold", model.get("default_threshold", 0.95))
+
+
+def build_templated_response(prompt_key: str, probability: float) -> str:
+    """Build a high-scaffolding response (with INSTRUCTOR_METADATA) from the phase rubric"""
+    rubric = RUBRICS[prompt_key]
+    focus = rubric["focus"]
+    criteria = rubric["criteria"]
+
+    assessment = "\n".join(f"• {c['name']}: ⚠️ {c['low']}" for c in criteria)
+    template = "\n".join(f"• **{c['name']}**: ________ (aim for: {c['high']})" for c in criteria)
+    scores = "\n".join(f"{key}: 1" for key in (rubric["metadata_keys"] or [c["key"] for c in criteria]))
+    weakest = criteria[0]["name"] if criteria else focus
+
+    return f"""Hi there! 👋 Thanks for sharing your {focus}. You've taken the first step, and with a bit more detail it will really start working for you! 🎯
+
+## Assessment
+Looking at your {focus}:
+{assessment}
+
+## Guidance
+Let's build this out together using a template. Fill in each blank with details from your own course and situation:
+
+{template}
+
+Don't worry about getting it perfect - each revision builds your planning skills. 🧠
+
+## Next Steps
+📝 Please revise your {focus} using the template above, starting with {weakest}.
+
+<!-- INSTRUCTOR_METADATA
+Score: 1.0
+Scaffolding: high
+{scores}
+Rationale: Local pre-scorer is confident (p={probability:.2f}) that this brief response needs high support.
+-->"""
+
+
+def prescreen_submission(prompt_key: Optional[str], text: str) -> Optional[Dict[str, Any]]:
+    """Return a call_claude-shaped templated result when the pre-scorer is confident, otherwise None"""
+    if not PRESCORER_ENABLED or not prompt_key or prompt_key not in RUBRICS:
+        return None
+    if len(text.strip()) > PRESCORER_MAX_CHARS:
+        return None
+
+    probability = prescore(prompt_key, text)
+    if probability is None:
+        return None
+
+    threshold = get_threshold(prompt_key)
+    if probability < threshold:
+        logger.debug("Pre-scorer not confident for %s: p=%.3f < %.3f", prompt_key, probability, threshold)
+        return None
+
+    logger.info("Pre-scorer short-circuit for %s: p=%.3f >= %.3f", prompt_key, probability, threshold)
+    return {
+        "content": build_templated_response(prompt_key, probability),
+        "model": PRESCORER_MODEL_NAME,
+        "usage": {"input_tokens": 0, "output_tokens": 0},
+        "prescore": probability
+    }
@@ -0,0 +1,220 @@
+"""
+Readiness prewarming
+
+Replaces the old keep_warm thread, which pinged /health with `requests` from every
+worker and warmed nothing the first chat request actually needs. When the app starts,
+each worker now runs these steps in the background:
+
+- llm:     create the Anthropic client (importing the SDK) and open a pooled connection
+- db:      connect to Supabase and run a trivial query (skipped with in-memory storage)
+- prompts: load the prompt registry and resolve every chat and submission prompt
+
+The connection pool and the database connection are per worker, so those steps run in
+every worker. A keep-alive loop repeats them every PREWARM_KEEPALIVE_INTERVAL seconds
+so the connections don't go idle. The external self-ping (ENABLE_WARMUP) keeps a
+free-tier host from sleeping and only needs to happen once per host. It runs as a
+singleton job (backend.utils.leader), so one worker does it and another takes over
+if that worker dies.
+
+`/ready` reports the state: 503 while warming, 200 once every step has finished.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from backend.utils import db, llm
+from backend.utils.leader import SingletonJob, run_singleton
+from backend.utils.prompts import MODE_CHAT, MODE_SUBMISSION, get_prompt
+
+logger = logging.getLogger("solbot.prewarm")
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() == "true"
+# Seconds allowed for each warm-up step
+PREWARM_TIMEOUT = float(os.getenv("PREWARM_TIMEOUT", 15))
+# Seconds between connection keep-alive pings (0 disables them); keep below LLM_KEEPALIVE_EXPIRY
+PREWARM_KEEPALIVE_INTERVAL = float(os.getenv("PREWARM_KEEPALIVE_INTERVAL", 90))
+
+# External self-ping (previously keep_warm.py)
+ENABLE_WARMUP = os.getenv("ENABLE_WARMUP", "true").lower() == "true"
+SERVICE_URL = os.getenv("SERVICE_URL", "http://localhost:8080")
+PING_INTERVAL = int(os.getenv("PING_INTERVAL", 10 * 60))  # 10 minutes by default
+
+# (phase, component, submission_type) for each guided submission form in the frontend
+_PROMPT_TARGETS = [
+    ("phase2", "learning_objectives", "learning_objective"),
+    ("phase4", "long_term_goals", "long_term_goal"),
+    ("phase4", "short_term_goals", "short_term_goal"),
+    ("phase4", "contingency_strategies", "contingency_plan"),
+    ("phase5", "monitoring_adaptation", "monitoring_adaptation"),
+]
+
+STATE_DISABLED = "disabled"
+STATE_COLD = "cold"
+STATE_WARMING = "warming"
+STATE_WARM = "warm"
+STATE_DEGRADED = "degraded"  # finished, but at least one step failed
+
+
+class StepSkipped(Exception):
+    """Raised by a warm-up step that does not apply to this configuration"""
+
+
+async def _warm_llm() -> str:
+    client = await asyncio.to_thread(llm.get_client)
+    if not llm.ANTHROPIC_API_KEY:
+        raise StepSkipped("ANTHROPIC_API_KEY is not set")
+    # A request that costs no tokens; it leaves a TLS connection in the pool
+    try:
+        await client.models.list(limit=1)
+    except Exception as e:
+        status_code = getattr(e, "status_code", None)
+        if status_code is None:
+            raise
+        # The API answered, so the connection is open even if this endpoint is not allowed
+        return f"connection pool open (HTTP {status_code})"
+    return "connection pool open"
+
+
+async def _warm_db() -> str:
+    if not await asyncio.to_thread(db.ping_db):
+        raise StepSkipped("using in-memory storage")
+    return "connected"
+
+
+async def _warm_prompts() -> str:
+    resolved = 0
+    for phase, component, submission_type in _PROMPT_TARGETS:
+        get_prompt(phase, component, mode=MODE_CHAT)
+        get_prompt(phase, component, mode=MODE_SUBMISSION, submission_type=submission_type)
+        resolved += 2
+    return f"{resolved} prompts resolved"
+
+
+class Prewarmer:
+    """Runs the warm-up steps once, then keeps the connections alive"""
+
+    def __init__(self, steps: Optional[Dict[str, Callable[[], Awaitable[str]]]] = None):
+        self.steps = steps if steps is not None else {"llm": _warm_llm, "db": _warm_db, "prompts": _warm_prompts}
+        self.state = STATE_COLD if PREWARM_ENABLED else STATE_DISABLED
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.self_ping: Optional[SingletonJob] = None
+        self._tasks: list = []
+
+    @property
+    def ready(self) -> bool:
+        return self.state in (STATE_WARM, STATE_DEGRADED, STATE_DISABLED)
+
+    def start(self) -> None:
+        """Start warming in the background (call from the app lifespan)"""
+        loop = asyncio.get_running_loop()
+        if PREWARM_ENABLED and self.state == STATE_COLD:
+            self._tasks.append(loop.create_task(self._run()))
+        if ENABLE_WARMUP and self.self_ping is None:
+            self.self_ping = run_singleton("self_ping", self._ping_service_periodically)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self.self_ping is not None:
+            await self.self_ping.stop()
+            self.self_ping = None
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable[str]]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(step(), timeout=PREWARM_TIMEOUT)
+            status = "ok"
+        except StepSkipped as e:
+            detail, status = str(e), "skipped"
+        except asyncio.TimeoutError:
+            detail, status = f"timed out after {PREWARM_TIMEOUT:.0f}s", "error"
+        except Exception as e:
+            detail, status = f"{type(e).__name__}: {e}", "error"
+        result = {"status": status, "detail": detail, "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                  "at": time.time()}
+        self.results[name] = result
+        return result
+
+    async def _run(self) -> None:
+        self.state = STATE_WARMING
+        self.started_at = time.time()
+        names = list(self.steps)
+        results = await asyncio.gather(*(self._run_step(name, self.steps[name]) for name in names))
+        self.finished_at = time.time()
+        failed = [name for name, result in zip(names, results) if result["status"] == "error"]
+        self.state = STATE_DEGRADED if failed else STATE_WARM
+        summary = ", ".join(f"{name}={self.results[name]['status']} ({self.results[name]['duration_ms']:.0f}ms)"
+                            for name in names)
+        if failed:
+            logger.warning(f"Prewarm finished with errors: {summary}")
+        else:
+            logger.info(f"Prewarm finished: {summary}")
+
+        if PREWARM_KEEPALIVE_INTERVAL > 0:
+            await self._keep_alive([name for name, result in zip(names, results) if result["status"] == "ok"])
+
+    async def _keep_alive(self, names) -> None:
+        """Repeat the connection steps so pooled connections never sit idle long enough to close"""
+        names = [name for name in names if name in ("llm", "db")]
+        if not names:
+            return
+        while True:
+            await asyncio.sleep(PREWARM_KEEPALIVE_INTERVAL)
+            for name in names:
+                result = await self._run_step(name, self.steps[name])
+                if result["status"] == "error":
+                    logger.warning(f"Keep-alive for {name} failed: {result['detail']}")
+
+    async def _ping_service_periodically(self) -> None:
+        import httpx
+        logger.info(f"Pinging {SERVICE_URL} every {PING_INTERVAL} seconds from this worker")
+        async with httpx.AsyncClient(timeout=5) as http:
+            while True:
+                await asyncio.sleep(PING_INTERVAL)
+                start = time.perf_counter()
+                try:
+                    response = await http.get(f"{SERVICE_URL}/health")
+                    if response.status_code == 200:
+                        logger.debug("Self-ping ok in %.2fs", time.perf_counter() - start)
+                    else:
+                        logger.warning(f"Self-ping returned status code {response.status_code}")
+                except httpx.HTTPError as e:
+                    logger.warning(f"Self-ping failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "pid": os.getpid(),
+            "steps": self.results,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "self_ping": self.self_ping.status() if self.self_ping is not None else None
+        }
+
+
+prewarmer = Prewarmer()
+
+
+def start_prewarm() -> Prewarmer:
+    prewarmer.start()
+    return prewarmer
+
+
+async def stop_prewarm() -> None:
+    await prewarmer.stop()
+
+
+def readiness() -> Dict[str, Any]:
+    return prewarmer.status()
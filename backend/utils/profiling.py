@@ -0,0 +1,203 @@
+"""
+Live profiling helpers for the admin endpoints
+
+- A statistical CPU profiler that samples every thread's stack with
+  sys._current_frames() and returns collapsed stacks (flamegraph.pl / speedscope format).
+  It runs in its own thread, so the event loop keeps serving while it is sampled.
+- tracemalloc snapshots kept in memory by id and diffed on request.
+- Approximate deep sizes of the module-level caches and stores.
+"""
+
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("solbot.profiling")
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 30))
+MIN_SAMPLE_INTERVAL = 0.001
+MAX_SNAPSHOTS = int(os.getenv("TRACEMALLOC_MAX_SNAPSHOTS", 5))
+# Objects visited per deep-size estimate before giving up (the result is then a lower bound)
+SIZE_WALK_LIMIT = 200_000
+
+# Innermost frames of threads that are parked rather than doing work
+_IDLE_FUNCTIONS = frozenset({"select", "poll", "wait", "accept"})
+
+# Objects whose attributes reach far beyond the store being measured
+_OPAQUE_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType)
+
+_profile_lock = threading.Lock()
+_snapshots: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_next_snapshot_id = 1
+
+
+class ProfilerBusy(Exception):
+    """Raised when a CPU profile is already running in this worker"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def sample_cpu(seconds: float, interval: float = 0.01, include_idle: bool = False) -> Dict[str, Any]:
+    """Sample all thread stacks for `seconds` (blocking; run it in a worker thread)
+
+    Args:
+        seconds: How long to sample (capped at PROFILE_MAX_SECONDS)
+        interval: Seconds between samples
+        include_idle: Keep samples of threads parked in select/wait calls
+
+    Returns:
+        Dictionary with the collapsed stack counts and sampling details
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A CPU profile is already running")
+    try:
+        seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+        interval = max(MIN_SAMPLE_INTERVAL, interval)
+        own_thread = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        samples = 0
+
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                if not include_idle and frame.f_code.co_name in _IDLE_FUNCTIONS:
+                    continue
+                thread_name = names.get(thread_id, str(thread_id))
+                stacks[f"{thread_name};{_collapse(frame)}"] += 1
+            samples += 1
+            time.sleep(interval)
+
+        logger.info(f"CPU profile finished: {samples} samples over {seconds:.1f}s, {len(stacks)} distinct stacks")
+        return {"seconds": seconds, "interval": interval, "samples": samples, "stacks": stacks}
+    finally:
+        _profile_lock.release()
+
+
+def format_collapsed(stacks: Counter) -> str:
+    """Render stacks as `frame;frame;frame count` lines, hottest first"""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def start_tracemalloc(frames: int = 10) -> Dict[str, Any]:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        logger.info(f"tracemalloc started ({frames} frames)")
+    return tracemalloc_status()
+
+
+def stop_tracemalloc() -> Dict[str, Any]:
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        logger.info("tracemalloc stopped")
+    _snapshots.clear()
+    return tracemalloc_status()
+
+
+def tracemalloc_status() -> Dict[str, Any]:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return {
+        "tracing": tracing,
+        "traceback_limit": tracemalloc.get_traceback_limit() if tracing else None,
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "snapshots": [{"id": sid, "taken_at": s["taken_at"], "label": s["label"]} for sid, s in _snapshots.items()]
+    }
+
+
+def take_snapshot(label: Optional[str] = None) -> Dict[str, Any]:
+    """Take a tracemalloc snapshot and keep it for later diffs (oldest dropped beyond MAX_SNAPSHOTS)"""
+    global _next_snapshot_id
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    snapshot_id = _next_snapshot_id
+    _next_snapshot_id += 1
+    _snapshots[snapshot_id] = {"snapshot": snapshot, "taken_at": time.time(), "label": label}
+    while len(_snapshots) > MAX_SNAPSHOTS:
+        _snapshots.popitem(last=False)
+    total = sum(stat.size for stat in snapshot.statistics("filename"))
+    return {"id": snapshot_id, "label": label, "total_bytes": total}
+
+
+def _format_stat(stat, key_type: str) -> Dict[str, Any]:
+    frame = stat.traceback[0]
+    result = {
+        "location": f"{frame.filename}:{frame.lineno}" if key_type != "filename" else frame.filename,
+        "size_bytes": stat.size,
+        "count": stat.count
+    }
+    if hasattr(stat, "size_diff"):
+        result["size_diff_bytes"] = stat.size_diff
+        result["count_diff"] = stat.count_diff
+    if key_type == "traceback":
+        result["traceback"] = stat.traceback.format()
+    return result
+
+
+def top_allocations(snapshot_id: int, limit: int = 25, key_type: str = "lineno") -> List[Dict[str, Any]]:
+    """Largest allocation sites in a stored snapshot"""
+    snapshot = _snapshots[snapshot_id]["snapshot"]
+    return [_format_stat(stat, key_type) for stat in snapshot.statistics(key_type)[:limit]]
+
+
+def diff_snapshots(base_id: int, target_id: int, limit: int = 25, key_type: str = "lineno") -> List[Dict[str, Any]]:
+    """Allocation sites that grew the most between two stored snapshots"""
+    base = _snapshots[base_id]["snapshot"]
+    target = _snapshots[target_id]["snapshot"]
+    stats = target.compare_to(base, key_type)
+    return [_format_stat(stat, key_type) for stat in stats[:limit]]
+
+
+def deep_sizeof(obj: Any, limit: int = SIZE_WALK_LIMIT) -> Dict[str, Any]:
+    """Approximate retained size of a container and everything reachable through it"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < limit:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__") and not isinstance(current, _OPAQUE_TYPES):
+            stack.append(vars(current))
+    return {"bytes": total, "objects": len(seen), "truncated": bool(stack)}
+
+
+def describe_store(store: Any, per_table: bool = False) -> Dict[str, Any]:
+    """Entry count and approximate size of a cache or store (with row counts per table if requested)"""
+    result = {"entries": len(store) if hasattr(store, "__len__") else None, **deep_sizeof(store)}
+    if per_table and isinstance(store, dict):
+        result["tables"] = {key: len(value) for key, value in store.items() if hasattr(value, "__len__")}
+    return result
@@ -0,0 +1,350 @@
+"""
+Prompt registry
+
+Loads FINAL_PROMPTS once and resolves (phase, component, mode) to a precomputed
+PromptEntry carrying the prompt text, a content hash and a version. The hash is a
+stable identifier for caching and logging; the version is bumped whenever the text
+of a prompt changes.
+
+The registry can be reloaded from `prompt_engineering/scripts/final_prompts.py`
+without a restart. A reload builds a complete new table and swaps it in with a
+single assignment, so requests always see either the old or the new set of prompts.
+With PROMPT_HOT_RELOAD enabled the file's mtime is checked at most every
+PROMPT_RELOAD_INTERVAL seconds.
+"""
+
+import hashlib
+import importlib.util
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from prompt_engineering.scripts import final_prompts as _final_prompts_module
+
+logger = logging.getLogger("solbot.prompts")
+
+PROMPTS_PATH = os.getenv("PROMPTS_PATH", _final_prompts_module.__file__)
+PROMPT_HOT_RELOAD = os.getenv("PROMPT_HOT_RELOAD", "true").lower() == "true"
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", 5))
+
+# Modes a prompt can be resolved for
+MODE_CHAT = "chat"
+MODE_SUBMISSION = "submission"
+# A submission scored through the evaluate_response tool instead of INSTRUCTOR_METADATA
+MODE_TOOL_SUBMISSION = "tool_submission"
+# The two halves of a split submission (see backend/utils/evaluation_pipeline.py)
+MODE_EVALUATION = "evaluation"
+MODE_GUIDANCE = "guidance"
+
+# Bound on lazily built entries (fallback prompts, submission variants) per table
+_MAX_DERIVED_ENTRIES = 256
+
+
+@dataclass(frozen=True)
+class PromptEntry:
+    """A resolved system prompt"""
+    key: str            # FINAL_PROMPTS key, or "fallback:<phase>:<component>"
+    mode: str
+    content: str
+    hash: str           # Short content hash, stable across processes and restarts
+    version: int        # Registry version in which this content first appeared
+
+
+def content_hash(content: str) -> str:
+    """Short, stable hash of a prompt's text"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def get_prompt_key(phase: str, component: Optional[str]) -> Optional[str]:
+    """Map a phase and component to its FINAL_PROMPTS key (None for phases without a final prompt)"""
+    if phase == "phase2":
+        return "phase2_learning_objectives"
+    elif phase == "phase4":
+        if component in ["longtermgoal", "long_term_goals"]:
+            return "phase4_long_term_goals"
+        elif component in ["shorttermgoal", "short_term_goals"]:
+            return "phase4_short_term_goals"
+        elif component in ["ifthen", "contingency_strategies"]:
+            return "phase4_contingency_strategies"
+        return "phase4_long_term_goals"  # Default for phase 4
+    elif phase == "phase5":
+        return "phase5_monitoring_adaptation"
+    return None
+
+
+def build_fallback_prompt(phase: str, component: Optional[str]) -> str:
+    """Generate the generic system prompt for phases without a final prompt"""
+    
+    # Define criteria sections based on phase
+    phase_criteria = {
+        "phase2": "• Goal Clarity: [⚠️/💡/✅] [brief feedback]\n• Background Connection: [⚠️/💡/✅] [brief feedback]\n• Study Resources: [⚠️/💡/✅] [brief feedback]",
+        "phase4_long_term": "• Goal Clarity: [⚠️/💡/✅] [brief feedback]\n• Timeline: [⚠️/💡/✅] [brief feedback]\n• Measurement: [⚠️/💡/✅] [brief feedback]",
+        "phase4_short_term": "• SMART Elements: [⚠️/💡/✅] [brief feedback]\n• Step-by-step Plan: [⚠️/💡/✅] [brief feedback]\n• Long-term Alignment: [⚠️/💡/✅] [brief feedback]",
+        "phase4_contingency": "• Problem Description: [⚠️/💡/✅] [brief feedback]\n• Response Clarity: [⚠️/💡/✅] [brief feedback]\n• Feasibility: [⚠️/💡/✅] [brief feedback]",
+        "phase5": "• Progress Checks: [⚠️/💡/✅] [brief feedback]\n• Adaptation Trigger: [⚠️/💡/✅] [brief feedback]\n• Strategy Alternatives: [⚠️/💡/✅] [brief feedback]\n• Success Criteria: [⚠️/💡/✅] [brief feedback]"
+    }
+    
+    # Select the right criteria based on phase and component
+    criteria_section = phase_criteria.get(phase)
+    phase_focus = "strategy"
+    
+    # Handle phase4 with different components
+    if phase == "phase4":
+        if component in ["longtermgoal", "long_term_goals"]:
+            criteria_section = phase_criteria["phase4_long_term"]
+            phase_focus = "long-term goal"
+        elif component in ["shorttermgoal", "short_term_goals"]:
+            criteria_section = phase_criteria["phase4_short_term"]
+            phase_focus = "short-term goal"
+        elif component in ["ifthen", "contingency_strategies"]:
+            criteria_section = phase_criteria["phase4_contingency"]
+            phase_focus = "contingency strategies"
+    elif phase == "phase2":
+        phase_focus = "learning objective"
+    elif phase == "phase5":
+        phase_focus = "monitoring & adaptation system"
+            
+    # Use generic template if no specific criteria found
+    if not criteria_section:
+        criteria_section = "• Key Element 1: [⚠️/💡/✅] [brief feedback]\n• Key Element 2: [⚠️/💡/✅] [brief feedback]\n• Key Element 3: [⚠️/💡/✅] [brief feedback]"
+    
+    # Create base prompt with consistent structure
+    prompt = f"""You are SoLBot, an AI tutor for self-regulated learning.
+
+Your response MUST follow this exact structure:
+
+## Greeting
+Brief, personalized greeting acknowledging the student's focus.
+
+## Assessment
+```
+Looking at your {phase_focus}:
+{criteria_section}
+```
+
+## Guidance
+Provide specific, actionable advice using templates, examples, or frameworks appropriate to their current level.
+
+## Next Steps
+Progress indicator: [▫▫▫▫▫▫] (X%)
+Ask ONE reflection question to deepen their understanding.
+
+When student achieves excellence (score ≥ 2.5), end with: "Your {phase_focus} is excellent! Please click the Continue button below to proceed to the next step in your learning journey."
+
+Use supportive, encouraging tone with educational emojis (🔍, 📝, 🔄, 📊, 🎯).
+
+⚠️ SCORING INSTRUCTIONS (NOT VISIBLE TO STUDENTS):
+Score 1-3 on each criterion.
+Calculate overall Score as the average.
+Set Scaffolding level based on score:
+- Score <1.5: Scaffolding 3 (HIGH support)
+- Score 1.5-2.0: Scaffolding 2 (MEDIUM support)
+- Score >2.0: Scaffolding 1 (LOW support)
+
+ALWAYS end with metadata in this exact format:
+<!-- INSTRUCTOR_METADATA
+Score: [1.0-3.0]
+Scaffolding: [1-3]
+[Phase-specific criteria scores]
+Rationale: [brief explanation]
+-->"""
+
+    return prompt
+
+
+def submission_suffix(phase: str, submission_type: Optional[str]) -> str:
+    """Evaluation instructions appended to the prompt for graded submissions"""
+    return (f"\n\nThis is a student submission for {phase}, {submission_type or 'goal'}. "
+            f"Please evaluate it carefully against the rubric criteria.")
+
+
+def tool_evaluation_suffix() -> str:
+    """Instructions appended for submissions scored with the evaluation tool"""
+    return ("\n\nDo not write the INSTRUCTOR_METADATA comment for this response. Instead, after "
+            "your feedback, call the evaluate_response tool once with a score for every rubric "
+            "criterion, the overall score and the scaffolding level.")
+
+
+def evaluation_only_suffix() -> str:
+    """Instructions for the scoring half of a split submission"""
+    return ("\n\nOnly score this submission: call the evaluate_response tool with a score for every "
+            "rubric criterion, the overall score and the scaffolding level. Do not write any feedback.")
+
+
+def guidance_only_suffix() -> str:
+    """Instructions for the feedback half of a split submission"""
+    return ("\n\nThe submission is scored separately; the scaffolding level to use is given after the "
+            "student's text. Write your feedback at that level of support. Do not write the "
+            "INSTRUCTOR_METADATA comment.")
+
+
+_MODE_SUFFIXES = {
+    MODE_TOOL_SUBMISSION: tool_evaluation_suffix,
+    MODE_EVALUATION: evaluation_only_suffix,
+    MODE_GUIDANCE: guidance_only_suffix,
+}
+
+
+def _load_prompts_from_file(path: str) -> Dict[str, str]:
+    """Execute a final_prompts.py file in isolation and return its FINAL_PROMPTS"""
+    spec = importlib.util.spec_from_file_location("_solbot_final_prompts_reload", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    prompts = getattr(module, "FINAL_PROMPTS", None)
+    if not isinstance(prompts, dict) or not prompts:
+        raise ValueError("FINAL_PROMPTS missing or empty")
+    for key, value in prompts.items():
+        if not isinstance(key, str) or not isinstance(value, str) or not value.strip():
+            raise ValueError(f"FINAL_PROMPTS[{key!r}] must be a non-empty string")
+    return dict(prompts)
+
+
+class _PromptTable:
+    """One immutable generation of prompts; derived entries are filled in lazily"""
+
+    def __init__(self, prompts: Dict[str, str], version: int, previous: Optional["_PromptTable"] = None):
+        self.version = version
+        self.entries: Dict[Tuple[str, str, Optional[str]], PromptEntry] = {}
+        # Fallback and submission variants, built on first use
+        self.derived: Dict[Tuple[str, str, Optional[str]], PromptEntry] = {}
+        for key, content in prompts.items():
+            self.entries[(key, MODE_CHAT, None)] = self._entry(key, MODE_CHAT, content, previous)
+        # Changes whenever any prompt's content changes (used to invalidate persisted caches)
+        self.fingerprint = content_hash("".join(sorted(f"{key[0]}={entry.hash};" for key, entry in self.entries.items())))
+
+    def _entry(self, key: str, mode: str, content: str, previous: Optional["_PromptTable"]) -> PromptEntry:
+        digest = content_hash(content)
+        version = self.version
+        if previous is not None:
+            # Unchanged prompts keep the version they were introduced in
+            old = previous.entries.get((key, mode, None))
+            if old is not None and old.hash == digest:
+                version = old.version
+        return PromptEntry(key=key, mode=mode, content=content, hash=digest, version=version)
+
+
+class PromptRegistry:
+    """Resolves system prompts from a versioned, hot-reloadable table"""
+
+    def __init__(self, prompts: Dict[str, str], path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._table = _PromptTable(prompts, version=1)
+        self._mtime = self._get_mtime()
+        self._last_check = time.monotonic()
+        logger.info(f"Prompt registry loaded {len(prompts)} prompts (version 1)")
+
+    @property
+    def version(self) -> int:
+        return self._table.version
+
+    @property
+    def fingerprint(self) -> str:
+        return self._table.fingerprint
+
+    def _get_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime if self.path else None
+        except OSError:
+            return None
+
+    def reload(self, force: bool = False) -> bool:
+        """Reload FINAL_PROMPTS from disk, keeping the current table if loading fails
+
+        Returns:
+            True if a new table was swapped in
+        """
+        if not self.path:
+            return False
+        with self._lock:
+            mtime = self._get_mtime()
+            if not force and mtime == self._mtime:
+                return False
+            try:
+                prompts = _load_prompts_from_file(self.path)
+            except Exception as e:
+                logger.error(f"Prompt reload from {self.path} failed, keeping version {self.version}: {e}")
+                self._mtime = mtime  # Don't retry a broken file until it changes again
+                return False
+
+            current = self._table
+            table = _PromptTable(prompts, version=current.version + 1, previous=current)
+            changed = [entry.key for key, entry in table.entries.items() if entry.version == table.version]
+            self._table = table  # Atomic swap
+            self._mtime = mtime
+            logger.info(f"Prompt registry reloaded: version {table.version}, changed: {changed or 'none'}")
+            return True
+
+    def _maybe_reload(self) -> None:
+        if not PROMPT_HOT_RELOAD or not self.path:
+            return
+        now = time.monotonic()
+        if now - self._last_check < PROMPT_RELOAD_INTERVAL:
+            return
+        self._last_check = now
+        if self._get_mtime() != self._mtime:
+            self.reload()
+
+    def get(self, phase: str, component: Optional[str], mode: str = MODE_CHAT,
+            submission_type: Optional[str] = None) -> PromptEntry:
+        """Resolve the system prompt for a phase, component and mode
+
+        Args:
+            phase: The learning phase
+            component: The component within the phase
+            mode: MODE_CHAT, MODE_SUBMISSION (adds the evaluation instructions),
+                MODE_TOOL_SUBMISSION (evaluation through the evaluate_response tool), or
+                MODE_EVALUATION / MODE_GUIDANCE (the two calls of a split submission)
+            submission_type: Submission type used in the evaluation instructions
+
+        Returns:
+            The resolved PromptEntry
+        """
+        self._maybe_reload()
+        table = self._table
+
+        key = get_prompt_key(phase, component)
+        base = table.entries.get((key, MODE_CHAT, None)) if key is not None else None
+        if base is not None and mode == MODE_CHAT:
+            return base
+        if base is None:
+            key = f"fallback:{phase}:{component}"
+
+        extra = f"{phase}:{submission_type}" if mode != MODE_CHAT else None
+        derived_key = (key, mode, extra)
+        entry = table.derived.get(derived_key)
+        if entry is None:
+            content = base.content if base is not None else build_fallback_prompt(phase, component)
+            if mode != MODE_CHAT:
+                content += submission_suffix(phase, submission_type)
+            if mode in _MODE_SUFFIXES:
+                content += _MODE_SUFFIXES[mode]()
+            # Variants follow their base prompt's version; fallback prompts live in code
+            entry = PromptEntry(key=key, mode=mode, content=content, hash=content_hash(content),
+                                version=base.version if base is not None else 1)
+            if len(table.derived) >= _MAX_DERIVED_ENTRIES:
+                table.derived.clear()
+            table.derived[derived_key] = entry
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        table = self._table
+        return {"version": table.version, "fingerprint": table.fingerprint, "prompts": len(table.entries),
+                "derived": len(table.derived)}
+
+
+registry = PromptRegistry(_final_prompts_module.FINAL_PROMPTS, path=PROMPTS_PATH)
+
+
+def get_prompt(phase: str, component: Optional[str], mode: str = MODE_CHAT,
+               submission_type: Optional[str] = None) -> PromptEntry:
+    """Resolve a system prompt from the shared registry"""
+    return registry.get(phase, component, mode, submission_type)
+
+
+def reload_prompts(force: bool = True) -> bool:
+    """Reload the shared registry from disk"""
+    return registry.reload(force=force)
@@ -0,0 +1,146 @@
+"""
+Compact prompts for revised submissions
+
+Students revise the same goal many times, and each revision used to go to Claude as a
+new message behind up to 8 prior turns, most of them long feedback replies. When a
+submission follows an earlier attempt of the same submission type in the same
+conversation, the chat pipeline sends one compact message instead of that history:
+
+- the earlier attempt's scores and scaffolding level
+- a short form of the feedback it got (the assessment lines)
+- a word-level diff of what changed
+- the full revised text, which is what the rubric scores
+
+The earlier attempt is found in the conversation history the pipeline already loads,
+so no extra state is kept. A revision that shares less than REVISION_MIN_SIMILARITY
+of its words with the earlier attempt is treated as a fresh submission.
+"""
+
+import difflib
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from backend.utils.metrics import registry
+from prompt_engineering.metadata import METADATA_START
+
+logger = logging.getLogger("solbot.revisions")
+
+REVISION_DIFF_ENABLED = os.getenv("REVISION_DIFF_ENABLED", "true").lower() == "true"
+REVISION_MIN_SIMILARITY = float(os.getenv("REVISION_MIN_SIMILARITY", 0.3))
+# Length of the feedback summary carried into the revision prompt
+REVISION_FEEDBACK_CHARS = int(os.getenv("REVISION_FEEDBACK_CHARS", 400))
+
+# Bullets of the assessment section ("• Timeline: ⚠️ No mentioned timeframe")
+_BULLET_PATTERN = re.compile(r"^\s*(?:[•*-]|\d+\.)\s+(.+)$")
+
+REVISION_PROMPTS = registry.counter(
+    "solbot_revision_prompts_total",
+    "Submissions sent as a compact revision prompt, or with full history",
+    ["outcome"]
+)
+
+_SUPPORT = {1: "high", 2: "medium", 3: "low"}
+
+
+def find_previous_attempt(history: List[Dict[str, Any]], submission_type: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Most recent earlier submission of this type in the history, with the reply it got
+
+    Args:
+        history: Conversation messages, oldest first, with their metadata
+        submission_type: The submission type of the new attempt
+
+    Returns:
+        Dict with text, feedback, score, scaffolding_level and criteria, or None
+    """
+    for index in range(len(history) - 1, -1, -1):
+        message = history[index]
+        metadata = message.get("metadata") or {}
+        if (message.get("role") != "user" or not metadata.get("is_submission")
+                or metadata.get("submission_type") != submission_type):
+            continue
+        reply = next((m for m in history[index + 1:] if m.get("role") == "assistant"), None)
+        if reply is None:
+            return None
+        reply_metadata = reply.get("metadata") or {}
+        evaluation = reply_metadata.get("evaluation_metadata") or {}
+        return {
+            "text": metadata.get("raw_message") or message.get("content", ""),
+            "feedback": reply.get("content", ""),
+            "score": reply_metadata.get("score"),
+            "scaffolding_level": reply_metadata.get("scaffolding_level"),
+            "criteria": evaluation.get("criteria") or {}
+        }
+    return None
+
+
+def summarize_feedback(feedback: str, limit: int = REVISION_FEEDBACK_CHARS) -> str:
+    """Short form of a feedback reply: its bullet lines, or its opening"""
+    text = feedback.split(METADATA_START, 1)[0]
+    bullets = []
+    for line in text.splitlines():
+        match = _BULLET_PATTERN.match(line)
+        if match:
+            bullets.append(match.group(1).replace("**", "").strip())
+    summary = "; ".join(bullets) if bullets else " ".join(text.split())
+    return summary if len(summary) <= limit else summary[:limit - 3].rstrip() + "..."
+
+
+def word_diff(previous: str, revised: str) -> Dict[str, Any]:
+    """Similarity ratio and the changed word runs between two attempts"""
+    old_words, new_words = previous.split(), revised.split()
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+    changes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        removed = " ".join(old_words[i1:i2])
+        added = " ".join(new_words[j1:j2])
+        if tag == "replace":
+            changes.append(f'- "{removed}" -> "{added}"')
+        elif tag == "delete":
+            changes.append(f'- removed "{removed}"')
+        else:
+            changes.append(f'- added "{added}"')
+    return {"ratio": matcher.ratio(), "changes": changes}
+
+
+def build_revision_message(previous: Dict[str, Any], revised: str, attempt_number: Optional[int] = None) -> Optional[str]:
+    """The compact message for a revised submission (None: send it as a fresh submission)"""
+    diff = word_diff(previous["text"], revised)
+    if diff["ratio"] < REVISION_MIN_SIMILARITY:
+        return None
+
+    score = previous["score"]
+    if score is not None:
+        scores = f"Score {round(score, 2) if isinstance(score, float) else score}"
+        if previous["criteria"]:
+            scores += " (" + ", ".join(f"{key}: {value}" for key, value in previous["criteria"].items()) + ")"
+    else:
+        scores = "Score unknown"
+    support = _SUPPORT.get(previous["scaffolding_level"])
+    if support:
+        scores += f", {support} support"
+    changes = "\n".join(diff["changes"]) if diff["changes"] else "- no changes"
+    revision = f"revision {attempt_number - 1}" if attempt_number and attempt_number > 1 else "a revision"
+
+    return (f"[This is {revision} of a submission you already evaluated.\n"
+            f"Previous evaluation: {scores}.\n"
+            f"Your previous feedback, in short: {summarize_feedback(previous['feedback'])}\n"
+            f"Changes since the previous attempt:\n{changes}]\n\n"
+            f"Revised submission:\n{revised}")
+
+
+def revision_message(history: List[Dict[str, Any]], submission_type: Optional[str], message: str,
+                     attempt_number: Optional[int] = None) -> Optional[str]:
+    """Compact message for a resubmission, or None to send it as usual with the full history"""
+    if not REVISION_DIFF_ENABLED:
+        return None
+    previous = find_previous_attempt(history, submission_type)
+    if previous is None:
+        REVISION_PROMPTS.inc(outcome="first_attempt")
+        return None
+    compact = build_revision_message(previous, message, attempt_number)
+    REVISION_PROMPTS.inc(outcome="revision" if compact is not None else "dissimilar")
+    return compact
@@ -0,0 +1,144 @@
+"""
+Model routing for chat requests
+
+Picks the Claude model and token budget per request from a route table. Rules are
+checked in order and the first one whose conditions all match wins; a condition
+left out of a rule always matches. The table can be replaced with a JSON file
+(MODEL_ROUTES_PATH) containing a list of rules in the same shape as DEFAULT_ROUTES.
+
+Decisions and outcomes are logged at DEBUG; per-route outcome stats (latency, tokens,
+estimated cost) are kept so routes can be compared.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("solbot.routing")
+
+DEFAULT_MODEL = os.getenv("CLAUDE_MODEL", "claude-3-5-sonnet-20241022")
+FAST_MODEL = os.getenv("CLAUDE_FAST_MODEL", "claude-3-5-haiku-20241022")
+MODEL_ROUTES_PATH = os.getenv("MODEL_ROUTES_PATH")
+
+# Supported conditions: phases, components, is_submission, min_input_chars, max_input_chars,
+# min_prescore, max_prescore, scaffolding_levels
+DEFAULT_ROUTES: List[Dict[str, Any]] = [
+    # The pre-scorer is fairly sure this needs the high-support template - a small model writes it well
+    {"name": "prescored_low", "is_submission": True, "min_prescore": 0.7, "model": FAST_MODEL, "max_tokens": 900},
+    # Short conversational turns ("what do you mean by measurable?")
+    {"name": "short_chat", "is_submission": False, "max_input_chars": 200, "model": FAST_MODEL, "max_tokens": 600},
+    # Students already at low support only need a couple of optimization questions (submissions
+    # still go to the default model, since they set the score and scaffolding level)
+    {"name": "low_support", "is_submission": False, "scaffolding_levels": [3], "model": FAST_MODEL, "max_tokens": 700},
+    {"name": "default", "model": DEFAULT_MODEL, "max_tokens": 1000},
+]
+
+# USD per million tokens (input, output), used for per-route cost estimates
+MODEL_PRICING = {
+    "claude-3-5-sonnet-20241022": (3.0, 15.0),
+    "claude-3-5-haiku-20241022": (0.8, 4.0),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+}
+
+# Per-route outcome stats
+route_stats: Dict[str, Dict[str, float]] = {}
+
+
+def load_routes(path: Optional[str] = MODEL_ROUTES_PATH) -> List[Dict[str, Any]]:
+    """Load the route table from a JSON file, falling back to DEFAULT_ROUTES"""
+    if not path:
+        return DEFAULT_ROUTES
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            routes = json.load(f)
+        if not isinstance(routes, list) or not all("model" in r and "name" in r for r in routes):
+            raise ValueError("route table must be a list of rules with name and model")
+        logger.info(f"Loaded {len(routes)} model routes from {path}")
+        return routes
+    except Exception as e:
+        logger.error(f"Error loading model routes from {path}: {e}. Using default routes")
+        return DEFAULT_ROUTES
+
+
+ROUTES = load_routes()
+
+
+def _matches(rule: Dict[str, Any], phase: str, component: Optional[str], input_chars: int,
+             prescore: Optional[float], scaffolding_level: Optional[int], is_submission: bool) -> bool:
+    if "phases" in rule and phase not in rule["phases"]:
+        return False
+    if "components" in rule and component not in rule["components"]:
+        return False
+    if "is_submission" in rule and bool(rule["is_submission"]) != is_submission:
+        return False
+    if "min_input_chars" in rule and input_chars < rule["min_input_chars"]:
+        return False
+    if "max_input_chars" in rule and input_chars > rule["max_input_chars"]:
+        return False
+    if "min_prescore" in rule and (prescore is None or prescore < rule["min_prescore"]):
+        return False
+    if "max_prescore" in rule and (prescore is None or prescore > rule["max_prescore"]):
+        return False
+    if "scaffolding_levels" in rule and scaffolding_level not in rule["scaffolding_levels"]:
+        return False
+    return True
+
+
+def select_route(phase: str, component: Optional[str], message: str, prescore: Optional[float] = None,
+                 scaffolding_level: Optional[int] = None, is_submission: bool = False) -> Dict[str, Any]:
+    """Pick the model and token budget for a request
+
+    Args:
+        phase: The learning phase
+        component: The component within the phase
+        message: The student's message
+        prescore: Pre-scorer probability of needing high support, if available
+        scaffolding_level: The student's current scaffolding level, if known
+        is_submission: Whether this is a graded submission
+
+    Returns:
+        Dictionary with the route name, model and max_tokens
+    """
+    input_chars = len(message or "")
+    for rule in ROUTES:
+        if _matches(rule, phase, component, input_chars, prescore, scaffolding_level, is_submission):
+            route = {"name": rule["name"], "model": rule["model"], "max_tokens": rule.get("max_tokens", 1000)}
+            break
+    else:
+        route = {"name": "default", "model": DEFAULT_MODEL, "max_tokens": 1000}
+
+    logger.debug("Route %s: model=%s, max_tokens=%s (phase=%s, component=%s, chars=%d, prescore=%s, "
+                 "scaffolding=%s, submission=%s)", route["name"], route["model"], route["max_tokens"],
+                 phase, component, input_chars, prescore, scaffolding_level, is_submission)
+    return route
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of a call (0 for unknown models)"""
+    input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def record_route_outcome(route: Dict[str, Any], duration_ms: float, usage: Optional[Dict[str, int]] = None,
+                         error: bool = False, cache_hit: bool = False) -> None:
+    """Accumulate latency, token and cost stats for a route and log the outcome"""
+    usage = usage or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    cost = estimate_cost(route["model"], input_tokens, output_tokens)
+
+    stats = route_stats.setdefault(route["name"], {
+        "requests": 0, "errors": 0, "cache_hits": 0, "latency_ms_total": 0.0,
+        "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0
+    })
+    stats["requests"] += 1
+    stats["errors"] += int(error)
+    stats["cache_hits"] += int(cache_hit)
+    stats["latency_ms_total"] += duration_ms
+    stats["input_tokens"] += input_tokens
+    stats["output_tokens"] += output_tokens
+    stats["cost_usd"] += cost
+
+    logger.debug("Route %s outcome: %.0fms, in=%d, out=%d, cost=$%.5f, error=%s, cache_hit=%s",
+                 route["name"], duration_ms, input_tokens, output_tokens, cost, error, cache_hit)
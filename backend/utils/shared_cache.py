@@ -0,0 +1,181 @@
+"""
+Host-local shared cache tier
+
+A second level behind the per-process caches (scaffolding levels in db.py, LLM
+responses in llm.py, chat responses in routes/chat.py). Without it, each uvicorn
+worker started by run_backend.py has its own dicts. A student whose requests land on
+different workers then misses the cache, and can read a scaffolding level another
+worker has since changed.
+
+Entries live in a SQLite file in WAL mode (SHARED_CACHE_PATH), which every worker on
+the host opens. Readers never block writers. A lookup is one primary-key read of a
+local file: tens of microseconds, cheap enough to do inline on the event loop. Each
+entry has a TTL. Writers overwrite or delete entries to invalidate them everywhere
+(see db.save_scaffolding_level).
+
+Values must be JSON-serializable. Any SQLite error is logged and counted, and the
+caller just sees a miss, so the shared tier can never take a request down.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from backend.utils.metrics import CACHE_REQUESTS, registry
+
+logger = logging.getLogger("solbot.shared_cache")
+
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "true").lower() == "true"
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "/tmp/solbot-shared-cache.sqlite3")
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", 50000))
+# Writes between sweeps of expired (and, past the limit, oldest) entries
+_SWEEP_EVERY = 500
+
+SHARED_CACHE_ERRORS = registry.counter(
+    "solbot_shared_cache_errors_total",
+    "Shared cache operations that failed and were treated as misses",
+    ["operation"]
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID
+"""
+
+
+class SharedCache:
+    """Namespaced key/value store with TTLs in a WAL-mode SQLite file"""
+
+    def __init__(self, path: str = SHARED_CACHE_PATH, max_entries: int = SHARED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                    (namespace, key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            self._failed("get", e)
+            return None
+        hit = row is not None
+        CACHE_REQUESTS.inc(cache=f"shared:{namespace}", result="hit" if hit else "miss")
+        return json.loads(row[0]) if hit else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> bool:
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.debug("Not caching %s:%s in the shared tier: %s", namespace, key, e)
+            return False
+        try:
+            with self._lock:
+                self._connection().execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, payload, time.time() + ttl)
+                )
+                self._writes += 1
+                if self._writes % _SWEEP_EVERY == 0:
+                    self._sweep()
+        except sqlite3.Error as e:
+            self._failed("set", e)
+            return False
+        return True
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            with self._lock:
+                self._connection().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                                           (namespace, key))
+        except sqlite3.Error as e:
+            self._failed("delete", e)
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        try:
+            with self._lock:
+                if namespace is None:
+                    self._connection().execute("DELETE FROM cache_entries")
+                else:
+                    self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+        except sqlite3.Error as e:
+            self._failed("clear", e)
+
+    def _sweep(self) -> None:
+        """Drop expired entries, then the soonest-to-expire ones beyond max_entries (lock held)"""
+        conn = self._connection()
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE (namespace, key) IN "
+                "(SELECT namespace, key FROM cache_entries ORDER BY expires_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        SHARED_CACHE_ERRORS.inc(operation=operation)
+        logger.warning(f"Shared cache {operation} failed: {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            with self._lock:
+                rows = self._connection().execute(
+                    "SELECT namespace, COUNT(*), SUM(expires_at > ?) FROM cache_entries GROUP BY namespace",
+                    (time.time(),)
+                ).fetchall()
+        except sqlite3.Error as e:
+            self._failed("stats", e)
+            return {"path": self.path, "error": str(e)}
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {
+            "path": self.path,
+            "file_bytes": size,
+            "namespaces": {namespace: {"entries": total, "live": live or 0} for namespace, total, live in rows}
+        }
+
+
+shared_cache: Optional[SharedCache] = SharedCache() if SHARED_CACHE_ENABLED else None
+
+
+def shared_get(namespace: str, key: str) -> Optional[Any]:
+    """Look up a value in the shared tier (None on a miss or when the tier is disabled)"""
+    if shared_cache is None:
+        return None
+    return shared_cache.get(namespace, key)
+
+
+def shared_set(namespace: str, key: str, value: Any, ttl: float) -> None:
+    """Store a value in the shared tier for `ttl` seconds"""
+    if shared_cache is not None:
+        shared_cache.set(namespace, key, value, ttl)
+
+
+def shared_delete(namespace: str, key: str) -> None:
+    """Invalidate a key for every worker on this host"""
+    if shared_cache is not None:
+        shared_cache.delete(namespace, key)
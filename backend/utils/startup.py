@@ -0,0 +1,85 @@
+"""
+Startup timing
+
+Records how long each import and initialization step takes between process start
+and the point where the worker can serve requests. The breakdown is logged once
+startup finishes, exported as `solbot_startup_step_seconds` and returned by
+/api/admin/startup. This module only uses the standard library so it can be
+imported before anything else is timed.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("solbot.startup")
+
+_origin = time.perf_counter()
+_steps: List[Dict[str, Any]] = []
+_ready_at: Optional[float] = None
+
+
+def _process_age() -> Optional[float]:
+    """Seconds since the process started (Linux only; None elsewhere)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name, which may itself contain spaces
+            fields = f.read().rpartition(")")[2].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Interpreter start-up and the imports that ran before this module
+_preamble = _process_age()
+
+
+@contextmanager
+def startup_step(name: str):
+    """Time the enclosed import or initialization step"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_step(name, time.perf_counter() - start, start)
+
+
+def record_step(name: str, seconds: float, start: Optional[float] = None) -> None:
+    if start is None:
+        start = time.perf_counter() - seconds
+    _steps.append({"step": name, "start_ms": round((start - _origin) * 1000, 1), "duration_ms": round(seconds * 1000, 1)})
+
+
+def mark_ready() -> Dict[str, Any]:
+    """Mark the worker as ready to serve and log the startup breakdown (once)"""
+    global _ready_at
+    if _ready_at is None:
+        _ready_at = time.perf_counter()
+        report = startup_report()
+        steps = ", ".join(f"{s['step']}={s['duration_ms']:.0f}ms" for s in _steps)
+        logger.info(f"Startup finished in {report['total_ms']:.0f}ms "
+                    f"(preamble={report['preamble_ms'] or 0:.0f}ms): {steps}")
+
+        from backend.utils.metrics import registry
+        gauge = registry.gauge("solbot_startup_step_seconds", "Duration of each startup step", ["step"])
+        for step in _steps:
+            gauge.set(step["duration_ms"] / 1000, step=step["step"])
+        gauge.set(report["total_ms"] / 1000, step="total")
+    return startup_report()
+
+
+def startup_report() -> Dict[str, Any]:
+    """Startup steps so far; total_ms includes the interpreter preamble when it is known"""
+    end = _ready_at if _ready_at is not None else time.perf_counter()
+    preamble_ms = round(_preamble * 1000, 1) if _preamble is not None else None
+    return {
+        "ready": _ready_at is not None,
+        "preamble_ms": preamble_ms,
+        "since_import_ms": round((end - _origin) * 1000, 1),
+        "total_ms": round((end - _origin) * 1000 + (preamble_ms or 0), 1),
+        "steps": list(_steps)
+    }
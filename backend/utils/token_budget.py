@@ -0,0 +1,151 @@
+"""
+Adaptive max_tokens from observed output lengths
+
+Routes give every request a fixed max_tokens cap, but reply lengths vary a lot by
+phase and scaffolding level: high-support template answers run long, low-support
+replies are a few questions. This module keeps a streaming histogram of output tokens
+for each (phase, component, scaffolding level, kind), where kind is chat, submission
+or guidance. It then budgets a request at a high percentile of what that key has
+produced, plus a margin, never above the route's cap. Single-call submissions are
+tracked but not budgeted, since their evaluation comes at the end of the reply.
+
+- Histograms are fed from log_llm_interaction for calls that carry a budget key.
+  Cached replies, errors and other calls (such as the split pipeline's evaluation
+  call) are not counted.
+- A reply cut off at max_tokens has an unknown true length. It is counted above every
+  bucket, so a key that truncates more often than the percentile allows goes back to
+  the route cap rather than shrinking further.
+- Counts are halved once a key passes TOKEN_BUDGET_WINDOW observations, so budgets
+  follow prompt changes.
+- Keys with fewer than TOKEN_BUDGET_MIN_SAMPLES observations use the route cap.
+
+Tighter budgets bound worst-case generation time, since a reply costs roughly
+max_tokens / tokens-per-second at most. The truncation rate is exported as
+solbot_llm_output_budget_total{outcome="truncated"} and should stay near
+(100 - TOKEN_BUDGET_PERCENTILE)%.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from backend.utils.cache_snapshot import SnapshotSource, register_snapshot
+from backend.utils.metrics import registry
+
+logger = logging.getLogger("solbot.token_budget")
+
+TOKEN_BUDGET_ENABLED = os.getenv("TOKEN_BUDGET_ENABLED", "true").lower() == "true"
+TOKEN_BUDGET_PERCENTILE = float(os.getenv("TOKEN_BUDGET_PERCENTILE", 99))
+# Headroom on top of the percentile, as a fraction
+TOKEN_BUDGET_MARGIN = float(os.getenv("TOKEN_BUDGET_MARGIN", 0.15))
+TOKEN_BUDGET_MIN_SAMPLES = int(os.getenv("TOKEN_BUDGET_MIN_SAMPLES", 50))
+# Lowest budget ever handed out
+TOKEN_BUDGET_FLOOR = int(os.getenv("TOKEN_BUDGET_FLOOR", 200))
+TOKEN_BUDGET_WINDOW = int(os.getenv("TOKEN_BUDGET_WINDOW", 2000))
+
+# Histogram resolution: BUCKET_TOKENS-wide buckets up to MAX_TRACKED_TOKENS, plus one
+# overflow bucket for longer and truncated replies
+BUCKET_TOKENS = 25
+MAX_TRACKED_TOKENS = 4000
+_BUCKETS = MAX_TRACKED_TOKENS // BUCKET_TOKENS
+
+# Histograms are kept across restarts by the cache snapshot
+_SNAPSHOT_TTL = 7 * 24 * 3600
+
+OUTPUT_BUDGET = registry.counter(
+    "solbot_llm_output_budget_total",
+    "Replies generated under a tracked output budget, by whether they hit max_tokens",
+    ["phase", "outcome"]
+)
+BUDGET_TOKENS = registry.gauge(
+    "solbot_llm_output_budget_tokens",
+    "Most recent max_tokens budget handed out",
+    ["phase", "component", "scaffolding", "kind"]
+)
+
+
+def budget_key(phase: str, component: Optional[str], scaffolding_level: Optional[int], kind: str) -> str:
+    """Histogram key for a request"""
+    return f"{phase}:{component or 'general'}:{scaffolding_level or 0}:{kind}"
+
+
+class TokenBudget:
+    """Streaming output-length histograms and the max_tokens budgets derived from them"""
+
+    def __init__(self, percentile: float = TOKEN_BUDGET_PERCENTILE, margin: float = TOKEN_BUDGET_MARGIN,
+                 min_samples: int = TOKEN_BUDGET_MIN_SAMPLES, floor: int = TOKEN_BUDGET_FLOOR,
+                 window: int = TOKEN_BUDGET_WINDOW, enabled: bool = TOKEN_BUDGET_ENABLED):
+        self.percentile = percentile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.floor = floor
+        self.window = window
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # key -> {"counts": [...], "count": n, "truncated": n, "timestamp": t}
+        self.histograms: Dict[str, Dict[str, Any]] = {}
+
+    def observe(self, key: str, output_tokens: int, truncated: bool = False) -> None:
+        """Record one reply's output length"""
+        index = _BUCKETS if truncated else min(_BUCKETS, int(output_tokens) // BUCKET_TOKENS)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"counts": [0] * (_BUCKETS + 1), "count": 0, "truncated": 0}
+            counts: List[int] = histogram["counts"]
+            counts[index] += 1
+            histogram["count"] += 1
+            histogram["truncated"] += int(truncated)
+            histogram["timestamp"] = time.time()
+            if histogram["count"] > self.window:
+                # Decay: older observations count half as much
+                for i, value in enumerate(counts):
+                    counts[i] = value // 2
+                histogram["count"] = sum(counts)
+                histogram["truncated"] //= 2
+        OUTPUT_BUDGET.inc(phase=key.split(":", 1)[0], outcome="truncated" if truncated else "complete")
+
+    def quantile(self, key: str, percentile: Optional[float] = None) -> Optional[int]:
+        """Upper bound of the bucket holding the percentile (None: too few samples or in overflow)"""
+        histogram = self.histograms.get(key)
+        if histogram is None or histogram["count"] < self.min_samples:
+            return None
+        rank = math.ceil(histogram["count"] * (percentile if percentile is not None else self.percentile) / 100)
+        seen = 0
+        for index, value in enumerate(histogram["counts"]):
+            seen += value
+            if seen >= rank:
+                return (index + 1) * BUCKET_TOKENS if index < _BUCKETS else None
+        return None
+
+    def budget(self, key: str, cap: int) -> int:
+        """max_tokens for a request: the learned percentile plus margin, at most `cap`"""
+        if not self.enabled:
+            return cap
+        value = self.quantile(key)
+        budget = cap if value is None else max(self.floor, min(cap, math.ceil(value * (1 + self.margin))))
+        phase, component, scaffolding, kind = key.split(":", 3)
+        BUDGET_TOKENS.set(budget, phase=phase, component=component, scaffolding=scaffolding, kind=kind)
+        return budget
+
+    def stats(self) -> Dict[str, Any]:
+        keys = {}
+        for key, histogram in list(self.histograms.items()):
+            count = histogram["count"]
+            keys[key] = {
+                "count": count,
+                "truncation_rate": round(histogram["truncated"] / count, 4) if count else None,
+                "p50": self.quantile(key, 50),
+                "p95": self.quantile(key, 95),
+                f"p{self.percentile:g}": self.quantile(key)
+            }
+        return {"enabled": self.enabled, "percentile": self.percentile, "margin": self.margin,
+                "min_samples": self.min_samples, "keys": keys}
+
+
+token_budget = TokenBudget()
+register_snapshot(SnapshotSource("token_budget", token_budget.histograms, _SNAPSHOT_TTL,
+                                 lambda histogram: histogram.get("timestamp", 0), prompt_bound=True))
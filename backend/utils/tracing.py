@@ -0,0 +1,237 @@
+"""
+Per-request tracing
+
+A lightweight span tree carried in contextvars, so anything called while handling a
+request (chat pipeline, call_claude, db functions) can record spans without the
+trace being passed around. Timestamps come from time.perf_counter().
+
+TracingMiddleware starts a trace for every HTTP request, returns a per-stage
+breakdown in the `Server-Timing` header and logs the full span tree for requests
+slower than TRACE_SLOW_MS. With no active trace, `span()` and `traced` only pay
+for one contextvar lookup.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("solbot.tracing")
+
+TRACING_ENABLED = os.getenv("ENABLE_TRACING", "true").lower() == "true"
+# Requests slower than this get their span tree logged
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", 10000))
+# Fraction of slow requests to log
+TRACE_SLOW_SAMPLE_RATE = float(os.getenv("TRACE_SLOW_SAMPLE_RATE", 1.0))
+# Include the span tree as `debug_timing` in chat responses for every request
+# (otherwise only when the client sends `X-Debug-Timing: 1`)
+TRACE_DEBUG_TIMING = os.getenv("TRACE_DEBUG_TIMING", "false").lower() == "true"
+
+# Safety limit for pathological requests (e.g. a loop of db calls)
+MAX_SPANS_PER_TRACE = 500
+
+_SERVER_TIMING_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class Span:
+    """A timed operation within a trace"""
+    __slots__ = ("name", "start", "end", "attributes", "children")
+
+    def __init__(self, name: str, start: Optional[float] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        result = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2)
+        }
+        if self.attributes:
+            result["attributes"] = self.attributes
+        if self.children:
+            result["children"] = [child.to_dict(origin) for child in sorted(self.children, key=lambda c: c.start)]
+        return result
+
+
+class Trace:
+    """Span tree for one request"""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.root = Span(name)
+        self.span_count = 1
+
+    def add_child(self, parent: Span, child: Span) -> bool:
+        if self.span_count >= MAX_SPANS_PER_TRACE:
+            return False
+        parent.children.append(child)
+        self.span_count += 1
+        return True
+
+    def finish(self) -> None:
+        if self.root.end is None:
+            self.root.end = time.perf_counter()
+
+    def iter_spans(self):
+        stack = list(reversed(self.root.children))
+        while stack:
+            span = stack.pop()
+            yield span
+            stack.extend(reversed(span.children))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, **self.root.to_dict(self.root.start)}
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: total plus the summed duration of each span name"""
+        totals: Dict[str, float] = {}
+        for span in self.iter_spans():
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        entries = [f"total;dur={self.root.duration_ms:.1f}"]
+        entries += [f"{_SERVER_TIMING_NAME.sub('_', name)};dur={duration:.1f}" for name, duration in totals.items()]
+        return ", ".join(entries)
+
+    def render(self) -> str:
+        """Indented text view of the span tree for logs"""
+        lines = []
+
+        def walk(span: Span, depth: int):
+            offset = (span.start - self.root.start) * 1000
+            attributes = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+            lines.append(f"{'  ' * depth}{span.name}: {span.duration_ms:.1f}ms (+{offset:.1f}ms) {attributes}".rstrip())
+            for child in sorted(span.children, key=lambda c: c.start):
+                walk(child, depth + 1)
+
+        walk(self.root, 0)
+        return "\n".join(lines)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("solbot_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("solbot_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def start_trace(name: str, trace_id: Optional[str] = None) -> Optional[Trace]:
+    """Start a trace in the current context (None when tracing is disabled)"""
+    if not TRACING_ENABLED:
+        return None
+    trace = Trace(name, trace_id)
+    _current_trace.set(trace)
+    _current_span.set(trace.root)
+    return trace
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Record the enclosed block as a child of the current span"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get() or trace.root
+    child = Span(name, attributes=attributes)
+    if not trace.add_child(parent, child):
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def record_span(name: str, duration_seconds: float, **attributes: Any) -> None:
+    """Record an already-finished operation that ended just now"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    end = time.perf_counter()
+    child = Span(name, start=end - duration_seconds, attributes=attributes)
+    child.end = end
+    trace.add_child(_current_span.get() or trace.root, child)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator recording each call of a sync or async function as a span"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_trace.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def debug_timing_requested(http_request: Any) -> bool:
+    """Whether the response should carry the span tree as `debug_timing`"""
+    if TRACE_DEBUG_TIMING:
+        return True
+    headers = getattr(http_request, "headers", None)
+    return bool(headers) and headers.get("x-debug-timing", "").lower() in ("1", "true")
+
+
+class TracingMiddleware:
+    """ASGI middleware that traces each HTTP request and adds a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope.get("path", "")
+        trace = start_trace(f"{scope.get('method', 'GET')} {path}")
+        status = {"code": 0}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message.get("status", 0)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            trace.finish()
+            duration_ms = trace.root.duration_ms
+            if duration_ms >= TRACE_SLOW_MS and random.random() < TRACE_SLOW_SAMPLE_RATE:
+                logger.warning(f"Slow request {trace.trace_id} ({duration_ms:.0f}ms, status={status['code']}):\n"
+                               f"{trace.render()}")
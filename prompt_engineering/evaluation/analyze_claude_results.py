@@ -22,6 +22,9 @@ from collections import defaultdict, Counter
 from pathlib import Path
 import datetime
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from prompt_engineering.metadata import core_components, parse_metadata
+
 # Set style for visualizations
 plt.style.use('ggplot')
 sns.set_theme(style="whitegrid")
@@ -37,6 +40,14 @@ def load_data(file_path: str = '/Users/sirui/Desktop/mybot/claude_test_results.x
     # Load the Excel file
     df = pd.read_excel(file_path, sheet_name='All Results')
     
+    # Re-parse Claude's responses directly when they are available: a single pass per
+    # row that picks up every rubric key, instead of evaluating the stringified dicts
+    if 'claude_response' in df.columns:
+        parsed = [parse_metadata(r) if isinstance(r, str) else None for r in df['claude_response']]
+        df['metadata'] = [m.fields if m is not None else {"error": "No metadata found in response"} for m in parsed]
+        df['core_components'] = [core_components(m, phase) for m, phase in zip(df['metadata'], df['phase'])]
+        return df
+    
     # Convert string representations of dictionaries to actual dictionaries
     try:
         df['metadata'] = df['metadata'].apply(ast.literal_eval)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+SoLBot Prompt Engineering - Instructor Metadata Parser
+
+One parser for the evaluation metadata at the end of tutor responses, shared by the
+backend (routes/chat.py) and the analysis scripts. It handles three formats:
+
+- INSTRUCTOR_METADATA comment (current prompts):
+    <!-- INSTRUCTOR_METADATA
+    Score: 2.3
+    Scaffolding: medium
+    Task_Identification: 2
+    Rationale: ...
+    -->
+- INSTRUCTOR NOTE comment (older prompts):
+    <!-- INSTRUCTOR NOTE: Goal Score: 2.1/3.0, Recommended Scaffolding: Level 2 -->
+- Bracketed scores (oldest prompts):
+    [Evaluation Scores:
+    Alignment: 2 (...)
+    Overall Score: 2.0
+    Providing MEDIUM support]
+
+`parse_metadata` finds the block with a single compiled search (a plain reverse
+substring search for the current format) and reads it line by line. It returns an
+`InstructorMetadata` with the overall score, the scaffolding level and a numeric score
+for every criterion key present, whether or not it is in a known list. Responses with
+no metadata cost one substring check. `MetadataStreamDetector` spots the block as
+chunks of a streamed response arrive.
+
+Scaffolding levels follow the backend: 1 = high support, 2 = medium, 3 = low support.
+"""
+
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from prompt_engineering.rubrics import RUBRICS
+
+FORMAT_INSTRUCTOR_METADATA = "instructor_metadata"
+FORMAT_INSTRUCTOR_NOTE = "instructor_note"
+FORMAT_EVALUATION_SCORES = "evaluation_scores"
+
+METADATA_START = "<!-- INSTRUCTOR_METADATA"
+_NOTE_START = "<!-- INSTRUCTOR NOTE:"
+_BRACKET_START = "[Evaluation Scores:"
+
+# Any of the three blocks; group 1/2/3 is the body of the matching format
+BLOCK_PATTERN = re.compile(
+    r"<!-- INSTRUCTOR_METADATA(.*?)-->|<!-- INSTRUCTOR NOTE:(.*?)-->|\[Evaluation Scores:(.*?)\]",
+    re.DOTALL
+)
+# 2, 2.5, 2/3, 2.1/3.0, Level 2
+NUMBER_PATTERN = re.compile(r"(?:Level\s+)?([-+]?\d+(?:\.\d+)?)", re.IGNORECASE)
+# Goal Score: 2.1/3.0
+NOTE_SCORE_PATTERN = re.compile(r"Goal Score:\s*(\d+(?:\.\d+)?)")
+# Recommended Scaffolding: Level 2
+NOTE_SCAFFOLDING_PATTERN = re.compile(r"Scaffolding:\s*Level\s*(\d+)", re.IGNORECASE)
+# Providing MEDIUM support
+SUPPORT_PATTERN = re.compile(r"Providing\s+(HIGH|MEDIUM|LOW)\s+support", re.IGNORECASE)
+
+SCAFFOLDING_LEVELS = {"high": 1, "medium": 2, "low": 3}
+
+
+@dataclass
+class InstructorMetadata:
+    """Evaluation metadata parsed from one response"""
+    format: str
+    score: Optional[float] = None
+    scaffolding_level: Optional[int] = None  # 1 = high support ... 3 = low support
+    criteria: Dict[str, float] = field(default_factory=dict)  # e.g. {"Task_Identification": 2}
+    rationale: Optional[str] = None
+    fields: Dict[str, str] = field(default_factory=dict)  # every "Key: value" line, as written
+    span: Tuple[int, int] = (0, 0)  # where the block sits in the response
+    raw: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def parse_number(value: Optional[str]) -> Optional[float]:
+    """Leading number of a field value ("2", "2.5/3.0", "Level 2", "2 (partial)")"""
+    if not value:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        match = NUMBER_PATTERN.match(value.strip())
+        if match is None:
+            return None
+        number = float(match.group(1))
+    return int(number) if number.is_integer() else number
+
+
+def parse_scaffolding(value: Optional[str]) -> Optional[int]:
+    """Scaffolding level from "high"/"medium"/"low" or a number 1-3"""
+    if not value:
+        return None
+    text = value.strip().lower()
+    for word, level in SCAFFOLDING_LEVELS.items():
+        if text.startswith(word):
+            return level
+    number = parse_number(text)
+    return int(number) if number is not None and 1 <= number <= 3 else None
+
+
+def _parse_fields(body: str, metadata: InstructorMetadata) -> None:
+    # str.partition per line is several times faster than a multiline regex here
+    for line in body.splitlines():
+        key, separator, value = line.partition(":")
+        key = key.strip()
+        if not separator or not key:
+            continue
+        value = value.strip()
+        metadata.fields[key] = value
+        if key == "Score" or key == "Overall Score":
+            score = parse_number(value)
+            metadata.score = float(score) if score is not None else None
+        elif key == "Scaffolding":
+            metadata.scaffolding_level = parse_scaffolding(value)
+        elif key == "Rationale":
+            metadata.rationale = value
+        else:
+            number = parse_number(value)
+            if number is not None:
+                metadata.criteria[key] = number
+
+
+def parse_metadata(text: str) -> Optional[InstructorMetadata]:
+    """Parse the last metadata block in a response (None if there is none)
+
+    Args:
+        text: Full response text
+
+    Returns:
+        InstructorMetadata, or None when the response has no recognizable block
+    """
+    if not text:
+        return None
+    # Fast path for the current format: the block is at the end of the response
+    start = text.rfind(METADATA_START)
+    if start != -1:
+        end = text.find("-->", start)
+        if end != -1:
+            metadata = InstructorMetadata(FORMAT_INSTRUCTOR_METADATA, span=(start, end + 3), raw=text[start:end + 3])
+            _parse_fields(text[start + len(METADATA_START):end], metadata)
+            return metadata
+    elif _NOTE_START not in text and _BRACKET_START not in text:
+        return None
+
+    match = BLOCK_PATTERN.search(text)
+    if match is None:
+        return None
+    metadata_body, note_body, bracket_body = match.groups()
+    if metadata_body is not None:
+        metadata = InstructorMetadata(FORMAT_INSTRUCTOR_METADATA, span=match.span(), raw=match.group(0))
+        _parse_fields(metadata_body, metadata)
+    elif note_body is not None:
+        metadata = InstructorMetadata(FORMAT_INSTRUCTOR_NOTE, span=match.span(), raw=match.group(0))
+        score = NOTE_SCORE_PATTERN.search(note_body)
+        scaffolding = NOTE_SCAFFOLDING_PATTERN.search(note_body)
+        metadata.score = float(score.group(1)) if score else None
+        metadata.scaffolding_level = int(scaffolding.group(1)) if scaffolding else None
+    else:
+        metadata = InstructorMetadata(FORMAT_EVALUATION_SCORES, span=match.span(), raw=match.group(0))
+        _parse_fields(bracket_body, metadata)
+        support = SUPPORT_PATTERN.search(bracket_body)
+        if support:
+            metadata.scaffolding_level = SCAFFOLDING_LEVELS[support.group(1).lower()]
+    return metadata
+
+
+def rubric_keys(prompt_key: Optional[str]) -> List[str]:
+    """Criterion keys the phase's INSTRUCTOR_METADATA block carries (empty for unknown keys)"""
+    rubric = RUBRICS.get(prompt_key) if prompt_key else None
+    if not rubric:
+        return []
+    return rubric["metadata_keys"] or [c["key"] for c in rubric["criteria"]]
+
+
+def core_components(fields: Dict[str, str], prompt_key: str) -> Dict[str, str]:
+    """Score, Scaffolding and the phase's rubric keys from parsed fields ("N/A" when missing)"""
+    keys = ["Score", "Scaffolding"] + rubric_keys(prompt_key)
+    return {key: fields.get(key, "N/A") for key in keys}
+
+
+class MetadataStreamDetector:
+    """Finds the INSTRUCTOR_METADATA block while a response streams in
+
+    Feed each text chunk as it arrives:
+    - `started` turns True as soon as the block begins, so the tutoring text is complete.
+    - `feed` returns the parsed metadata once, when the closing `-->` arrives.
+    Only the new text is scanned, plus enough overlap to catch a marker split across
+    chunks.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._text = ""
+        self._scanned = 0
+        self.start: Optional[int] = None
+        self.metadata: Optional[InstructorMetadata] = None
+
+    @property
+    def started(self) -> bool:
+        return self.start is not None
+
+    @property
+    def text(self) -> str:
+        if self._buffer:
+            self._text += "".join(self._buffer)
+            self._buffer = []
+        return self._text
+
+    @property
+    def visible_text(self) -> str:
+        """Response text before the metadata block (or everything so far, minus a possible partial marker)"""
+        text = self.text
+        if self.start is not None:
+            return text[:self.start]
+        # Hold back a tail that could be the beginning of the marker
+        for size in range(min(len(METADATA_START) - 1, len(text)), 0, -1):
+            if METADATA_START.startswith(text[-size:]):
+                return text[:-size]
+        return text
+
+    def feed(self, chunk: str) -> Optional[InstructorMetadata]:
+        """Add a chunk; returns the metadata the first time the block is complete"""
+        if chunk:
+            self._buffer.append(chunk)
+        if self.metadata is not None or not chunk:
+            return None
+        text = self.text
+        if self.start is None:
+            found = text.find(METADATA_START, max(0, self._scanned - len(METADATA_START) + 1))
+            self._scanned = len(text)
+            if found == -1:
+                return None
+            self.start = found
+            self._scanned = found + len(METADATA_START)
+        end = text.find("-->", max(self.start + len(METADATA_START), self._scanned - 2))
+        self._scanned = len(text)
+        if end == -1:
+            return None
+        self.metadata = InstructorMetadata(FORMAT_INSTRUCTOR_METADATA, span=(self.start, end + 3),
+                                           raw=text[self.start:end + 3])
+        _parse_fields(text[self.start + len(METADATA_START):end], self.metadata)
+        return self.metadata
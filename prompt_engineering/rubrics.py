@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+SoLBot Prompt Engineering - Rubric Registry
+
+Parses the rubric tables and metadata formats out of FINAL_PROMPTS so that code
+which needs the criteria (local pre-scoring, templated feedback, evaluation tools)
+uses the same definitions the LLM is prompted with.
+"""
+
+import re
+from typing import Any, Dict, List
+
+from prompt_engineering.scripts.final_prompts import FINAL_PROMPTS
+
+# | **Task Identification** | low text | medium text | high text |
+RUBRIC_ROW_PATTERN = re.compile(r"^\|\s*\*\*(.+?)\*\*\s*\|(.*?)\|(.*?)\|(.*?)\|\s*$", re.MULTILINE)
+# Looking at your learning objective and resource:
+FOCUS_PATTERN = re.compile(r"^Looking at your (.+?):\s*$", re.MULTILINE)
+# | Low (1.0 ≤ score < 1.8) | High Support |
+SCAFFOLDING_ROW_PATTERN = re.compile(r"^\|\s*(?:Low|Medium|High)\s*\((.+?)\)\s*\|\s*(High|Medium|Low) Support\s*\|", re.MULTILINE)
+# Task_Identification: [1-3]
+METADATA_KEY_PATTERN = re.compile(r"^([A-Za-z_]+):\s*\[1-3\]", re.MULTILINE)
+
+
+def criterion_key(name: str) -> str:
+    """Convert a rubric criterion name to its INSTRUCTOR_METADATA key (e.g. If-Then Structure -> If_Then_Structure)"""
+    return re.sub(r"[^A-Za-z0-9]+", "_", name.strip()).strip("_")
+
+
+def parse_rubric(prompt: str) -> Dict[str, Any]:
+    """Extract the rubric criteria, scaffolding table, assessment focus and metadata keys from a prompt"""
+    criteria = []
+    for match in RUBRIC_ROW_PATTERN.finditer(prompt):
+        name = match.group(1).strip()
+        criteria.append({
+            "name": name,
+            "key": criterion_key(name),
+            "low": match.group(2).strip(),
+            "medium": match.group(3).strip(),
+            "high": match.group(4).strip()
+        })
+
+    # Score range that maps to each support level, e.g. {"high": "1.0 ≤ score < 1.8"}
+    scaffolding = {support.lower(): score_range.strip() for score_range, support in SCAFFOLDING_ROW_PATTERN.findall(prompt)}
+
+    metadata_start = prompt.find("INSTRUCTOR_METADATA")
+    metadata_keys = METADATA_KEY_PATTERN.findall(prompt[metadata_start:]) if metadata_start != -1 else []
+
+    focus_match = FOCUS_PATTERN.search(prompt)
+    return {
+        "focus": focus_match.group(1).strip() if focus_match else "response",
+        "criteria": criteria,
+        "scaffolding": scaffolding,
+        "metadata_keys": metadata_keys
+    }
+
+
+def build_rubrics(prompts: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """Parse the rubric of every prompt, keyed like FINAL_PROMPTS"""
+    return {key: parse_rubric(prompt) for key, prompt in prompts.items()}
+
+
+RUBRICS = build_rubrics(FINAL_PROMPTS)
+
+
+def get_criteria(prompt_key: str) -> List[Dict[str, Any]]:
+    """Return the rubric criteria for a FINAL_PROMPTS key (empty list if unknown)"""
+    return RUBRICS.get(prompt_key, {}).get("criteria", [])
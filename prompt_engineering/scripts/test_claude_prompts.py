@@ -9,7 +9,6 @@ It sends prompts with mock responses to Claude 3.5 and records the results in an
 import os
 import sys
 import json
-import re
 import random
 import pandas as pd
 from typing import Dict, List, Any, Tuple
@@ -25,6 +24,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../.
 
 from prompt_engineering.scripts.final_prompts import FINAL_PROMPTS
 from prompt_engineering.mock import MOCK_RESPONSES
+from prompt_engineering.metadata import FORMAT_INSTRUCTOR_METADATA, core_components, parse_metadata
 
 # Claude API configuration
 CLAUDE_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
@@ -34,56 +34,16 @@ if not CLAUDE_API_KEY:
 CLAUDE_CLIENT = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
 CLAUDE_MODEL = "claude-3-5-sonnet-20241022"  # As specified in the requirements
 
-# Metadata extraction regex pattern
-METADATA_PATTERN = r'<!-- INSTRUCTOR_METADATA\n(.*?)\n-->'
-
 def extract_metadata(response: str) -> Dict[str, Any]:
     """Extract metadata from Claude's response."""
-    match = re.search(METADATA_PATTERN, response, re.DOTALL)
-    if not match:
+    metadata = parse_metadata(response)
+    if metadata is None or metadata.format != FORMAT_INSTRUCTOR_METADATA:
         return {"error": "No metadata found in response"}
-    
-    metadata_text = match.group(1)
-    metadata = {}
-    
-    # Parse metadata key-value pairs
-    for line in metadata_text.split('\n'):
-        if ':' in line:
-            key, value = line.split(':', 1)
-            metadata[key.strip()] = value.strip()
-    
-    return metadata
+    return dict(metadata.fields)
 
 def extract_core_components(metadata: Dict[str, Any], phase: str) -> Dict[str, Any]:
-    """Extract core components from metadata based on the phase."""
-    core = {"Score": metadata.get("Score", "N/A"), "Scaffolding": metadata.get("Scaffolding", "N/A")}
-    
-    # Extract phase-specific criteria
-    if phase == "phase2_learning_objectives":
-        core["Task_Identification"] = metadata.get("Task_Identification", "N/A")
-        core["Resource_Specificity"] = metadata.get("Resource_Specificity", "N/A")
-    
-    elif phase == "phase4_long_term_goals":
-        core["Goal_Clarity"] = metadata.get("Goal_Clarity", "N/A")
-        core["Goal_Orientation"] = metadata.get("Goal_Orientation", "N/A")
-        core["Visualization"] = metadata.get("Visualization", "N/A")
-    
-    elif phase == "phase4_short_term_goals":
-        core["Specific_Goal"] = metadata.get("Specific_Goal", "N/A")
-        core["Action_Plan"] = metadata.get("Action_Plan", "N/A")
-        core["Timeline"] = metadata.get("Timeline", "N/A")
-    
-    elif phase == "phase4_contingency_strategies":
-        core["If_Then_Structure"] = metadata.get("If_Then_Structure", "N/A")
-        core["Response_Specificity"] = metadata.get("Response_Specificity", "N/A")
-        core["Feasibility"] = metadata.get("Feasibility", "N/A")
-    
-    elif phase == "phase5_monitoring_adaptation":
-        core["Monitoring_Strategy"] = metadata.get("Monitoring_Strategy", "N/A")
-        core["Adaptation_Triggers"] = metadata.get("Adaptation_Triggers", "N/A")
-        core["Alternative_Strategies"] = metadata.get("Alternative_Strategies", "N/A")
-    
-    return core
+    """Extract core components from metadata based on the phase's rubric keys."""
+    return core_components(metadata, phase)
 
 def send_to_claude(prompt: str, mock_response: str) -> str:
     """Send prompt with mock response to Claude 3.5 and return the response."""
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+SoLBot Prompt Engineering - Pre-scorer Training
+
+Trains the local rubric pre-scorer used by the backend to short-circuit obviously
+low-quality submissions. For every phase prompt a small L2-regularised logistic
+regression is fitted on lexical features of the student response, with the label
+"Claude scored it in the high-support band (score < 1.8)".
+
+Training data comes from claude_test_results.xlsx; mock responses that were never
+sent to Claude are added with their tier as a weak label (low -> high support).
+Leave-one-out probabilities are used for the calibration report and to pick the
+smallest confidence threshold that produced no false positives.
+
+Usage:
+    python prompt_engineering/scripts/train_prescorer.py [--results claude_test_results.xlsx]
+"""
+
+import os
+import sys
+import ast
+import json
+import argparse
+import datetime
+from typing import Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path to allow imports
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+sys.path.insert(0, ROOT_DIR)
+
+from prompt_engineering.metadata import parse_metadata
+from prompt_engineering.mock import MOCK_RESPONSES
+from prompt_engineering.scripts.final_prompts import FINAL_PROMPTS
+from backend.utils.prescorer import extract_features, FEATURE_NAMES
+
+HIGH_SUPPORT_CUTOFF = 1.8      # Rubric: 1.0 <= score < 1.8 gets High Support
+L2_PENALTY = 1.0
+LEARNING_RATE = 0.1
+ITERATIONS = 3000
+MIN_THRESHOLD = 0.9            # Never short-circuit below this confidence
+THRESHOLD_GRID = [round(t, 2) for t in np.arange(0.90, 1.0, 0.01)]
+
+DEFAULT_RESULTS = os.path.join(ROOT_DIR, 'claude_test_results.xlsx')
+DEFAULT_MODEL_OUT = os.path.join(ROOT_DIR, 'backend', 'data', 'prescorer_model.json')
+DEFAULT_REPORT_OUT = os.path.join(ROOT_DIR, 'prompt_engineering', 'evaluation', 'results', 'prescorer_calibration.md')
+
+
+def parse_score(row: pd.Series) -> float:
+    """Get Claude's overall score for a result row."""
+    metadata = parse_metadata(str(row.get('claude_response', '')))
+    if metadata is not None and metadata.score is not None:
+        return metadata.score
+    try:
+        return float(ast.literal_eval(row['core_components']).get('Score'))
+    except Exception:
+        return np.nan
+
+
+def load_training_data(results_path: str) -> pd.DataFrame:
+    """Combine Claude-scored results with weakly labelled mock responses."""
+    df = pd.read_excel(results_path, sheet_name='All Results')
+    df['score'] = df.apply(parse_score, axis=1)
+    df = df.dropna(subset=['score'])
+    rows = [
+        {'phase': r.phase, 'text': r.response_text, 'label': int(r.score < HIGH_SUPPORT_CUTOFF), 'source': 'claude'}
+        for r in df.itertuples()
+    ]
+
+    seen = set(df['response_text'])
+    for phase, levels in MOCK_RESPONSES.items():
+        for level, responses in levels.items():
+            for text in responses:
+                if text not in seen:
+                    rows.append({'phase': phase, 'text': text, 'label': int(level == 'low'), 'source': 'mock'})
+
+    return pd.DataFrame(rows)
+
+
+def fit_logistic(X: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Fit L2-regularised logistic regression with batch gradient descent."""
+    weights = np.zeros(X.shape[1])
+    bias = 0.0
+    n = len(y)
+    for _ in range(ITERATIONS):
+        p = 1.0 / (1.0 + np.exp(-(X @ weights + bias)))
+        weights -= LEARNING_RATE * ((X.T @ (p - y)) / n + L2_PENALTY * weights / n)
+        bias -= LEARNING_RATE * np.mean(p - y)
+    return weights, bias
+
+
+def standardize(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    mean = X.mean(axis=0)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    return mean, std
+
+
+def predict(X: np.ndarray, mean: np.ndarray, std: np.ndarray, weights: np.ndarray, bias: float) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-(((X - mean) / std) @ weights + bias)))
+
+
+def leave_one_out(X: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Out-of-sample probability for every example."""
+    probs = np.zeros(len(y))
+    for i in range(len(y)):
+        mask = np.arange(len(y)) != i
+        mean, std = standardize(X[mask])
+        weights, bias = fit_logistic((X[mask] - mean) / std, y[mask])
+        probs[i] = predict(X[i:i + 1], mean, std, weights, bias)[0]
+    return probs
+
+
+def choose_threshold(probs: np.ndarray, y: np.ndarray) -> float:
+    """Smallest threshold on the grid whose out-of-sample predictions had no false positives."""
+    for threshold in THRESHOLD_GRID:
+        predicted = probs >= threshold
+        if predicted.any() and not (predicted & (y == 0)).any():
+            return max(threshold, MIN_THRESHOLD)
+    return 1.01  # Never fire for this phase
+
+
+def calibration_stats(probs: np.ndarray, y: np.ndarray, threshold: float) -> Dict[str, Any]:
+    """Brier score, reliability bins and threshold behaviour for one phase."""
+    eps = 1e-9
+    bins = []
+    edges = np.linspace(0, 1, 6)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        in_bin = (probs >= lo) & ((probs < hi) if hi < 1 else (probs <= hi))
+        if in_bin.any():
+            bins.append({'range': f"{lo:.1f}-{hi:.1f}", 'count': int(in_bin.sum()),
+                         'mean_predicted': float(probs[in_bin].mean()), 'observed_rate': float(y[in_bin].mean())})
+
+    fired = probs >= threshold
+    true_pos = int((fired & (y == 1)).sum())
+    return {
+        'n': int(len(y)),
+        'positives': int(y.sum()),
+        'brier': float(np.mean((probs - y) ** 2)),
+        'log_loss': float(-np.mean(y * np.log(probs + eps) + (1 - y) * np.log(1 - probs + eps))),
+        'threshold': float(threshold),
+        'coverage': float(fired.mean()),
+        'precision': float(true_pos / fired.sum()) if fired.any() else None,
+        'recall': float(true_pos / y.sum()) if y.sum() else None,
+        'bins': bins
+    }
+
+
+def write_report(report: Dict[str, Dict[str, Any]], path: str) -> None:
+    """Write the calibration report as markdown."""
+    lines = [
+        "# Pre-scorer Calibration Report",
+        "",
+        f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}",
+        "",
+        f"Label: Claude score < {HIGH_SUPPORT_CUTOFF} (high support). "
+        "All numbers are leave-one-out (out-of-sample) estimates.",
+        "",
+        "| Phase | N | Positives | Brier | Log loss | Threshold | Coverage | Precision | Recall |",
+        "|-------|---|-----------|-------|----------|-----------|----------|-----------|--------|",
+    ]
+    fmt = lambda v: "n/a" if v is None else f"{v:.2f}"
+    for phase, stats in report.items():
+        lines.append(f"| {phase} | {stats['n']} | {stats['positives']} | {stats['brier']:.3f} | {stats['log_loss']:.3f} | "
+                     f"{stats['threshold']:.2f} | {fmt(stats['coverage'])} | {fmt(stats['precision'])} | {fmt(stats['recall'])} |")
+
+    lines += ["", "## Reliability", ""]
+    for phase, stats in report.items():
+        lines += [f"### {phase}", "", "| Predicted | Count | Mean predicted | Observed rate |",
+                  "|-----------|-------|----------------|---------------|"]
+        for b in stats['bins']:
+            lines.append(f"| {b['range']} | {b['count']} | {b['mean_predicted']:.2f} | {b['observed_rate']:.2f} |")
+        lines.append("")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+    print(f"Calibration report saved to {path}")
+
+
+def train(results_path: str, model_out: str, report_out: str) -> None:
+    """Train one model per phase prompt and write the model file and calibration report."""
+    data = load_training_data(results_path)
+    models = {}
+    report = {}
+
+    for phase in FINAL_PROMPTS:
+        phase_data = data[data['phase'] == phase]
+        if phase_data.empty or phase_data['label'].nunique() < 2:
+            print(f"Skipping {phase} - not enough labelled data")
+            continue
+
+        X = np.array([extract_features(t) for t in phase_data['text']])
+        y = phase_data['label'].to_numpy(dtype=float)
+
+        probs = leave_one_out(X, y)
+        threshold = choose_threshold(probs, y)
+        report[phase] = calibration_stats(probs, y, threshold)
+
+        mean, std = standardize(X)
+        weights, bias = fit_logistic((X - mean) / std, y)
+        models[phase] = {
+            'mean': mean.round(6).tolist(),
+            'std': std.round(6).tolist(),
+            'weights': weights.round(6).tolist(),
+            'bias': round(float(bias), 6),
+            'threshold': threshold,
+            'n': int(len(y))
+        }
+        print(f"{phase}: n={len(y)}, threshold={threshold:.2f}, brier={report[phase]['brier']:.3f}")
+
+    model = {
+        'version': 1,
+        'trained_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'label': f'score < {HIGH_SUPPORT_CUTOFF}',
+        'features': FEATURE_NAMES,
+        'default_threshold': 0.95,
+        'models': models
+    }
+    os.makedirs(os.path.dirname(model_out), exist_ok=True)
+    with open(model_out, 'w', encoding='utf-8') as f:
+        json.dump(model, f, indent=2)
+    print(f"Model saved to {model_out}")
+
+    write_report(report, report_out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local rubric pre-scorer")
+    parser.add_argument('--results', default=DEFAULT_RESULTS, help="Claude test results workbook")
+    parser.add_argument('--model-out', default=DEFAULT_MODEL_OUT, help="Where to write the model JSON")
+    parser.add_argument('--report-out', default=DEFAULT_REPORT_OUT, help="Where to write the calibration report")
+    args = parser.parse_args()
+
+    train(args.results, args.model_out, args.report_out)
+
+
+if __name__ == "__main__":
+    main()
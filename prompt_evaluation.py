@@ -4,48 +4,49 @@ import seaborn as sns
 import numpy as np
 import re
 import os
+import sys
 from pathlib import Path
 import json
 from collections import Counter
 
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from prompt_engineering.metadata import core_components, parse_metadata, parse_number, rubric_keys
+from prompt_engineering.rubrics import RUBRICS
+
 def extract_score_from_metadata(text):
     """Extract score from metadata section if present."""
-    if isinstance(text, str) and "INSTRUCTOR_METADATA" in text:
-        match = re.search(r'Score:\s*(\d+\.\d+)', text)
-        if match:
-            return float(match.group(1))
-    return np.nan
+    metadata = parse_metadata(text) if isinstance(text, str) else None
+    if metadata is None or metadata.score is None:
+        return np.nan
+    return metadata.score
 
-def extract_metadata_fields(text):
-    """Extract all metadata fields from the response."""
-    if not isinstance(text, str):
-        return {}
-    
-    if "INSTRUCTOR_METADATA" not in text:
+def extract_metadata_fields(text, phase=None):
+    """Extract all metadata fields from the response.
+    
+    Every "Key: value" line of the block is returned; when the phase is known, its
+    rubric keys are always present (NaN when the response left them out).
+    """
+    metadata = parse_metadata(text) if isinstance(text, str) else None
+    if metadata is None:
         return {}
     
-    metadata = {}
-    # Extract the metadata section
-    match = re.search(r'INSTRUCTOR_METADATA\s*(.*?)\s*-->', text, re.DOTALL)
-    if match:
-        metadata_text = match.group(1)
-        # Parse individual fields
-        for line in metadata_text.split('\n'):
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip()
-                # Try to convert numeric values
-                try:
-                    if '.' in value:
-                        value = float(value)
-                    else:
-                        value = int(value)
-                except ValueError:
-                    pass
-                metadata[key] = value
-    
-    return metadata
+    fields = dict(metadata.fields)
+    if phase is not None:
+        fields.update(core_components(metadata.fields, phase))
+        score_keys = {"Score", *rubric_keys(phase)}
+    else:
+        score_keys = {"Score", *(key for prompt_key in RUBRICS for key in rubric_keys(prompt_key))}
+    
+    # Convert the score and criterion values ("2", "2.5", "2.5/3.0"); free-text fields
+    # such as Rationale and Scaffolding stay as written
+    for key, value in fields.items():
+        if value == "N/A":
+            fields[key] = np.nan
+        elif key in score_keys:
+            number = parse_number(value)
+            fields[key] = number if number is not None else value
+    
+    return fields
 
 def load_and_clean_data(file_path):
     """Load the CSV data and clean it for analysis."""
@@ -62,7 +63,8 @@ def load_and_clean_data(file_path):
     # Extract metadata from responses if available
     print("Extracting metadata from responses...")
     metadata_fields = []
-    all_metadata = df['llm_response'].apply(extract_metadata_fields).tolist()
+    phases = df['phase'] if 'phase' in df.columns else [None] * len(df)
+    all_metadata = [extract_metadata_fields(response, phase) for response, phase in zip(df['llm_response'], phases)]
     
     # Find all unique metadata fields
     for metadata in all_metadata: